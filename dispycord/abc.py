@@ -1,15 +1,39 @@
-from typing import overload, Optional
+import asyncio
+from typing import overload, Optional, Union
 
 from . import http
 from .embeds import Embed
 
 
+def _snowflake(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def _chain(
+    done: asyncio.Future,
+    created: asyncio.Future,
+    http: http.HTTP
+) -> None:
+    ''' Wrap a queued send's payload into a :Message:. '''
+    if created.done():
+        return
+        
+    if done.cancelled():
+        created.cancel()
+    elif (exc := done.exception()) is not None:
+        created.set_exception(exc)
+    else:
+        created.set_result(Message(http, done.result()))
+
+
 class MessageAble:
     '''
     MessageAble model for
     :abc.User:
     :abc.TextChannel:
     '''
+    __slots__ = ()
+    
     async def send(
         self,
         content: Optional[str] = None,
@@ -17,8 +41,13 @@ class MessageAble:
         tts: Optional[bool] = False,
         embed: Optional[Embed] = None,
         message_reference: Optional[int] = None
-    ) -> None:
-        
+    ) -> Union['Message', 'asyncio.Future']:
+        '''
+        Return
+        ------
+        The created message, or with the HTTP's outbound queue enabled
+        a future resolving to it once the queue posted it.
+        '''
         raw = {}
         
         raw['tts'] = tts
@@ -32,10 +61,22 @@ class MessageAble:
         if message_reference:
             raw['message_reference'] = message_reference
             
-        await self.message._http.Route(
-            raw,
-            f'/channels/{self.id}/messages',
-            'POST'
+        http = self.message._http
+        
+        if (outbound := getattr(http, 'outbound', None)) is not None:
+            future = outbound.send(self.id, raw)
+            created = asyncio.get_running_loop().create_future()
+            
+            future.add_done_callback(lambda done: _chain(done, created, http))
+            return created
+            
+        return Message(
+            http,
+            await http.Route(
+                raw,
+                f'/channels/{self.id}/messages',
+                'POST'
+            )
         )
         
     async def reply(
@@ -44,9 +85,9 @@ class MessageAble:
         *,
         tts: Optional[bool] = False,
         embed: Optional[Embed] = None
-    ) -> None:
+    ) -> Union['Message', 'asyncio.Future']:
         
-        await self.send(
+        return await self.send(
             content,
             tts=tts,
             embed=embed,
@@ -60,19 +101,37 @@ class MessageAble:
         
 class Guild:
     
+    __slots__ = ('id',)
+    
     def __init__(self, message: 'Message'):
         
-        self.id = message.raw.get('guild_id')
+        self.id: Optional[int] = _snowflake(message.raw.get('guild_id'))
         
 
 class User(MessageAble):
     
+    __slots__ = ('message', '_data')
+    
     def __init__(self, message: 'Message'):
         
-        self.name: str = message.raw['author']['username']
-        self.discriminator: str = message.raw['author']['discriminator']
-        self.id: int = message.raw['author']['id']
-        self.avatar_url = message.raw['author']['avatar']
+        self.message = message
+        self._data: dict = message.raw['author']
+        
+    @property
+    def name(self) -> str:
+        return self._data['username']
+        
+    @property
+    def discriminator(self) -> str:
+        return self._data['discriminator']
+        
+    @property
+    def id(self) -> int:
+        return int(self._data['id'])
+        
+    @property
+    def avatar_url(self) -> Optional[str]:
+        return self._data['avatar']
         
     @property
     def mention(self):
@@ -81,11 +140,16 @@ class User(MessageAble):
 
 class TextChannel(MessageAble):
     
+    __slots__ = ('id', 'message')
+    
     def __init__(self, message: 'Message'):
         
-        self.id: int = message.raw['channel_id']
+        self.id: int = int(message.raw['channel_id'])
         self.message = message
-        self.guild = Guild(message)
+        
+    @property
+    def guild(self) -> Guild:
+        return self.message.guild
         
     @property
     def mention(self):
@@ -93,15 +157,45 @@ class TextChannel(MessageAble):
 
 
 class Message:
+    '''
+    Message model.
+    
+    Only the raw payload is kept, :channel:, :author: and :guild:
+    are built the first time they are accessed.
+    '''
+    __slots__ = ('_http', 'raw', '_channel', '_author', '_guild')
     
     def __init__(self, http: http.HTTP, payload: dict):
         
-        self.content: str = payload['content']
-        self.id: int = payload['id']
-        
         self._http = http
         self.raw = payload
         
-        self.channel: TextChannel = TextChannel(self)
-        self.author: User = User(self)
-        self.guild: Guild = Guild(self)
\ No newline at end of file
+        self._channel: Optional[TextChannel] = None
+        self._author: Optional[User] = None
+        self._guild: Optional[Guild] = None
+        
+    @property
+    def content(self) -> str:
+        return self.raw.get('content', '')
+        
+    @property
+    def id(self) -> int:
+        return int(self.raw['id'])
+        
+    @property
+    def channel(self) -> TextChannel:
+        if self._channel is None:
+            self._channel = TextChannel(self)
+        return self._channel
+        
+    @property
+    def author(self) -> User:
+        if self._author is None:
+            self._author = User(self)
+        return self._author
+        
+    @property
+    def guild(self) -> Guild:
+        if self._guild is None:
+            self._guild = Guild(self)
+        return self._guild
\ No newline at end of file
@@ -0,0 +1,280 @@
+'''
+Gateway throughput benchmark against the local fake gateway.
+    
+    python -m dispycord.bench --shards 2 --messages 20000
+
+Every scenario (codec, encoding, compression, model, cache) runs a
+fresh Bot in its own interpreter, connected to a :FakeGateway: served
+by this process, and reports MESSAGE_CREATE throughput, the latency
+from the fake gateway sending an event to its listener running,
+and the memory the shards grew by.
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .testing import FakeGateway, synthetic_stream
+
+__all__ = ('main',)
+
+CODECS = ('orjson', 'msgspec', 'ujson', 'json')
+MODELS = ('lazy', 'full')
+CACHES = ('default', 'off')
+ENTITIES = ('guilds', 'channels', 'members', 'messages')
+COLUMNS = (
+    'codec', 'encoding', 'compress', 'model', 'cache', 'received',
+    'events_per_sec', 'p50_ms', 'p99_ms', 'memory_per_shard_mb'
+)
+
+
+def _rss() -> int:
+    ''' Resident memory in bytes. '''
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        # Peak, not current, where /proc is missing.
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def run_worker(config: Dict[str, Any]) -> Dict[str, Any]:
+    ''' One scenario, in this process. '''
+    from .cache import CachePolicy
+    from .ext import Bot
+    
+    shards, expected = config['shards'], config['shards'] * config['messages']
+    cache = None if config['cache'] == 'default' else {
+        entity: CachePolicy.off() for entity in ENTITIES
+    }
+    
+    bot = Bot(
+        sync_commands=False,
+        command_cache=None,
+        shard_count=shards,
+        encoding=config['encoding'],
+        compress=config['compress'],
+        json_codec=None if config['codec'] == '-' else config['codec'],
+        cache=cache,
+        gateway_url=config['gateway_url'],
+        http_options={'base_url': config['api_url']}
+    )
+    
+    latencies: List[float] = []
+    times: List[float] = []
+    full = config['model'] == 'full'
+    done = bot.loop.create_future()
+    
+    @bot.event()
+    async def on_message_create(message):
+        now = time.time()
+        
+        if full:
+            _ = (
+                message.author,
+                message.channel,
+                message.guild,
+                message.content
+            )
+        
+        latencies.append(now - float(message.raw['nonce']))
+        times.append(now)
+        
+        if len(latencies) >= expected and not done.done():
+            done.set_result(None)
+    
+    async def watch():
+        try:
+            await asyncio.wait_for(done, config['timeout'])
+        except asyncio.TimeoutError:
+            pass
+        bot.loop.stop()
+    
+    baseline = _rss()
+    bot.loop.create_task(watch())
+    bot.run(config['token'])
+    
+    elapsed = times[-1] - times[0] if len(times) > 1 else float('nan')
+    
+    return {
+        'received': len(latencies),
+        'events_per_sec': len(times) / elapsed if elapsed else float('nan'),
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'memory_per_shard_mb': (_rss() - baseline) / shards / 2 ** 20,
+    }
+
+
+async def _run_scenario(
+    args: argparse.Namespace,
+    scenario: Dict[str, Any]
+) -> Dict[str, Any]:
+    gateway = FakeGateway(
+        stream=synthetic_stream(
+            messages=args.messages,
+            guilds=args.guilds,
+            members=args.members
+        ),
+        rate=args.rate,
+        shard_count=args.shards,
+        token='bench',
+        stamp=True
+    )
+    await gateway.start()
+    
+    config = {
+        **scenario,
+        'shards': args.shards,
+        'messages': args.messages,
+        'timeout': args.timeout,
+        'token': 'bench',
+        'gateway_url': gateway.url,
+        'api_url': gateway.api_url,
+    }
+    
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'dispycord.bench',
+            '--worker', json.dumps(config),
+            stdout=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await process.communicate()
+    finally:
+        await gateway.close()
+    
+    if process.returncode != 0:
+        error = f'worker exited with {process.returncode}'
+        return {**scenario, 'error': error}
+    
+    return {**scenario, **json.loads(stdout.decode().strip().splitlines()[-1])}
+
+
+def _scenarios(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    scenarios = []
+    seen = set()
+    
+    for codec, encoding, compress, model, cache in itertools.product(
+        args.codecs, args.encodings, args.compress, args.models, args.caches
+    ):
+        # ETF does not go through the JSON codec.
+        codec = '-' if encoding == 'etf' else codec
+        
+        if (key := (codec, encoding, compress, model, cache)) in seen:
+            continue
+        
+        seen.add(key)
+        scenarios.append({
+            'codec': codec,
+            'encoding': encoding,
+            'compress': compress,
+            'model': model,
+            'cache': cache,
+        })
+    
+    return scenarios
+
+
+def _installed_codecs() -> List[str]:
+    from .codec import get_codec
+    
+    installed = []
+    
+    for name in CODECS:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+        installed.append(name)
+    
+    return installed
+
+
+def _cell(result: Dict[str, Any], column: str) -> str:
+    if isinstance(value := result.get(column), float):
+        return f'{value:.2f}'
+    
+    # Failed scenarios show their error in the first missing column.
+    return str(result.get(column, result.get('error', '')))
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    rows = [
+        [_cell(result, column) for column in COLUMNS] for result in results
+    ]
+    widths = [
+        max(len(column), *(len(row[index]) for row in rows))
+        for index, column in enumerate(COLUMNS)
+    ]
+    
+    for row in [list(COLUMNS), *rows]:
+        print('  '.join(
+            value.ljust(width) for value, width in zip(row, widths)
+        ))
+
+
+def _split(value: str) -> List[str]:
+    return value.split(',')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m dispycord.bench',
+        description=__doc__.strip().splitlines()[0]
+    )
+    add = parser.add_argument
+    add('--worker', help=argparse.SUPPRESS)
+    add('--shards', type=int, default=2)
+    add('--messages', type=int, default=20000,
+        help='MESSAGE_CREATEs per shard')
+    add('--guilds', type=int, default=10, help='guilds per shard')
+    add('--members', type=int, default=50, help='members per guild')
+    add('--rate', type=float, default=None,
+        help='events per second per shard, unthrottled by default')
+    add('--codecs', type=_split, default=None,
+        help='installed ones by default')
+    add('--encodings', type=_split, default=['json', 'etf'])
+    add('--compress', default=[False], help='off,on',
+        type=lambda value: [flag == 'on' for flag in _split(value)])
+    add('--models', type=_split, default=list(MODELS),
+        help='lazy: raw payload only, full: builds author, channel and guild')
+    add('--caches', type=_split, default=['default'], help=','.join(CACHES))
+    add('--timeout', type=float, default=120.0, help='seconds per scenario')
+    add('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+    
+    if args.worker is not None:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+    
+    args.codecs = args.codecs or _installed_codecs()
+    
+    async def run() -> List[Dict[str, Any]]:
+        return [
+            await _run_scenario(args, scenario)
+            for scenario in _scenarios(args)
+        ]
+    
+    results = asyncio.run(run())
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+'''
+Entity cache filled from gateway events.
+
+Every entity type has its own :CachePolicy:, off, unbounded,
+LRU with a max size or expiring after a TTL.
+'''
+import time
+from collections import OrderedDict
+from typing import (
+    Any, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+)
+
+__all__ = (
+    'CachePolicy',
+    'CachedMember',
+    'EntityStore',
+    'StateCache',
+)
+
+
+class CachePolicy:
+    ''' How much of an entity type is kept. '''
+    __slots__ = ('enabled', 'max_size', 'ttl')
+    
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        '''
+        Parameter
+        ----------
+        :enabled: whether anything is cached at all.
+        :max_size: evict the least recently used entry past this size.
+        :ttl: seconds an entry lives after it was written.
+        '''
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+    
+    @classmethod
+    def off(cls) -> 'CachePolicy':
+        return cls(enabled=False)
+    
+    @classmethod
+    def unbounded(cls) -> 'CachePolicy':
+        return cls()
+    
+    @classmethod
+    def lru(cls, max_size: int) -> 'CachePolicy':
+        return cls(max_size=max_size)
+    
+    @classmethod
+    def expiring(
+        cls,
+        ttl: float,
+        max_size: Optional[int] = None
+    ) -> 'CachePolicy':
+        return cls(ttl=ttl, max_size=max_size)
+    
+    def __repr__(self):
+        return (
+            f'<CachePolicy enabled={self.enabled} '
+            f'max_size={self.max_size} ttl={self.ttl}>'
+        )
+
+
+_MISSING = object()
+
+
+class EntityStore:
+    ''' One entity type's storage, applying its policy. '''
+    def __init__(
+        self,
+        policy: CachePolicy,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        group: Optional[Callable[[Hashable, Any], Hashable]] = None
+    ):
+        '''
+        Parameter
+        ----------
+        :policy: what is kept.
+        :clock: monotonic time source for the TTL.
+        :group: (key, value) -> group, e.g. the guild id, indexes the keys
+            by group for :pop_group:. None values are not indexed.
+        '''
+        self.policy = policy
+        
+        self.hits: int = 0
+        self.misses: int = 0
+        
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._expires: Optional[Dict[Hashable, float]] = (
+            None if policy.ttl is None else {}
+        )
+        self._clock = clock
+        
+        self._group = group
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        
+        if self._expires is not None and self._expires[key] <= self._clock():
+            self.pop(key)
+            self.misses += 1
+            return default
+        
+        if self.policy.max_size is not None:
+            self._data.move_to_end(key)
+        
+        self.hits += 1
+        return value
+    
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        ''' Same as get, without counting or refreshing the entry. '''
+        return self._data.get(key, default)
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.policy.enabled:
+            return
+        
+        if self._group is not None:
+            if (old := self._data.get(key, _MISSING)) is not _MISSING:
+                self._ungroup(key, old)
+            
+            if (group := self._group(key, value)) is not None:
+                self._groups.setdefault(group, set()).add(key)
+        
+        self._data[key] = value
+        self._data.move_to_end(key)
+        
+        if self._expires is not None:
+            self._expires[key] = self._clock() + self.policy.ttl
+        
+        self._evict()
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if self._expires is not None:
+            self._expires.pop(key, None)
+        
+        if (value := self._data.pop(key, _MISSING)) is _MISSING:
+            return default
+        
+        if self._group is not None:
+            self._ungroup(key, value)
+        
+        return value
+    
+    def _ungroup(self, key: Hashable, value: Any) -> None:
+        group = self._group(key, value)
+        
+        if (keys := self._groups.get(group)) is not None:
+            keys.discard(key)
+            
+            if not keys:
+                del self._groups[group]
+    
+    def pop_group(self, group: Hashable) -> int:
+        ''' Drop every entry of :group:, return how many there were. '''
+        keys = self._groups.pop(group, ())
+        
+        for key in keys:
+            if self._expires is not None:
+                self._expires.pop(key, None)
+            
+            self._data.pop(key, None)
+        
+        return len(keys)
+    
+    def _evict(self) -> None:
+        
+        if (max_size := self.policy.max_size) is not None:
+            while len(self._data) > max_size:
+                self.pop(next(iter(self._data)))
+        
+        if self._expires is not None:
+            now = self._clock()
+            
+            # Oldest first, stop at the first live entry.
+            while self._data:
+                if self._expires[key := next(iter(self._data))] > now:
+                    break
+                self.pop(key)
+    
+    def keys(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+    
+    def values(self) -> Iterator[Any]:
+        return iter(list(self._data.values()))
+    
+    def clear(self) -> None:
+        self._data.clear()
+        self._groups.clear()
+        
+        if self._expires is not None:
+            self._expires.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class CachedMember:
+    '''
+    Compact member record.
+    Big guilds have hundreds of thousands of members,
+    so only these fields are kept instead of the payload dict.
+    '''
+    __slots__ = (
+        'guild_id',
+        'id',
+        'name',
+        'discriminator',
+        'avatar',
+        'nick',
+        'roles',
+        'joined_at',
+    )
+    
+    def __init__(self, guild_id: int, payload: dict):
+        
+        user = payload['user']
+        
+        self.guild_id: int = guild_id
+        self.id: int = int(user['id'])
+        self.name: str = user['username']
+        self.discriminator: str = user.get('discriminator', '0')
+        self.avatar: Optional[str] = user.get('avatar')
+        self.nick: Optional[str] = payload.get('nick')
+        self.roles: Tuple[int, ...] = tuple(map(int, payload.get('roles', ())))
+        self.joined_at: Optional[str] = payload.get('joined_at')
+    
+    @property
+    def mention(self) -> str:
+        return f'<@{self.id}>'
+    
+    def __repr__(self):
+        return (
+            f'<CachedMember id={self.id} guild_id={self.guild_id} '
+            f'name={self.name!r}>'
+        )
+
+
+def _channel_guild(channel_id: int, channel: dict) -> Optional[int]:
+    guild_id = channel.get('guild_id')
+    return None if guild_id is None else int(guild_id)
+
+
+def _member_guild(key: Tuple[int, int], member: CachedMember) -> int:
+    return key[0]
+
+
+# Kept in their own stores, not inside the guild.
+_GUILD_SPLIT = frozenset((
+    'channels', 'threads', 'members', 'presences', 'voice_states'
+))
+
+
+class StateCache:
+    ''' Guilds, channels, members and messages seen on the gateway. '''
+    def __init__(
+        self,
+        *,
+        guilds: Optional[CachePolicy] = None,
+        channels: Optional[CachePolicy] = None,
+        members: Optional[CachePolicy] = None,
+        messages: Optional[CachePolicy] = None
+    ):
+        '''
+        Parameter
+        ----------
+        :guilds: unbounded by default
+        :channels: unbounded by default
+        :members: unbounded by default
+        :messages: last 1000 by default
+        '''
+        self.guilds = EntityStore(guilds or CachePolicy.unbounded())
+        self.channels = EntityStore(
+            channels or CachePolicy.unbounded(), group=_channel_guild
+        )
+        self.members = EntityStore(
+            members or CachePolicy.unbounded(), group=_member_guild
+        )
+        self.messages = EntityStore(messages or CachePolicy.lru(1000))
+        
+        self._parsers: Dict[str, Callable[[dict], None]] = {
+            'GUILD_CREATE': self._guild_create,
+            'GUILD_UPDATE': self._guild_update,
+            'GUILD_DELETE': self._guild_delete,
+            'CHANNEL_CREATE': self._channel_update,
+            'CHANNEL_UPDATE': self._channel_update,
+            'CHANNEL_DELETE': self._channel_delete,
+            'GUILD_MEMBER_ADD': self._member_update,
+            'GUILD_MEMBER_UPDATE': self._member_update,
+            'GUILD_MEMBER_REMOVE': self._member_remove,
+            'GUILD_MEMBERS_CHUNK': self._members_chunk,
+            'MESSAGE_CREATE': self._message_create,
+            'MESSAGE_UPDATE': self._message_update,
+            'MESSAGE_DELETE': self._message_delete,
+            'MESSAGE_DELETE_BULK': self._message_delete_bulk,
+        }
+    
+    def parse(self, event: str, payload: dict) -> None:
+        '''
+        Update the cache from a dispatch.
+        
+        Parameter
+        ----------
+        :event: raw gateway event name
+        :payload: event's data
+        '''
+        if (parser := self._parsers.get(event)) is not None:
+            parser(payload)
+    
+    def get_guild(self, guild_id: int) -> Optional[dict]:
+        return self.guilds.get(int(guild_id))
+    
+    def get_channel(self, channel_id: int) -> Optional[dict]:
+        return self.channels.get(int(channel_id))
+    
+    def get_member(
+        self,
+        guild_id: int,
+        user_id: int
+    ) -> Optional[CachedMember]:
+        return self.members.get((int(guild_id), int(user_id)))
+    
+    def get_message(self, message_id: int) -> Optional[dict]:
+        return self.messages.get(int(message_id))
+    
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        ''' Size, hits and misses per entity type. '''
+        return {
+            'GUILDS': self.guilds.stats,
+            'CHANNELS': self.channels.stats,
+            'MEMBERS': self.members.stats,
+            'MESSAGES': self.messages.stats,
+        }
+    
+    def _set_member(self, guild_id: int, payload: dict) -> None:
+        self.members.set(
+            (guild_id, int(payload['user']['id'])),
+            CachedMember(guild_id, payload)
+        )
+    
+    def _guild_create(self, payload: dict) -> None:
+        guild_id = int(payload['id'])
+        
+        self.guilds.set(
+            guild_id,
+            {
+                key: value for key, value in payload.items()
+                if key not in _GUILD_SPLIT
+            }
+        )
+        
+        # Copies, the payload may still be handed to listeners.
+        for channel in payload.get('channels', ()):
+            self.channels.set(
+                int(channel['id']), {**channel, 'guild_id': payload['id']}
+            )
+        
+        if self.members.policy.enabled:
+            for member in payload.get('members', ()):
+                self._set_member(guild_id, member)
+    
+    def _guild_update(self, payload: dict) -> None:
+        guild_id = int(payload['id'])
+        
+        if (guild := self.guilds.peek(guild_id)) is not None:
+            guild.update(payload)
+    
+    def _guild_delete(self, payload: dict) -> None:
+        
+        if payload.get('unavailable'):
+            return
+        
+        guild_id = int(payload['id'])
+        self.guilds.pop(guild_id)
+        self.channels.pop_group(guild_id)
+        self.members.pop_group(guild_id)
+    
+    def _channel_update(self, payload: dict) -> None:
+        self.channels.set(int(payload['id']), payload)
+    
+    def _channel_delete(self, payload: dict) -> None:
+        self.channels.pop(int(payload['id']))
+    
+    def _member_update(self, payload: dict) -> None:
+        guild_id = int(payload['guild_id'])
+        self._set_member(guild_id, payload)
+    
+    def _member_remove(self, payload: dict) -> None:
+        guild_id, user_id = payload['guild_id'], payload['user']['id']
+        self.members.pop((int(guild_id), int(user_id)))
+    
+    def _members_chunk(self, payload: dict) -> None:
+        
+        if not self.members.policy.enabled:
+            return
+        
+        guild_id = int(payload['guild_id'])
+        
+        for member in payload['members']:
+            self._set_member(guild_id, member)
+    
+    def _message_create(self, payload: dict) -> None:
+        self.messages.set(int(payload['id']), payload)
+    
+    def _message_update(self, payload: dict) -> None:
+        
+        if (message := self.messages.peek(int(payload['id']))) is not None:
+            message.update(payload)
+    
+    def _message_delete(self, payload: dict) -> None:
+        self.messages.pop(int(payload['id']))
+    
+    def _message_delete_bulk(self, payload: dict) -> None:
+        for message_id in payload['ids']:
+            self.messages.pop(int(message_id))
\ No newline at end of file
@@ -0,0 +1,116 @@
+'''
+JSON codecs shared by the gateway and REST.
+
+`orjson`, `msgspec` and `ujson` are used when installed,
+otherwise the standard library.
+'''
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+__all__ = (
+    'JSONCodec',
+    'get_codec',
+)
+
+
+class JSONCodec:
+    ''' A JSON implementation, encoding straight to bytes. '''
+    def __init__(
+        self,
+        name: str,
+        *,
+        loads: Callable[[Union[str, bytes]], Any],
+        dumps: Callable[[Any], bytes]
+    ):
+        '''
+        Parameter
+        ----------
+        :name: codec's name.
+        :loads: decodes str or bytes.
+        :dumps: encodes to UTF-8 bytes.
+        '''
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+    
+    def dumps_str(self, obj: Any) -> str:
+        ''' Same as dumps but to str, for APIs that want text. '''
+        return self.dumps(obj).decode('utf-8')
+    
+    def __repr__(self):
+        return f'<JSONCodec {self.name}>'
+
+
+def _orjson() -> JSONCodec:
+    import orjson
+    
+    return JSONCodec('orjson', loads=orjson.loads, dumps=orjson.dumps)
+
+
+def _msgspec() -> JSONCodec:
+    import msgspec
+    
+    return JSONCodec(
+        'msgspec',
+        loads=msgspec.json.Decoder().decode,
+        dumps=msgspec.json.Encoder().encode
+    )
+
+
+def _ujson() -> JSONCodec:
+    import ujson
+    
+    def dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+    
+    return JSONCodec('ujson', loads=ujson.loads, dumps=dumps)
+
+
+def _stdlib() -> JSONCodec:
+    
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(
+            obj, separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+    
+    return JSONCodec('json', loads=json.loads, dumps=dumps)
+
+
+_codecs: Dict[str, Callable[[], JSONCodec]] = {
+    'orjson': _orjson,
+    'msgspec': _msgspec,
+    'ujson': _ujson,
+    'json': _stdlib,
+}
+
+
+def get_codec(name: Optional[Union[str, JSONCodec]] = None) -> JSONCodec:
+    '''
+    Resolve a codec.
+    
+    Parameter
+    ----------
+    :name: 'orjson', 'msgspec', 'ujson', 'json', a JSONCodec
+        or None to pick the fastest installed one.
+    
+    Raise
+    -----
+    :ValueError: unknown codec name.
+    :ImportError: the requested codec is not installed.
+    '''
+    if isinstance(name, JSONCodec):
+        return name
+    
+    if name is not None:
+        try:
+            return _codecs[name]()
+        except KeyError:
+            raise ValueError(f"Unknown JSON codec '{name}'.") from None
+    
+    for factory in _codecs.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    
+    return _stdlib()
\ No newline at end of file
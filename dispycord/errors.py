@@ -1,5 +1,6 @@
 __all__ = (
     "error",
+    "HTTPException",
 )
 
 
@@ -15,7 +16,60 @@ class UncaughtError(BaseError):
     ...
     
     
+class InvalidShard(BaseError):
+    ...
+    
+    
+class ShardingRequired(BaseError):
+    ...
+    
+    
+class InvalidApiVersion(BaseError):
+    ...
+    
+    
+class InvalidIntents(BaseError):
+    ...
+    
+    
+class DisallowedIntents(BaseError):
+    ...
+    
+    
+class CommandError(BaseError):
+    ''' A prefix command could not run. '''
+    
+    
+class MissingArgument(CommandError):
+    ...
+    
+    
+class BadArgument(CommandError):
+    ''' An argument's converter failed. '''
+    
+    
+class HTTPException(BaseError):
+    ''' Discord HTTP returned a non-2xx response. '''
+    def __init__(self, response, data):
+        
+        self.response = response
+        self.status: int = response.status
+        self.data = data
+        
+        if isinstance(data, dict):
+            message = data.get('message', '')
+        else:
+            message = data or ''
+            
+        super().__init__(f'{self.status} {response.reason}: {message}')
+    
+    
 error: dict = {
     "4004": LoginFailure,
+    "4010": InvalidShard,
+    "4011": ShardingRequired,
+    "4012": InvalidApiVersion,
+    "4013": InvalidIntents,
+    "4014": DisallowedIntents,
     "default": UncaughtError
 }
\ No newline at end of file
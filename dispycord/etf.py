@@ -0,0 +1,300 @@
+'''
+Erlang Term Format, the gateway's `encoding=etf`.
+
+Payloads are decoded into the same shapes `encoding=json` produces:
+atoms become None / bool / str, binaries become str and snowflakes,
+which ETF sends as big integers, become str.
+
+If `erlpack` is installed it is used for the heavy lifting. Without it
+ETF only pays off in bandwidth: the pure Python decoder is several times
+slower than any JSON codec, see `python -m dispycord.microbench decode`.
+'''
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import erlpack
+except ImportError:
+    erlpack = None
+
+__all__ = (
+    'dumps',
+    'loads',
+)
+
+FORMAT_VERSION = 131
+
+NEW_FLOAT_EXT = 70
+COMPRESSED = 80
+SMALL_INTEGER_EXT = 97
+INTEGER_EXT = 98
+FLOAT_EXT = 99
+ATOM_EXT = 100
+SMALL_TUPLE_EXT = 104
+LARGE_TUPLE_EXT = 105
+NIL_EXT = 106
+STRING_EXT = 107
+LIST_EXT = 108
+BINARY_EXT = 109
+SMALL_BIG_EXT = 110
+LARGE_BIG_EXT = 111
+SMALL_ATOM_EXT = 115
+MAP_EXT = 116
+ATOM_UTF8_EXT = 118
+SMALL_ATOM_UTF8_EXT = 119
+
+_ATOMS = {'nil': None, 'true': True, 'false': False}
+
+_unpack_uint16 = struct.Struct('>H').unpack_from
+_unpack_uint32 = struct.Struct('>I').unpack_from
+_unpack_int32 = struct.Struct('>i').unpack_from
+_unpack_double = struct.Struct('>d').unpack_from
+
+
+class _Decoder:
+    ''' Pure-Python ETF decoder. '''
+    def __init__(self, data: bytes):
+        
+        self.data = memoryview(data)
+        self.offset = 0
+        
+        self._table: Dict[int, Callable[[], Any]] = {
+            NEW_FLOAT_EXT: self._new_float,
+            SMALL_INTEGER_EXT: self._small_integer,
+            INTEGER_EXT: self._integer,
+            FLOAT_EXT: self._float,
+            ATOM_EXT: self._atom,
+            SMALL_ATOM_EXT: self._small_atom,
+            ATOM_UTF8_EXT: self._atom,
+            SMALL_ATOM_UTF8_EXT: self._small_atom,
+            SMALL_TUPLE_EXT: self._small_tuple,
+            LARGE_TUPLE_EXT: self._large_tuple,
+            NIL_EXT: list,
+            STRING_EXT: self._string,
+            LIST_EXT: self._list,
+            BINARY_EXT: self._binary,
+            SMALL_BIG_EXT: self._small_big,
+            LARGE_BIG_EXT: self._large_big,
+            MAP_EXT: self._map,
+        }
+    
+    def decode(self) -> Any:
+        tag = self.data[self.offset]
+        self.offset += 1
+        
+        try:
+            return self._table[tag]()
+        except KeyError:
+            raise ValueError(f'Unknown ETF tag {tag}.') from None
+    
+    def _read(self, size: int) -> memoryview:
+        start = self.offset
+        self.offset += size
+        return self.data[start:self.offset]
+    
+    def _new_float(self) -> float:
+        value, = _unpack_double(self.data, self.offset)
+        self.offset += 8
+        return value
+    
+    def _small_integer(self) -> int:
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+    
+    def _integer(self) -> int:
+        value, = _unpack_int32(self.data, self.offset)
+        self.offset += 4
+        return value
+    
+    def _float(self) -> float:
+        return float(bytes(self._read(31)).rstrip(b'\x00'))
+    
+    def _atom(self) -> Any:
+        size, = _unpack_uint16(self.data, self.offset)
+        self.offset += 2
+        return self._to_atom(str(self._read(size), 'utf-8'))
+    
+    def _small_atom(self) -> Any:
+        size = self.data[self.offset]
+        self.offset += 1
+        return self._to_atom(str(self._read(size), 'utf-8'))
+    
+    @staticmethod
+    def _to_atom(name: str) -> Any:
+        return _ATOMS.get(name, name)
+    
+    def _small_tuple(self) -> Tuple[Any, ...]:
+        arity = self.data[self.offset]
+        self.offset += 1
+        return tuple(self.decode() for _ in range(arity))
+    
+    def _large_tuple(self) -> Tuple[Any, ...]:
+        arity, = _unpack_uint32(self.data, self.offset)
+        self.offset += 4
+        return tuple(self.decode() for _ in range(arity))
+    
+    def _string(self) -> str:
+        size, = _unpack_uint16(self.data, self.offset)
+        self.offset += 2
+        return str(self._read(size), 'latin-1')
+    
+    def _list(self) -> List[Any]:
+        size, = _unpack_uint32(self.data, self.offset)
+        self.offset += 4
+        
+        value = [self.decode() for _ in range(size)]
+        
+        # Proper lists end with NIL_EXT.
+        if (tail := self.decode()) != []:
+            value.append(tail)
+        
+        return value
+    
+    def _binary(self) -> str:
+        size, = _unpack_uint32(self.data, self.offset)
+        self.offset += 4
+        return str(self._read(size), 'utf-8')
+    
+    def _big(self, size: int) -> str:
+        sign = self.data[self.offset]
+        self.offset += 1
+        
+        value = int.from_bytes(self._read(size), 'little')
+        # Snowflakes, the JSON encoding sends them as strings.
+        return str(-value if sign else value)
+    
+    def _small_big(self) -> str:
+        size = self.data[self.offset]
+        self.offset += 1
+        return self._big(size)
+    
+    def _large_big(self) -> str:
+        size, = _unpack_uint32(self.data, self.offset)
+        self.offset += 4
+        return self._big(size)
+    
+    def _map(self) -> Dict[Any, Any]:
+        arity, = _unpack_uint32(self.data, self.offset)
+        self.offset += 4
+        
+        decode = self.decode
+        return {decode(): decode() for _ in range(arity)}
+
+
+def _encode(value: Any, buffer: bytearray) -> None:
+    
+    if value is None:
+        buffer += b's\x03nil'
+    
+    elif value is True:
+        buffer += b's\x04true'
+    
+    elif value is False:
+        buffer += b's\x05false'
+    
+    elif isinstance(value, int):
+        
+        if 0 <= value <= 255:
+            buffer += struct.pack('>BB', SMALL_INTEGER_EXT, value)
+        
+        elif -2 ** 31 <= value < 2 ** 31:
+            buffer += struct.pack('>Bi', INTEGER_EXT, value)
+        
+        else:
+            magnitude = abs(value)
+            size = (magnitude.bit_length() + 7) // 8
+            data = magnitude.to_bytes(size, 'little')
+            buffer += struct.pack('>BBB', SMALL_BIG_EXT, len(data), value < 0)
+            buffer += data
+    
+    elif isinstance(value, float):
+        buffer += struct.pack('>Bd', NEW_FLOAT_EXT, value)
+    
+    elif isinstance(value, (str, bytes)):
+        
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        
+        buffer += struct.pack('>BI', BINARY_EXT, len(value))
+        buffer += value
+    
+    elif isinstance(value, dict):
+        buffer += struct.pack('>BI', MAP_EXT, len(value))
+        
+        for key, val in value.items():
+            _encode(key, buffer)
+            _encode(val, buffer)
+    
+    elif isinstance(value, (list, tuple)):
+        
+        if value:
+            buffer += struct.pack('>BI', LIST_EXT, len(value))
+            
+            for item in value:
+                _encode(item, buffer)
+        
+        buffer.append(NIL_EXT)
+    
+    else:
+        raise TypeError(f"'{type(value).__name__}' is not ETF serializable.")
+
+
+def _normalize(value: Any) -> Any:
+    ''' Bring erlpack's output to the JSON shapes. '''
+    if isinstance(value, dict):
+        return {_normalize(key): _normalize(val) for key, val in value.items()}
+    
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value if -2 ** 31 <= value < 2 ** 31 else str(value)
+    
+    if isinstance(value, str) and type(value) is not str:
+        # erlpack.Atom
+        return _ATOMS.get(value, str(value))
+    
+    return value
+
+
+def loads(data: bytes) -> Any:
+    '''
+    Decode an ETF payload.
+    
+    Parameter
+    ----------
+    :data: ETF encoded bytes, starting with the format version.
+    '''
+    if erlpack is not None:
+        return _normalize(erlpack.unpack(bytes(data)))
+    
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f'Unknown ETF version {data[0]}.')
+    
+    if data[1] == COMPRESSED:
+        data = bytes(data[:1]) + zlib.decompress(bytes(data[6:]))
+    
+    decoder = _Decoder(data)
+    decoder.offset = 1
+    return decoder.decode()
+
+
+def dumps(value: Any) -> bytes:
+    '''
+    Encode a payload as ETF.
+    
+    Parameter
+    ----------
+    :value: None, bool, int, float, str, bytes, dict, list or tuple.
+    '''
+    if erlpack is not None:
+        return erlpack.pack(value)
+    
+    buffer = bytearray([FORMAT_VERSION])
+    _encode(value, buffer)
+    return bytes(buffer)
\ No newline at end of file
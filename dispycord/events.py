@@ -0,0 +1,89 @@
+'''
+Gateway dispatch table.
+
+Maps raw gateway event names to the listener they dispatch and the
+parser building the listener's arguments. The table is built once,
+:Shard.handle_event: looks events up in it and skips the parser
+entirely when nobody listens.
+'''
+from typing import Any, Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+from .abc import Message
+from .interactions import Interaction
+
+if TYPE_CHECKING:
+    from .shard import Shard
+
+__all__ = (
+    'EventParser',
+    'parsers',
+    'register',
+)
+
+EventParser = Callable[['Shard', dict], Tuple[Any, ...]]
+
+
+def no_args(shard: 'Shard', payload: dict) -> Tuple[Any, ...]:
+    return ()
+
+
+def raw(shard: 'Shard', payload: dict) -> Tuple[Any, ...]:
+    return (payload,)
+
+
+def message(shard: 'Shard', payload: dict) -> Tuple[Any, ...]:
+    return (Message(shard._client.http, payload),)
+
+
+def interaction(shard: 'Shard', payload: dict) -> Tuple[Any, ...]:
+    return (Interaction(shard._client.http, payload),)
+
+
+# event -> (listener name, parser)
+parsers: Dict[str, Tuple[str, EventParser]] = {}
+
+
+def register(
+    event: str,
+    parser: EventParser = raw,
+    *,
+    listener: Optional[str] = None
+) -> None:
+    '''
+    Add or replace an event in the dispatch table.
+    
+    Parameter
+    ----------
+    :event: raw gateway event name, e.g. 'MESSAGE_REACTION_ADD'.
+    :parser: builds the listener's arguments, the raw payload by default.
+    :listener: listener's name, 'on_' + lower-cased event by default.
+    '''
+    parsers[event] = (listener or 'on_' + event.lower(), parser)
+
+
+for _event in ('READY', 'RESUMED'):
+    register(_event, no_args)
+
+for _event in ('MESSAGE_CREATE', 'MESSAGE_UPDATE', 'MESSAGE_DELETE'):
+    register(_event, message)
+
+for _event in (
+    'MESSAGE_DELETE_BULK',
+    'MESSAGE_REACTION_ADD',
+    'MESSAGE_REACTION_REMOVE',
+    'MESSAGE_REACTION_REMOVE_ALL',
+    'MESSAGE_REACTION_REMOVE_EMOJI',
+    'GUILD_CREATE',
+    'GUILD_UPDATE',
+    'GUILD_DELETE',
+    'GUILD_MEMBER_ADD',
+    'GUILD_MEMBER_UPDATE',
+    'GUILD_MEMBER_REMOVE',
+    'CHANNEL_CREATE',
+    'CHANNEL_UPDATE',
+    'CHANNEL_DELETE',
+    'TYPING_START',
+):
+    register(_event)
+
+register('INTERACTION_CREATE', interaction)
\ No newline at end of file
@@ -1,2 +1,6 @@
 from .client import Client
-from .bot import Bot
\ No newline at end of file
+from .bot import Bot
+from .cluster import Cluster
+from .executor import DispatchExecutor
+from .prefix import Context, PrefixCommands, TextCommand
+from .profiling import HandlerSample, Profiler
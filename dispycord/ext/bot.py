@@ -1,26 +1,92 @@
 import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import (
+    Executor, ProcessPoolExecutor, ThreadPoolExecutor
+)
 from typing import (
     Callable,
     Any,
+    Dict,
     Union,
     List,
     Optional,
+    Tuple,
     TypeVar,
     Iterator,
 )
 
+from ..abc import Message
+from ..interactions import APPLICATION_COMMAND, Interaction
+from ..metrics import Metrics
 from .client import Client
-from .core import Command, Event
+from .core import Command, CommandIndex, Event
+from .executor import DispatchExecutor
+from .offload import offload
+from .prefix import PrefixCommands, PrefixResolver, TextCommand
+from .profiling import Profiler
+from .sync import CommandCache, sync_commands
+
+log = logging.getLogger(__name__)
+
+WaiterKey = Tuple[Optional[int], Optional[int]]
+# future -> check
+WaiterBucket = Dict[asyncio.Future, Optional[Callable[..., bool]]]
+ExecutorLike = Union[str, Executor]
 
 
 class Bot(Client):
     ''' A rewrite version of client
     This has all : Client : functionality + more advanced features.
     '''
-    def __init__(self, **option):
+    def __init__(
+        self,
+        *,
+        dispatch_executor: Optional[DispatchExecutor] = None,
+        sync_commands: bool = True,
+        command_cache: Optional[str] = None,
+        auto_defer: Optional[float] = 2.5,
+        command_prefix: Optional[Union[str, List[str], PrefixResolver]] = None,
+        profiler: Optional[Profiler] = None,
+        **option
+    ):
+        '''
+        Parameter
+        ----------
+        :dispatch_executor: runs listeners on a bounded worker pool,
+            one task per listener call by default.
+        :sync_commands: register the application commands on the first READY.
+        :command_cache: file remembering the uploaded command sets, e.g.
+            '.dispycord-commands.json'. None, the default, fetches the
+            registered sets on every start and uploads those which differ.
+        :auto_defer: seconds after receiving an interaction to defer it
+            if its command did not respond yet, Discord's limit is 3.
+            None never defers.
+        :command_prefix: enables prefix commands, a prefix, prefixes
+            or a function of the guild id returning them, see :PrefixCommands:.
+        :profiler: profiles every listener call and monitors the loop lag,
+            started on the first dispatch, see :Profiler:.
+        :option: passed to :Client:
+        '''
         super().__init__(**option)
+        self.dispatch_executor = dispatch_executor
+        self.command_cache = CommandCache(command_cache)
+        self.auto_defer = auto_defer
+        self.prefix_commands: Optional[PrefixCommands] = (
+            None if command_prefix is None else PrefixCommands(command_prefix)
+        )
+        self.profiler = profiler
+        self._sync_commands = sync_commands
+        self._sync_task: Optional[asyncio.Task] = None
         self._commands = []
-        self._listeners = {}
+        self._command_index: Optional[CommandIndex] = None
+        self._listeners: Dict[str, List[Event]] = {}
+        # 'thread' / 'process' -> shared pool, created on first use
+        self._pools: Dict[str, Executor] = {}
+        # event -> (channel_id, user_id) -> future -> check
+        self._waiters: Dict[str, Dict[WaiterKey, WaiterBucket]] = {}
         
     def command(
         self,
@@ -28,7 +94,9 @@ class Bot(Client):
         name: str,
         description: str,
         slash_type: int,
-        guild: Union[str, int, List[Union[str, int]]] = None
+        guild: Union[str, int, List[Union[str, int]]] = None,
+        options: Optional[List[dict]] = None,
+        executor: Optional[ExecutorLike] = None
     ):
         ''' Command registers.
         Automatically generating slash commands.
@@ -39,63 +107,412 @@ class Bot(Client):
         :description: command's description,
         :slash_type: slash type
         :guild: If guild is not specified it may registered as global command.
+        :options: application command options, e.g. subcommands.
+        :executor: same as :Bot.event:
         '''
         def inner(function: Callable[..., Any]) -> Command:
             
             command = Command(
-                function,
+                self._offload(function, executor),
                 name=name,
                 description=description,
                 slash_type=slash_type,
-                guild=guild
+                guild=guild,
+                options=options
             )
             self.commands.append(command)
+            self._command_index = None
             return command
             
         return inner
         
+    def text_command(
+        self,
+        name: str,
+        *,
+        aliases: List[str] = (),
+        description: str = ''
+    ) -> Callable[[Callable[..., Any]], TextCommand]:
+        '''
+        Prefix command registers, needs :command_prefix:.
+        
+        Parameter
+        ---------
+        :name: invoked as `<prefix><name>`.
+        :aliases: other names.
+        :description: command's description.
+        '''
+        if self.prefix_commands is None:
+            raise TypeError('Prefix commands need a command_prefix.')
+            
+        return self.prefix_commands.command(
+            name, aliases=aliases, description=description
+        )
+        
     def event(
         self,
         *,
-        run_once=False
+        run_once=False,
+        executor: Optional[ExecutorLike] = None
     ) -> None:
         '''
         Event registers.
+        Several listeners may share an event, they all run.
         
         Parameters
         ----------
         :run_once: whether the event should only run once.
+        :executor: 'thread', 'process' or a concurrent.futures.Executor
+            to run the handler off the event loop, for CPU bound work.
+            The handler may then be a plain function, it gets message
+            snapshots whose sends are done on the loop after it returned.
+            Process handlers must be importable module level functions.
         '''
         def inner(function: Callable[..., Any]):
             func_name = function.__name__
-            if not asyncio.iscoroutinefunction(function):
+            if executor is None and not asyncio.iscoroutinefunction(function):
                 raise TypeError(f"'{func_name}' must ne coroutine function.")
                 
-            self.listeners[func_name] = Event(
-                function,
-                run_once=run_once,
-                loop=self.loop
+            self.listeners.setdefault(func_name, []).append(
+                Event(
+                    self._offload(function, executor),
+                    run_once=run_once,
+                    loop=self.loop
+                )
             )
+            return function
             
         return inner
         
+    def _offload(
+        self,
+        function: Callable[..., Any],
+        executor: Optional[ExecutorLike]
+    ) -> Callable[..., Any]:
+        ''' Run :function: on :executor:, as is without one. '''
+        if executor is None:
+            return function
+            
+        if isinstance(executor, str) and executor not in ('thread', 'process'):
+            raise ValueError(
+                "executor must be 'thread', 'process' or an Executor, "
+                f"not '{executor}'."
+            )
+            
+        return offload(
+            function,
+            lambda: self._get_pool(executor),
+            lambda: self.http
+        )
+        
+    def _get_pool(self, executor: ExecutorLike) -> Executor:
+        
+        if not isinstance(executor, str):
+            return executor
+            
+        if (pool := self._pools.get(executor)) is None:
+            
+            if executor == 'thread':
+                pool = ThreadPoolExecutor(thread_name_prefix='dispycord')
+            else:
+                # Forking a process running an event loop is not safe.
+                pool = ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                
+            self._pools[executor] = pool
+            
+        return pool
+        
+    async def wait_for(
+        self,
+        event: str,
+        *,
+        check: Optional[Callable[..., bool]] = None,
+        timeout: Optional[float] = None,
+        channel_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Any:
+        '''
+        Wait for the next dispatch of :event:.
+        
+        Waiters are indexed by event, channel and user,
+        a dispatch only runs the checks of waiters it could match.
+        
+        Parameters
+        ----------
+        :event: e.g. 'message_create' or 'on_message_create'.
+        :check: called with the event's arguments, must return True to match.
+        :timeout: seconds to wait, raises asyncio.TimeoutError.
+        :channel_id: only match events in this channel.
+        :user_id: only match events from this user.
+        
+        Return
+        ------
+        The event's argument, a tuple if it has several.
+        '''
+        if not event.startswith('on_'):
+            event = 'on_' + event
+            
+        key = (
+            None if channel_id is None else int(channel_id),
+            None if user_id is None else int(user_id)
+        )
+        future = self.loop.create_future()
+        bucket = self._waiters.setdefault(event, {}).setdefault(key, {})
+        bucket[future] = check
+        
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            bucket.pop(future, None)
+            
+            buckets = self._waiters.get(event)
+            
+            if not bucket and buckets is not None:
+                
+                if buckets.get(key) is bucket:
+                    del buckets[key]
+                    
+                if not buckets:
+                    del self._waiters[event]
+                    
+    def _resolve_waiters(
+        self,
+        buckets: Dict[WaiterKey, WaiterBucket],
+        param: tuple
+    ) -> None:
+        
+        if len(buckets) == 1 and (None, None) in buckets:
+            keys: Tuple[WaiterKey, ...] = ((None, None),)
+        else:
+            channel_id, user_id = _index_keys(param)
+            keys = (
+                (None, None),
+                (channel_id, None),
+                (None, user_id),
+                (channel_id, user_id),
+            )
+            
+        result = param[0] if len(param) == 1 else (param or None)
+        
+        for key in keys:
+            
+            if (bucket := buckets.get(key)) is None:
+                continue
+                
+            for future, check in list(bucket.items()):
+                
+                if future.done():
+                    continue
+                    
+                try:
+                    if check is None or check(*param):
+                        future.set_result(result)
+                except Exception as exc:
+                    future.set_exception(exc)
+        
     def _build_command(self) -> None:
         '''
         Request for slash command.
+        Every shard calls this on READY, the sync runs once per process.
         
         Return
         ------
         None
         '''
-        for command in self.commands:
-            ...
+        if self._sync_commands and self._sync_task is None:
+            self._sync_task = self.loop.create_task(self._run_sync())
+            
+    async def _run_sync(self) -> None:
+        try:
+            await self.sync_commands()
+        except Exception:
+            # The next READY tries again.
+            self._sync_task = None
+            log.exception('Application command sync failed.')
             
-    async def dispatch(self, ev: str, *param) -> Optional[Any]:
+    async def sync_commands(self) -> int:
+        '''
+        Upload the command sets which changed since the last sync.
         
-        if (evd := self.listeners.get(ev, None)) is None or evd.dispatched:
+        Return
+        ------
+        Number of sets uploaded.
+        '''
+        uploaded = await sync_commands(
+            self.http,
+            self.application_id or self.id,
+            self.commands,
+            self.command_cache
+        )
+        # Commands got their ids.
+        self._command_index = None
+        
+        if uploaded:
+            log.info('Synced %s application command set(s).', uploaded)
+            
+        return uploaded
+            
+    @property
+    def command_index(self) -> CommandIndex:
+        if self._command_index is None:
+            self._command_index = CommandIndex(self.commands)
+        return self._command_index
+        
+    async def _invoke(self, interaction: Interaction) -> None:
+        '''
+        Run an application command interaction's callback.
+        
+        Parameter
+        ----------
+        :interaction: called with it and its options as keyword arguments.
+        '''
+        found = self.command_index.find(
+            interaction.data, interaction.command_path
+        )
+        
+        if found is None:
+            log.debug('No command for %r', interaction)
+            return
+            
+        command, callback = found
+        timer = None
+        
+        if self.auto_defer is not None:
+            elapsed = time.monotonic() - interaction.received_at
+            timer = self.loop.call_later(
+                max(0.0, self.auto_defer - elapsed),
+                self._auto_defer,
+                interaction
+            )
+            
+        try:
+            await callback(interaction, **interaction.options)
+        except Exception as exc:
+            
+            if (handler := command.has_error_handler):
+                await handler(interaction, exc)
+            else:
+                log.exception(
+                    "Ignoring exception in command '%s'", command.name
+                )
+        finally:
+            if timer is not None:
+                timer.cancel()
+                
+    async def _process_commands(self, message: Message) -> None:
+        await self.prefix_commands.process(self, message)
+        
+    def _auto_defer(self, interaction: Interaction) -> None:
+        
+        if not interaction.responded:
+            self.loop.create_task(self._defer(interaction))
+            
+    async def _defer(self, interaction: Interaction) -> None:
+        try:
+            await interaction.defer()
+        except Exception:
+            log.exception('Could not defer %r', interaction)
+            
+    async def close(self) -> None:
+        await super().close()
+        
+        if self.dispatch_executor is not None:
+            await self.dispatch_executor.close()
+            
+        if self.profiler is not None:
+            await self.profiler.close()
+            
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+            
+    def has_listener(self, ev: str) -> bool:
+        if self.listeners.get(ev) or ev in self._waiters:
+            return True
+            
+        if ev == 'on_interaction_create':
+            return bool(self.commands)
+            
+        if ev == 'on_message_create':
+            return self.prefix_commands is not None
+            
+        return False
+        
+    async def dispatch(self, ev: str, *param) -> Optional[List[asyncio.Task]]:
+        
+        if (buckets := self._waiters.get(ev)) is not None:
+            self._resolve_waiters(buckets, param)
+            
+        commands = ev == 'on_interaction_create' and self.commands
+        
+        if commands and param[0].type == APPLICATION_COMMAND:
+            
+            if self.dispatch_executor is not None:
+                await self.dispatch_executor.submit(self._invoke, param)
+            else:
+                self.loop.create_task(self._invoke(param[0]))
+                
+        elif ev == 'on_message_create' and self.prefix_commands is not None:
+            
+            if self.dispatch_executor is not None:
+                await self.dispatch_executor.submit(
+                    self._process_commands, param
+                )
+            else:
+                self.loop.create_task(self._process_commands(param[0]))
+                
+        if not (listeners := self.listeners.get(ev)):
             return None
             
-        return evd(*param)
+        # Listeners are only wrapped when metrics or profiling is on.
+        instrumented = self.metrics is not None or self.profiler is not None
+        dispatched_at = time.perf_counter()
+        
+        if (executor := self.dispatch_executor) is not None:
+            
+            for listener in list(listeners):
+                function = listener.consume()
+                
+                if instrumented:
+                    function = self._instrument(function, ev, dispatched_at)
+                    
+                await executor.submit(function, param)
+                
+            tasks = None
+        elif not instrumented:
+            tasks = [listener(*param) for listener in listeners]
+        else:
+            instrument = functools.partial(
+                self._instrument, ev=ev, dispatched_at=dispatched_at
+            )
+            tasks = [
+                self.loop.create_task(instrument(listener.consume())(*param))
+                for listener in listeners
+            ]
+        
+        # run_once listeners are done after their first dispatch.
+        listeners[:] = [
+            listener for listener in listeners if not listener.dispatched
+        ]
+        
+        return tasks
+        
+    def _instrument(
+        self,
+        function: Callable[..., Any],
+        ev: str,
+        dispatched_at: float
+    ) -> Callable[..., Any]:
+        if (profiler := self.profiler) is not None:
+            if not profiler.running:
+                profiler.start(self.loop)
+            function = profiler.wrap(function, ev)
+            
+        if self.metrics is not None:
+            function = _timed(function, self.metrics, dispatched_at)
+            
+        return function
         
     @property
     def commands(self):
@@ -103,4 +520,58 @@ class Bot(Client):
         
     @property
     def listeners(self):
-        return self._listeners
\ No newline at end of file
+        return self._listeners
+
+
+def _timed(
+    function: Callable[..., Any],
+    metrics: Metrics,
+    dispatched_at: float
+) -> Callable[..., Any]:
+    ''' Wrap a listener to record its dispatch latency and run time. '''
+    labels = (function.__qualname__,)
+    
+    @functools.wraps(function)
+    async def timed(*param):
+        started = time.perf_counter()
+        metrics.dispatch_latency.observe(labels, started - dispatched_at)
+        
+        try:
+            return await function(*param)
+        finally:
+            metrics.handler_duration.observe(
+                labels, time.perf_counter() - started
+            )
+            
+    return timed
+
+
+def _index_keys(param: tuple) -> WaiterKey:
+    '''
+    (channel_id, user_id) of an event's first argument,
+    for the waiter index.
+    '''
+    if not param:
+        return None, None
+        
+    first = param[0]
+    data = first.raw if isinstance(first, (Message, Interaction)) else first
+    
+    if not isinstance(data, dict):
+        return None, None
+        
+    user_id = data.get('user_id')
+    
+    if user_id is None:
+        member = data.get('member') or {}
+        user = (
+            data.get('author') or data.get('user') or member.get('user') or {}
+        )
+        user_id = user.get('id')
+        
+    channel_id = data.get('channel_id')
+    
+    return (
+        None if channel_id is None else int(channel_id),
+        None if user_id is None else int(user_id)
+    )
\ No newline at end of file
@@ -1,9 +1,13 @@
 import asyncio
-from typing import Optional
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
 
 from .. import HTTP
+from ..cache import CachePolicy, StateCache
+from ..codec import JSONCodec, get_codec
 from .. import AutoSharded
 from ..intents import Intent
+from ..metrics import Metrics
 
 __all__ = ("Client",)
 
@@ -12,28 +16,207 @@ class Client(AutoSharded):
     
     """ Discord Client """
     
-    def __init__(self, *, intent: int = 513):
-        super().__init__()
+    def __init__(
+        self,
+        *,
+        intent: int = 513,
+        compress: bool = False,
+        encoding: str = 'json',
+        json_codec: Optional[Union[str, JSONCodec]] = None,
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[Iterable[int]] = None,
+        cache: Optional[Dict[str, CachePolicy]] = None,
+        http_options: Optional[dict] = None,
+        metrics: bool = False,
+        metrics_port: Optional[int] = None,
+        gateway_url: Optional[str] = None
+    ):
+        """
+        :param intent: Gateway intents.
+        :param compress: use zlib-stream transport compression on the gateway.
+        :param encoding: gateway payload encoding, either 'json' or 'etf'.
+            ETF only decodes faster with erlpack installed, the pure
+            Python fallback is slower than JSON.
+        :param json_codec: 'orjson', 'msgspec', 'ujson' or 'json',
+            used by the gateway and REST. Defaults to the fastest installed.
+        :param shard_count: total shards, Discord's recommendation by default.
+        :param shard_ids: shards this process runs, all of them by default.
+        :param cache: CachePolicy per entity type,
+            keys are 'guilds', 'channels', 'members' and 'messages'.
+        :param http_options: passed to :HTTP:, e.g. connection pool
+            size (limit, limit_per_host), ttl_dns_cache, keepalive_timeout
+            or outbound_queue to coalesce message sends per channel.
+        :param metrics: record gateway, REST, rate limit and handler
+            metrics in :metrics:, off by default.
+        :param metrics_port: serve them in the Prometheus text format
+            on http://127.0.0.1:<port>/metrics, needs metrics.
+        :param gateway_url: websocket URL connected to instead of Discord's,
+            e.g. a :dispycord.testing.FakeGateway:. REST follows
+            http_options' base_url.
+        """
+        super().__init__(shard_count=shard_count, shard_ids=shard_ids)
         
         self.intent = intent
+        self.compress = compress
+        self.encoding = encoding
+        self.codec: JSONCodec = get_codec(json_codec)
+        self.cache = StateCache(**(cache or {}))
         
         self._loop = asyncio.get_event_loop()
         self._http: Optional[HTTP] = None
+        self._http_options: dict = http_options or {}
         
         self.user: Optional[dict] = None
+        self.application_id: Optional[int] = None
+        
+        self.metrics: Optional[Metrics] = Metrics(self) if metrics else None
+        self._metrics_port = metrics_port
+        self.gateway_url = gateway_url
     
     def run(self, token: str) -> None:
         """
         Invoking gateway to do connect mechanism.
         
         :param token: Bot's token.
+        :raises BaseError: a shard was closed with a fatal code,
+            e.g. LoginFailure for a wrong token.
         """
-        self._http = HTTP(self, token=token)
+        self._http = HTTP(
+            self,
+            token=token,
+            codec=self.codec,
+            **self._http_options
+        )
+        
+        try:
+            if self.metrics is not None and self._metrics_port is not None:
+                self._loop.run_until_complete(
+                    self.metrics.serve(port=self._metrics_port)
+                )
+                
+            self._loop.run_until_complete(
+                self.new_shard()
+            )
+            self._loop.run_forever()
+            
+            if self.shard_error is not None:
+                raise self.shard_error
+        finally:
+            self._loop.run_until_complete(
+                self.close()
+            )
+            
+    async def close(self) -> None:
+        """ Disconnect every shard and close the HTTP session. """
+        for shard in self.shards.values():
+            await shard.close()
+            
+        if self._http is not None:
+            await self._http.close()
+            
+        if self.metrics is not None:
+            await self.metrics.close()
         
-        self._loop.run_until_complete(
-            self.new_shard()
+    async def change_presence(
+        self,
+        *,
+        status: str = 'online',
+        activity: Optional[Union[str, dict]] = None,
+        afk: bool = False,
+        shard_ids: Optional[Iterable[int]] = None
+    ) -> None:
+        """
+        Set the bot's status and activity on every shard, in parallel.
+        
+        Shards send one update per few seconds, updates made in between
+        are coalesced and only the newest is sent, so frequent changes
+        never eat the gateway limit heartbeats need.
+        
+        :param status: 'online', 'idle', 'dnd' or 'invisible'.
+        :param activity: a name shown as "Playing <name>" or an activity dict.
+        :param afk: whether the client is AFK.
+        :param shard_ids: only these shards, every shard by default.
+        """
+        if isinstance(activity, str):
+            activity = {'name': activity, 'type': 0}
+            
+        presence = {
+            'since': int(time.time() * 1000) if status == 'idle' else None,
+            'activities': [] if activity is None else [activity],
+            'status': status,
+            'afk': afk,
+        }
+        
+        shards: List = (
+            list(self.shards.values())
+            if shard_ids is None else
+            [self.shards['shard' + str(shard_id)] for shard_id in shard_ids]
         )
-        self._loop.run_forever()
+        
+        await asyncio.gather(
+            *[shard.update_presence(presence) for shard in shards]
+        )
+        
+    async def request_members(
+        self,
+        guild_id: int,
+        *,
+        query: str = '',
+        limit: int = 0,
+        presences: bool = False,
+        user_ids: Optional[Iterable[int]] = None,
+        cache_only: bool = False,
+        timeout: float = 30.0
+    ) -> AsyncIterator[dict]:
+        """
+        Fetch a guild's members over the gateway, yielding the
+        GUILD_MEMBERS_CHUNK payloads as they arrive.
+        
+        The request goes through the guild's shard and its gateway
+        limiter, requests for guilds on other shards run in parallel.
+        Members are added to the cache if its member policy allows.
+        
+        :param guild_id: the guild.
+        :param query: username prefix, '' for everyone.
+        :param limit: max members, 0 for no limit with an empty query.
+        :param presences: include presences, needs GUILD_PRESENCES.
+        :param user_ids: fetch these members instead of querying.
+        :param cache_only: only fill the cache, the chunks are yielded
+            without their member lists but with a 'count'.
+        :param timeout: seconds to wait for the next chunk.
+        """
+        if cache_only and not self.cache.members.policy.enabled:
+            raise ValueError('cache_only needs the member cache enabled.')
+            
+        shard = self.get_shard(guild_id)
+        nonce, queue = await shard.request_members(
+            guild_id,
+            query=query,
+            limit=limit,
+            presences=presences,
+            user_ids=user_ids,
+            members=not cache_only
+        )
+        
+        try:
+            while True:
+                chunk = await asyncio.wait_for(queue.get(), timeout)
+                yield chunk
+                
+                if chunk['chunk_index'] + 1 >= chunk['chunk_count']:
+                    return
+        finally:
+            shard.finish_member_request(nonce)
+            
+    def has_listener(self, ev: str) -> bool:
+        """ Whether dispatching :ev: would reach a listener. """
+        return False
+        
+    async def dispatch(self, ev: str, *param) -> Optional[Any]:
+        return None
+        
+    def _build_command(self) -> None:
+        ...
         
     def __repr__(self):
         return self.name + '#' + self.discriminator
@@ -51,8 +234,8 @@ class Client(AutoSharded):
         return self.user['username']
         
     @property
-    def id(self):
-        return self.user['id']
+    def id(self) -> int:
+        return int(self.user['id'])
         
     @property
     def discriminator(self):
@@ -0,0 +1,431 @@
+'''
+Multi-process shard clusters.
+
+A supervisor splits the bot's shards across worker processes,
+every worker runs its slice through a normal :Client: / :Bot:.
+Workers report stats and answer queries over a multiprocessing pipe,
+IDENTIFY is coordinated by the supervisor so max_concurrency holds
+across processes.
+'''
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..http import HTTP
+from ..shard import IdentifyRateLimitter
+from .client import Client
+
+__all__ = ("Cluster",)
+
+log = logging.getLogger(__name__)
+
+
+def _guild_count(client: Client) -> int:
+    return sum(len(shard.guilds) for shard in client.shards.values())
+
+
+class _Pipe:
+    ''' Asyncio side of a multiprocessing pipe. '''
+    def __init__(
+        self,
+        conn: Connection,
+        handler: Callable[['_Pipe', dict], Awaitable[None]]
+    ):
+        self.conn = conn
+        self.closed: bool = False
+        
+        self._handler = handler
+        self._nonce = itertools.count()
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(conn.fileno(), self._on_readable)
+    
+    def _on_readable(self) -> None:
+        try:
+            while self.conn.poll():
+                message = self.conn.recv()
+                
+                if message['op'] == 'reply':
+                    future = self._waiters.pop(message['nonce'], None)
+                    
+                    if future is not None:
+                        future.set_result(message['data'])
+                else:
+                    self._loop.create_task(self._handler(self, message))
+        
+        except (EOFError, OSError):
+            self.close()
+    
+    def send(self, message: dict) -> None:
+        if not self.closed:
+            self.conn.send(message)
+    
+    def reply(self, nonce: int, data: Any) -> None:
+        self.send({'op': 'reply', 'nonce': nonce, 'data': data})
+    
+    async def request(
+        self,
+        message: dict,
+        timeout: Optional[float] = None
+    ) -> Any:
+        ''' Send :message: and wait for its reply. '''
+        nonce = next(self._nonce)
+        future = self._waiters[nonce] = self._loop.create_future()
+        
+        self.send({**message, 'nonce': nonce})
+        
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._waiters.pop(nonce, None)
+    
+    def close(self) -> None:
+        if self.closed:
+            return
+        
+        self.closed = True
+        self._loop.remove_reader(self.conn.fileno())
+        self.conn.close()
+        
+        for future in self._waiters.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Cluster pipe closed.'))
+
+
+class _Worker:
+    ''' Runs inside a worker process, next to the client. '''
+    def __init__(
+        self,
+        client: Client,
+        cluster_id: int,
+        conn: Connection,
+        queries: Dict[str, Callable[..., Any]],
+        stats_interval: float
+    ):
+        self.client = client
+        self.cluster_id = cluster_id
+        self.queries = queries
+        self.stats_interval = stats_interval
+        
+        self._conn = conn
+        self._pipe: Optional[_Pipe] = None
+    
+    async def serve(self) -> None:
+        self._pipe = _Pipe(self._conn, self.handle)
+        
+        while not self._pipe.closed:
+            self._pipe.send({'op': 'stats', 'data': self.stats()})
+            await asyncio.sleep(self.stats_interval)
+        
+        log.warning('Cluster %s lost its supervisor.', self.cluster_id)
+        self.client.loop.stop()
+    
+    async def handle(self, pipe: _Pipe, message: dict) -> None:
+        
+        if message['op'] == 'query':
+            try:
+                query = self.queries[message['name']]
+                value = query(self.client, *message['args'])
+                
+                if asyncio.iscoroutine(value):
+                    value = await value
+                
+                data = {'ok': True, 'value': value}
+            except Exception as exc:
+                data = {'ok': False, 'error': f'{type(exc).__name__}: {exc}'}
+            
+            pipe.reply(message['nonce'], data)
+        
+        elif message['op'] == 'stop':
+            self.client.loop.stop()
+    
+    async def wait_identify(self, shard_id: int) -> None:
+        '''
+        Replaces Client.wait_identify,
+        the supervisor paces every process.
+        '''
+        await self._pipe.request({'op': 'identify', 'shard_id': shard_id})
+    
+    def stats(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'shards': {
+                shard.shard_id: {
+                    'connected': (
+                        shard._ws is not None and not shard._ws.closed
+                    ),
+                    'latency': getattr(shard, 'latency', None),
+                    'events': shard.events,
+                    'guilds': len(shard.guilds),
+                }
+                for shard in self.client.shards.values()
+            },
+        }
+
+
+def _run_worker(
+    factory: Callable[[], Client],
+    token: str,
+    cluster_id: int,
+    shard_ids: List[int],
+    shard_count: int,
+    conn: Connection,
+    queries: Dict[str, Callable[..., Any]],
+    stats_interval: float,
+    sync_cluster: Optional[int]
+) -> None:
+    client = factory()
+    client.num_shards = shard_count
+    client.shard_ids = shard_ids
+    
+    # Every worker has the same commands, one upload is enough.
+    if cluster_id != sync_cluster and hasattr(client, '_sync_commands'):
+        client._sync_commands = False
+    
+    worker = _Worker(client, cluster_id, conn, queries, stats_interval)
+    client.wait_identify = worker.wait_identify
+    client.loop.create_task(worker.serve())
+    
+    client.run(token)
+
+
+class Cluster:
+    
+    """ Shard supervisor running one client per process. """
+    
+    def __init__(
+        self,
+        factory: Callable[[], Client],
+        *,
+        clusters: Optional[int] = None,
+        shard_count: Optional[int] = None,
+        stats_interval: float = 10.0,
+        restart: bool = True,
+        sync_cluster: Optional[int] = 0
+    ):
+        """
+        Workers are started with multiprocessing's spawn method,
+        :factory: and query handlers must be importable module-level
+        functions and the script needs an `if __name__ == '__main__'` guard.
+        
+        :param factory: builds the Client / Bot in every worker.
+        :param clusters: worker processes, one per CPU by default.
+        :param shard_count: total shards, Discord's recommendation by default.
+        :param stats_interval: seconds between worker stats reports.
+        :param restart: respawn workers whose process died.
+        :param sync_cluster: the only worker whose Bot syncs the
+            application commands, None lets none of them sync.
+        """
+        self.factory = factory
+        self.clusters: int = clusters or os.cpu_count() or 1
+        self.shard_count = shard_count
+        self.stats_interval = stats_interval
+        self.restart = restart
+        self.sync_cluster = sync_cluster
+        
+        self.stats: Dict[int, dict] = {}
+        self.shard_ids: Dict[int, List[int]] = {}
+        
+        self._token: Optional[str] = None
+        self._context = multiprocessing.get_context('spawn')
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._pipes: Dict[int, _Pipe] = {}
+        self._queries: Dict[str, Callable[..., Any]] = {
+            'guild_count': _guild_count,
+        }
+        self._identify_ratelimitter = IdentifyRateLimitter()
+        self._closed: bool = False
+    
+    def query_handler(
+        self,
+        name: str
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        '''
+        Register a cross-shard query.
+        The handler receives the worker's client and the query's arguments.
+        '''
+        def inner(function: Callable[..., Any]) -> Callable[..., Any]:
+            self._queries[name] = function
+            return function
+        
+        return inner
+    
+    async def query(
+        self,
+        name: str,
+        *args: Any,
+        timeout: float = 5.0
+    ) -> Dict[int, Any]:
+        '''
+        Broadcast a query to every worker.
+        
+        Return
+        ------
+        cluster id -> handler's return value.
+        
+        Raise
+        -----
+        :RuntimeError: a worker's handler raised.
+        '''
+        pipes = list(self._pipes.items())
+        replies = await asyncio.gather(*[
+            pipe.request(
+                {'op': 'query', 'name': name, 'args': args},
+                timeout
+            )
+            for _, pipe in pipes
+        ])
+        
+        result = {}
+        
+        for (cluster_id, _), reply in zip(pipes, replies):
+            if not reply['ok']:
+                raise RuntimeError(f"Cluster {cluster_id}: {reply['error']}")
+            
+            result[cluster_id] = reply['value']
+        
+        return result
+    
+    async def guild_count(self) -> int:
+        ''' Guilds across every cluster. '''
+        return sum((await self.query('guild_count')).values())
+    
+    async def _handle(
+        self,
+        cluster_id: int,
+        pipe: _Pipe,
+        message: dict
+    ) -> None:
+        
+        if message['op'] == 'stats':
+            self.stats[cluster_id] = {
+                **message['data'],
+                'alive': True,
+                'received_at': time.monotonic(),
+            }
+        
+        elif message['op'] == 'identify':
+            await self._identify_ratelimitter.wait(message['shard_id'])
+            pipe.reply(message['nonce'], True)
+    
+    def _spawn(self, cluster_id: int) -> None:
+        parent, child = self._context.Pipe()
+        
+        process = self._context.Process(
+            target=_run_worker,
+            args=(
+                self.factory,
+                self._token,
+                cluster_id,
+                self.shard_ids[cluster_id],
+                self.shard_count,
+                child,
+                self._queries,
+                self.stats_interval,
+                self.sync_cluster
+            ),
+            name=f'dispycord-cluster-{cluster_id}',
+            daemon=True
+        )
+        process.start()
+        child.close()
+        
+        self._processes[cluster_id] = process
+        self._pipes[cluster_id] = _Pipe(
+            parent,
+            lambda pipe, message: self._handle(cluster_id, pipe, message)
+        )
+        
+        log.debug(
+            'Cluster %s (pid %s) runs shards %s',
+            cluster_id,
+            process.pid,
+            self.shard_ids[cluster_id]
+        )
+    
+    async def start(self, token: str) -> None:
+        ''' Spawn the workers and supervise them until :close: is called. '''
+        self._token = token
+        
+        http = HTTP(self, token=token)
+        try:
+            gateway = await http.Route(None, '/gateway/bot', 'GET')
+        finally:
+            await http.close()
+        
+        limit = gateway['session_start_limit']
+        self._identify_ratelimitter.max_concurrency = limit.get(
+            'max_concurrency', 1
+        )
+        
+        if self.shard_count is None:
+            self.shard_count = gateway['shards']
+        
+        shards = list(range(self.shard_count))
+        self.clusters = min(self.clusters, self.shard_count)
+        size = -(-self.shard_count // self.clusters)
+        
+        for cluster_id in range(self.clusters):
+            start = cluster_id * size
+            self.shard_ids[cluster_id] = shards[start:start + size]
+            self._spawn(cluster_id)
+        
+        while not self._closed:
+            await asyncio.sleep(1)
+            
+            for cluster_id, process in self._processes.items():
+                
+                if process.is_alive() or self._closed:
+                    continue
+                
+                log.warning(
+                    'Cluster %s exited with %s.',
+                    cluster_id,
+                    process.exitcode
+                )
+                
+                self._pipes.pop(cluster_id).close()
+                self.stats.setdefault(cluster_id, {})['alive'] = False
+                
+                if self.restart:
+                    self._spawn(cluster_id)
+    
+    async def close(self) -> None:
+        ''' Stop every worker. '''
+        self._closed = True
+        
+        for pipe in self._pipes.values():
+            pipe.send({'op': 'stop'})
+        
+        loop = asyncio.get_running_loop()
+        
+        for process in self._processes.values():
+            await loop.run_in_executor(None, process.join, 10)
+            
+            if process.is_alive():
+                process.terminate()
+        
+        for pipe in self._pipes.values():
+            pipe.close()
+    
+    def run(self, token: str) -> None:
+        """
+        Blocking entry point, same as Client.run.
+        
+        :param token: Bot's token.
+        """
+        async def runner():
+            try:
+                await self.start(token)
+            finally:
+                await self.close()
+        
+        try:
+            asyncio.run(runner())
+        except KeyboardInterrupt:
+            ...
\ No newline at end of file
@@ -6,6 +6,9 @@ from typing import (
     Optional,
     Literal,
     List,
+    Set,
+    Dict,
+    Tuple,
     )
 
 F = Callable[..., Any]
@@ -20,15 +23,22 @@ class Command:
         name: str,
         description: str,
         slash_type: int,
-        guild: Optional[Union[int, List[int]]] = None
+        guild: Optional[Union[int, List[int]]] = None,
+        options: Optional[List[dict]] = None
     ):
-
+        
         self._callback: F = callback
         
         self.name: str = name
         self.description: str = description
         self.type: int = slash_type
         self.guild: Optional[Union[int, List[int]]] = guild
+        self.options: List[dict] = options or []
+        # Filled by the sync, one id per scope the command is registered in.
+        self.ids: Set[int] = set()
+        # (group, subcommand) or (subcommand,)
+        # -> (callback, description, options)
+        self.subcommands: Dict[Tuple[str, ...], Tuple[F, str, List[dict]]] = {}
         
         self._error: Optional[F] = None
         
@@ -38,13 +48,47 @@ class Command:
     ) -> None:
         """
         An error handler when slash returning error signal.
-        | Not Implemented |
+        Called with the interaction and the exception.
         """
         if not inspect.iscoroutinefunction(error_func):
             return
         
         self._error = error_func
         
+    def subcommand(
+        self,
+        *path: str,
+        description: str,
+        options: Optional[List[dict]] = None
+    ) -> Callable[[F], F]:
+        """
+        Subcommand registers.
+        
+        :param path: subcommand's name, or group and subcommand's name.
+        :param description: subcommand's description.
+        :param options: subcommand's options.
+        """
+        if not 1 <= len(path) <= 2:
+            raise ValueError(
+                'A subcommand path is a name or a group and a name.'
+            )
+            
+        def inner(function: F) -> F:
+            self.subcommands[path] = (function, description, options or [])
+            return function
+            
+        return inner
+        
+    def find(self, path: Tuple[str, ...]) -> Optional[F]:
+        """
+        Callback for an invoked subcommand path, the command's own for ().
+        """
+        if not path:
+            return self._callback
+            
+        entry = self.subcommands.get(path)
+        return None if entry is None else entry[0]
+        
     def is_global(self) -> bool:
         """ It is global slash command?
         
@@ -55,8 +99,54 @@ class Command:
         """
         return True if self.guild is None else False
     
+    @property
+    def guild_ids(self) -> List[int]:
+        """ Guilds the command is registered in, empty if global. """
+        if self.guild is None:
+            return []
+        
+        if isinstance(self.guild, (list, tuple, set)):
+            return [int(guild) for guild in self.guild]
+            
+        return [int(self.guild)]
+        
     def to_dict(self) -> dict:
-        ...
+        """ Application command payload. """
+        payload = {
+            'name': self.name,
+            'type': self.type,
+            # Only chat input commands have a description.
+            'description': self.description if self.type == 1 else '',
+        }
+        
+        options = list(self.options)
+        groups: Dict[str, dict] = {}
+        
+        for path, (_, description, sub_options) in self.subcommands.items():
+            option = {'type': 1, 'name': path[-1], 'description': description}
+            
+            if sub_options:
+                option['options'] = sub_options
+                
+            if len(path) == 1:
+                options.append(option)
+                continue
+                
+            if (group := groups.get(path[0])) is None:
+                group = groups[path[0]] = {
+                    'type': 2,
+                    'name': path[0],
+                    'description': path[0],
+                    'options': [],
+                }
+                options.append(group)
+                
+            group['options'].append(option)
+            
+        if options:
+            payload['options'] = options
+            
+        return payload
         
     @property
     def callback(self) -> Callable[..., Any]:
@@ -67,6 +157,51 @@ class Command:
         return self._error or False
         
         
+class CommandIndex:
+    
+    """ Commands by id and by name, so an interaction never scans the list. """
+    
+    def __init__(self, commands: List[Command]):
+        self.by_id: Dict[int, Command] = {}
+        # (type, name, guild id or None)
+        self.by_name: Dict[Tuple[int, str, Optional[int]], Command] = {}
+        
+        for command in commands:
+            
+            for command_id in command.ids:
+                self.by_id[command_id] = command
+                
+            for guild_id in command.guild_ids or (None,):
+                self.by_name[(command.type, command.name, guild_id)] = command
+                
+    def find(
+        self,
+        data: dict,
+        path: Tuple[str, ...]
+    ) -> Optional[Tuple[Command, F]]:
+        """
+        :param data: interaction's data.
+        :param path: invoked subcommand path.
+        
+        Return
+        -------
+        The command and the callback to run, None if unknown.
+        """
+        command = self.by_id.get(int(data['id'])) if 'id' in data else None
+        
+        if command is None:
+            guild = data.get('guild_id')
+            guild_id = None if guild is None else int(guild)
+            command = self.by_name.get(
+                (data.get('type', 1), data.get('name'), guild_id)
+            )
+            
+        if command is None or (callback := command.find(path)) is None:
+            return None
+            
+        return command, callback
+        
+        
 class Event:
     
     def __init__(
@@ -83,12 +218,16 @@ class Event:
         self._loop = loop
         
     def __call__(self, *param) -> Any:
-        if self.run_once:
-            self._dispatched = True
         return self._loop.create_task(
-            self._function(*param)
+            self.consume()(*param)
         )
         
+    def consume(self) -> F:
+        """ The listener's function, marking a run_once event dispatched. """
+        if self.run_once:
+            self._dispatched = True
+        return self._function
+        
     @property
     def dispatched(self) -> bool:
         return self._dispatched
\ No newline at end of file
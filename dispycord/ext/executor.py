@@ -0,0 +1,323 @@
+'''
+Bounded dispatch executor.
+
+Listeners run on a fixed pool of worker tasks instead of one task
+per event. Past :max_pending: queued handlers the overflow policy
+kicks in, handlers sharing a channel or guild can be kept in order.
+'''
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import (
+    Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple, Union
+)
+
+from ..abc import Message
+from ..interactions import Interaction
+
+__all__ = ("DispatchExecutor",)
+
+log = logging.getLogger(__name__)
+
+# (function, param, order key, enqueued at)
+_Entry = Tuple[Callable[..., Any], tuple, Optional[Hashable], float]
+# event's arguments -> order key
+KeyFunction = Callable[[tuple], Optional[Hashable]]
+
+POLICIES = ('block', 'drop', 'shed')
+
+
+def _payload(param: tuple) -> Optional[dict]:
+    if not param:
+        return None
+    
+    first = param[0]
+    data = first.raw if isinstance(first, (Message, Interaction)) else first
+    return data if isinstance(data, dict) else None
+
+
+def _channel_key(param: tuple) -> Optional[Hashable]:
+    data = _payload(param)
+    return None if data is None else data.get('channel_id')
+
+
+def _guild_key(param: tuple) -> Optional[Hashable]:
+    return None if (data := _payload(param)) is None else data.get('guild_id')
+
+
+class _HandlerStats:
+    __slots__ = ('calls', 'failures', 'total', 'max')
+    
+    def __init__(self):
+        self.calls: int = 0
+        self.failures: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+    
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'total': self.total,
+            'max': self.max,
+            'average': self.total / self.calls if self.calls else 0.0,
+        }
+
+
+class DispatchExecutor:
+    
+    """ Worker pool running a Bot's listeners. """
+    
+    def __init__(
+        self,
+        *,
+        workers: int = 64,
+        max_pending: int = 10000,
+        policy: str = 'block',
+        ordered: Optional[Union[str, KeyFunction]] = None
+    ):
+        """
+        :param workers: handlers running at the same time.
+        :param max_pending: handlers waiting for a worker
+            before :policy: applies.
+        :param policy: 'block' makes the dispatching shard wait for room,
+            which stops it reading the gateway, 'drop' discards the new
+            handler and 'shed' discards the oldest queued one.
+        :param ordered: 'channel', 'guild' or a function of the event's
+            arguments returning a key, handlers with the same key run
+            one after another in dispatch order. Unordered by default.
+        """
+        if policy not in POLICIES:
+            raise ValueError(
+                f"policy must be one of {POLICIES}, not '{policy}'."
+            )
+        
+        if ordered == 'channel':
+            ordered = _channel_key
+        elif ordered == 'guild':
+            ordered = _guild_key
+        elif ordered is not None and not callable(ordered):
+            raise ValueError(
+                "ordered must be 'channel', 'guild' or callable, "
+                f"not '{ordered}'."
+            )
+        
+        self.workers = workers
+        self.max_pending = max_pending
+        self.policy = policy
+        self.ordered: Optional[Callable[[tuple], Optional[Hashable]]] = ordered
+        
+        self.submitted: int = 0
+        self.dropped: int = 0
+        self.shed: int = 0
+        self.started: int = 0
+        self.in_flight: int = 0
+        self.max_depth: int = 0
+        self.queue_time: float = 0.0
+        self.handlers: Dict[str, _HandlerStats] = {}
+        
+        self._queue: Deque[_Entry] = deque()
+        # order key -> handlers waiting behind the queued or running one
+        self._active: Dict[Hashable, Deque[_Entry]] = {}
+        self._depth: int = 0
+        
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._room: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closed: bool = False
+    
+    def _start(self) -> None:
+        self._wakeup = asyncio.Condition()
+        self._room = asyncio.Condition()
+        
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._worker()) for _ in range(self.workers)
+        ]
+    
+    async def submit(self, function: Callable[..., Any], param: tuple) -> bool:
+        '''
+        Queue a listener call.
+        
+        Parameter
+        ----------
+        :function: listener's coroutine function.
+        :param: its arguments.
+        
+        Return
+        ------
+        False if the call was dropped.
+        '''
+        if self._closed:
+            return False
+        
+        if self._wakeup is None:
+            self._start()
+        
+        if self._depth >= self.max_pending:
+            
+            if self.policy == 'drop':
+                self.dropped += 1
+                return False
+            
+            shed = self.policy == 'shed' and self._shed()
+            
+            if not shed:
+                async with self._room:
+                    await self._room.wait_for(self._has_room)
+                
+                if self._closed:
+                    return False
+        
+        key = None if self.ordered is None else self.ordered(param)
+        entry = (function, param, key, time.perf_counter())
+        
+        if key is not None and key in self._active:
+            self._active[key].append(entry)
+        else:
+            if key is not None:
+                self._active[key] = deque()
+                
+            self._queue.append(entry)
+        
+        self._depth += 1
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._depth)
+        
+        async with self._wakeup:
+            self._wakeup.notify()
+        
+        return True
+    
+    def _has_room(self) -> bool:
+        return self._depth < self.max_pending or self._closed
+    
+    def _has_work(self) -> bool:
+        return bool(self._queue) or self._closed
+    
+    async def _worker(self) -> None:
+        
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(self._has_work)
+                
+                if self._closed:
+                    return
+                
+                entry = self._queue.popleft()
+            
+            await self._run(entry)
+            
+            if (key := entry[2]) is not None:
+                waiting = self._active[key]
+                
+                while waiting:
+                    await self._run(waiting.popleft())
+                    
+                del self._active[key]
+                
+    def _shed(self) -> bool:
+        ''' Discard the oldest queued handler, False if none is queued. '''
+        if self._queue:
+            key = self._queue.popleft()[2]
+            
+            if key is not None:
+                # The next handler of that key takes the dropped one's place.
+                if waiting := self._active[key]:
+                    self._queue.appendleft(waiting.popleft())
+                else:
+                    del self._active[key]
+        
+        else:
+            # Everything queued waits behind a running handler of its key,
+            # e.g. a single busy channel.
+            waiting = [queue for queue in self._active.values() if queue]
+            
+            if not waiting:
+                return False
+            
+            min(waiting, key=lambda queue: queue[0][3]).popleft()
+        
+        self._depth -= 1
+        self.shed += 1
+        return True
+    
+    async def _run(self, entry: _Entry) -> None:
+        function, param, _, enqueued_at = entry
+        
+        self._depth -= 1
+        self.started += 1
+        self.in_flight += 1
+        
+        async with self._room:
+            self._room.notify()
+        
+        started = time.perf_counter()
+        self.queue_time += started - enqueued_at
+        
+        stats = self.handlers.get(name := function.__name__)
+        
+        if stats is None:
+            stats = self.handlers[name] = _HandlerStats()
+        
+        try:
+            await function(*param)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.failures += 1
+            log.exception("Ignoring exception in '%s'", name)
+        finally:
+            elapsed = time.perf_counter() - started
+            
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            
+            self.in_flight -= 1
+    
+    @property
+    def depth(self) -> int:
+        ''' Handlers waiting for a worker. '''
+        return self._depth
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        ''' Queue depth, overflow counters and handler times. '''
+        return {
+            'depth': self._depth,
+            'max_depth': self.max_depth,
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'shed': self.shed,
+            'started': self.started,
+            'ordered_keys': len(self._active),
+            'average_queue_time': (
+                self.queue_time / self.started if self.started else 0.0
+            ),
+            'handlers': {
+                name: stats.to_dict() for name, stats in self.handlers.items()
+            },
+        }
+    
+    async def close(self) -> None:
+        ''' Stop the workers, queued handlers are discarded. '''
+        self._closed = True
+        
+        if self._wakeup is None:
+            return
+        
+        for condition in (self._wakeup, self._room):
+            async with condition:
+                condition.notify_all()
+        
+        for task in self._tasks:
+            task.cancel()
+        
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        
+        self._queue.clear()
+        self._active.clear()
+        self._depth = 0
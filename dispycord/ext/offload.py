@@ -0,0 +1,189 @@
+'''
+Running handlers off the event loop.
+
+Handlers registered with an `executor=` run in a thread or process pool.
+They receive message snapshots, slimmed picklable copies whose REST calls,
+e.g. `message.channel.send`, are recorded and replayed on the event loop
+with the bot's HTTP once the handler returned.
+'''
+import asyncio
+import functools
+import importlib
+import inspect
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..abc import Message
+from ..http import HTTP
+from ..interactions import Interaction
+
+__all__ = (
+    'Outbox',
+    'offload',
+    'snapshot',
+)
+
+# Message fields process workers get, the rest of the payload stays behind.
+SNAPSHOT_FIELDS = (
+    'id',
+    'channel_id',
+    'guild_id',
+    'content',
+    'timestamp',
+    'tts',
+    'mention_everyone',
+    'mentions',
+    'mention_roles',
+    'attachments',
+    'embeds',
+    'message_reference',
+)
+
+AUTHOR_FIELDS = ('id', 'username', 'discriminator', 'avatar', 'bot')
+
+# (data, endpoint, method)
+Request = Tuple[Any, str, str]
+
+
+class Outbox:
+    ''' Stands in for :HTTP: in a snapshot, recording the requests. '''
+    __slots__ = ('requests',)
+    
+    def __init__(self):
+        self.requests: List[Request] = []
+    
+    async def Route(
+        self,
+        data: Any,
+        endpoint: str,
+        method: str,
+        *,
+        reason: Optional[str] = None
+    ) -> None:
+        self.requests.append((data, endpoint, method))
+
+
+def snapshot(value: Any, outbox: Outbox) -> Any:
+    '''
+    Picklable copy of an event argument.
+    
+    Parameter
+    ----------
+    :value: a listener's argument.
+    :outbox: records the snapshot's REST calls.
+    '''
+    if isinstance(value, Interaction):
+        return Interaction(outbox, value.raw)
+        
+    if not isinstance(value, Message):
+        return value
+    
+    raw = value.raw
+    data = {key: raw[key] for key in SNAPSHOT_FIELDS if key in raw}
+    
+    if (author := raw.get('author')) is not None:
+        data['author'] = {
+            key: author[key] for key in AUTHOR_FIELDS if key in author
+        }
+    
+    return Message(outbox, data)
+
+
+class _Reference:
+    '''
+    A handler pickled by module and name.
+    Decorators may have replaced the module attribute,
+    e.g. by a :Command:, it is unwrapped in the worker.
+    '''
+    __slots__ = ('module', 'qualname')
+    
+    def __init__(self, function: Callable[..., Any]):
+        self.module = function.__module__
+        self.qualname = function.__qualname__
+    
+    def resolve(self) -> Callable[..., Any]:
+        value = importlib.import_module(self.module)
+        
+        for name in self.qualname.split('.'):
+            value = getattr(value, name)
+        
+        # :Command:
+        value = getattr(value, 'callback', value)
+        return inspect.unwrap(value)
+    
+    def __getstate__(self):
+        return self.module, self.qualname
+    
+    def __setstate__(self, state):
+        self.module, self.qualname = state
+
+
+def _call(
+    function: Any,
+    param: tuple,
+    outbox: Outbox
+) -> Tuple[Any, List[Request]]:
+    ''' Runs in the worker. '''
+    if isinstance(function, _Reference):
+        function = function.resolve()
+    
+    result = function(*param)
+    
+    if inspect.iscoroutine(result):
+        result = asyncio.run(result)
+    
+    return result, outbox.requests
+
+
+def offload(
+    function: Callable[..., Any],
+    get_executor: Callable[[], Executor],
+    get_http: Callable[[], HTTP]
+) -> Callable[..., Any]:
+    '''
+    Wrap :function: to run in an executor.
+    
+    Parameter
+    ----------
+    :function: the handler, coroutine function or plain function.
+        Process pools need it importable at module level.
+    :get_executor: returns the pool, called on every run so it can be lazy.
+    :get_http: returns the HTTP replaying the recorded requests.
+    
+    Return
+    ------
+    A coroutine function resolving to the handler's return value.
+    '''
+    @functools.wraps(function)
+    async def wrapper(*param):
+        executor = get_executor()
+        outbox = Outbox()
+        
+        if isinstance(executor, ProcessPoolExecutor):
+            target = _Reference(function)
+        else:
+            target = function
+        
+        result, requests = await asyncio.get_running_loop().run_in_executor(
+            executor,
+            _call,
+            target,
+            tuple(snapshot(value, outbox) for value in param),
+            outbox
+        )
+        
+        # An interaction replays against its live response state.
+        replay = next(
+            (
+                value.replay for value in param
+                if isinstance(value, Interaction)
+            ),
+            get_http().Route
+        )
+        
+        for data, endpoint, method in requests:
+            await replay(data, endpoint, method)
+        
+        return result
+    
+    return wrapper
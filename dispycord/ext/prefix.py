@@ -0,0 +1,493 @@
+'''
+Prefix (text) commands.
+
+Commands, aliases and subcommands live in tries, finding the invoked
+command walks the characters of its token once, whatever the number
+of commands. Messages not starting with a prefix are rejected before
+anything else runs, arguments are only split and converted when the
+command is found, following the callback's annotations.
+'''
+import inspect
+import logging
+import typing
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from ..abc import Message
+from ..cache import CachePolicy, EntityStore
+from ..errors import BadArgument, MissingArgument
+
+__all__ = (
+    'Context',
+    'PrefixCommands',
+    'TextCommand',
+)
+
+log = logging.getLogger(__name__)
+
+F = Callable[..., Any]
+Prefixes = Union[str, Sequence[str]]
+# (guild id) -> prefix or prefixes, may be a coroutine function
+PrefixResolver = Callable[
+    [Optional[int]], Union[Prefixes, Awaitable[Prefixes]]
+]
+
+_TRUE = frozenset(('true', 'yes', 'y', 'on', '1', 'enable', 'enabled'))
+_FALSE = frozenset(('false', 'no', 'n', 'off', '0', 'disable', 'disabled'))
+
+
+def _to_bool(argument: str) -> bool:
+    if (lowered := argument.lower()) in _TRUE:
+        return True
+    if lowered in _FALSE:
+        return False
+    raise ValueError(f"'{argument}' is not a boolean.")
+
+
+_CONVERTERS: Dict[Any, Callable[[str], Any]] = {
+    bool: _to_bool,
+}
+
+
+class _Trie:
+    ''' str -> value, one node per character. '''
+    __slots__ = ('children', 'value')
+    
+    def __init__(self):
+        self.children: Dict[str, '_Trie'] = {}
+        self.value: Any = None
+    
+    def insert(self, key: str, value: Any) -> None:
+        node = self
+        
+        for char in key:
+            if (child := node.children.get(char)) is None:
+                child = node.children[char] = _Trie()
+            node = child
+        
+        if node.value is not None and node.value is not value:
+            raise ValueError(f"'{key}' is already registered.")
+        
+        node.value = value
+    
+    def find(self, key: str) -> Any:
+        node = self
+        
+        for char in key:
+            if (node := node.children.get(char)) is None:
+                return None
+        
+        return node.value
+
+
+class _ArgumentView:
+    ''' Splits the arguments lazily, one token per :next: call. '''
+    __slots__ = ('text', 'index')
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.index = 0
+    
+    def _skip_spaces(self) -> None:
+        text, index = self.text, self.index
+        
+        while index < len(text) and text[index].isspace():
+            index += 1
+        
+        self.index = index
+    
+    def next(self) -> Optional[str]:
+        ''' Next word or "quoted words", None at the end. '''
+        self._skip_spaces()
+        text, start = self.text, self.index
+        
+        if start >= len(text):
+            return None
+        
+        if text[start] == '"' and (end := text.find('"', start + 1)) != -1:
+            self.index = end + 1
+            return text[start + 1:end]
+        
+        end = start
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        
+        self.index = end
+        return text[start:end]
+    
+    def rest(self) -> str:
+        self._skip_spaces()
+        return self.text[self.index:]
+
+
+class Context:
+    ''' A prefix command's invocation. '''
+    __slots__ = ('bot', 'message', 'prefix', 'command', 'invoked_with')
+    
+    def __init__(
+        self,
+        bot: Any,
+        message: Message,
+        prefix: str,
+        command: 'TextCommand',
+        invoked_with: str
+    ):
+        self.bot = bot
+        self.message = message
+        self.prefix = prefix
+        self.command = command
+        self.invoked_with = invoked_with
+    
+    @property
+    def channel(self):
+        return self.message.channel
+    
+    @property
+    def author(self):
+        return self.message.author
+    
+    @property
+    def guild(self):
+        return self.message.guild
+    
+    async def send(self, *args, **kwargs) -> Any:
+        return await self.message.channel.send(*args, **kwargs)
+    
+    async def reply(self, *args, **kwargs) -> Any:
+        return await self.message.channel.reply(*args, **kwargs)
+
+
+class TextCommand:
+    
+    """ A prefix command, may have subcommands. """
+    
+    def __init__(
+        self,
+        callback: F,
+        *,
+        name: str,
+        aliases: Iterable[str] = (),
+        description: str = '',
+        parent: Optional['TextCommand'] = None,
+        key: Callable[[str], str] = str.lower
+    ):
+        if not inspect.iscoroutinefunction(callback):
+            raise TypeError(
+                f"'{callback.__name__}' must be coroutine function."
+            )
+        
+        self.callback = callback
+        self.name = name
+        self.aliases: Tuple[str, ...] = tuple(aliases)
+        self.description = description
+        self.parent = parent
+        
+        # Subcommand names are stored and looked up through the
+        # registry's :PrefixCommands._key:.
+        self._key = key
+        self._children = _Trie()
+        self._error: Optional[F] = None
+        
+        # Resolves string annotations too.
+        hints = typing.get_type_hints(callback)
+        params = list(inspect.signature(callback).parameters.values())
+        # (name, converter, kind, default), skipping the context
+        self._params: List[Tuple[str, Callable[[str], Any], Any, Any]] = [
+            (
+                param.name,
+                _converter(hints.get(param.name, inspect.Parameter.empty)),
+                param.kind,
+                param.default
+            )
+            for param in params[1:]
+        ]
+    
+    def command(
+        self,
+        name: str,
+        *,
+        aliases: Iterable[str] = (),
+        description: str = ''
+    ) -> Callable[[F], 'TextCommand']:
+        """ Subcommand registers, invoked as `<prefix><parent> <name>`. """
+        def inner(function: F) -> TextCommand:
+            command = TextCommand(
+                function,
+                name=name,
+                aliases=aliases,
+                description=description,
+                parent=self,
+                key=self._key
+            )
+            
+            for key in (name, *command.aliases):
+                self._children.insert(self._key(key), command)
+            
+            return command
+        
+        return inner
+    
+    def error(self, error_func: F) -> F:
+        """
+        Called with the context and the exception when the command raised.
+        """
+        self._error = error_func
+        return error_func
+    
+    @property
+    def qualified_name(self) -> str:
+        if self.parent is None:
+            return self.name
+        
+        return f'{self.parent.qualified_name} {self.name}'
+    
+    def _convert(self, view: _ArgumentView) -> Tuple[list, dict]:
+        args, kwargs = [], {}
+        
+        for name, converter, kind, default in self._params:
+            
+            if kind is inspect.Parameter.KEYWORD_ONLY:
+                # Consumes the rest of the message.
+                argument = view.rest() or None
+            elif kind is inspect.Parameter.VAR_POSITIONAL:
+                while (argument := view.next()) is not None:
+                    args.append(_apply(converter, name, argument))
+                continue
+            elif kind is inspect.Parameter.VAR_KEYWORD:
+                continue
+            else:
+                argument = view.next()
+            
+            if argument is None:
+                if default is inspect.Parameter.empty:
+                    raise MissingArgument(f"'{name}' is a required argument.")
+                value = default
+            else:
+                value = _apply(converter, name, argument)
+            
+            if kind is inspect.Parameter.KEYWORD_ONLY:
+                kwargs[name] = value
+            else:
+                args.append(value)
+        
+        return args, kwargs
+    
+    async def invoke(self, ctx: Context, view: _ArgumentView) -> None:
+        try:
+            args, kwargs = self._convert(view)
+            await self.callback(ctx, *args, **kwargs)
+        except Exception as exc:
+            
+            if self._error is not None:
+                await self._error(ctx, exc)
+            else:
+                log.exception(
+                    "Ignoring exception in command '%s'", self.qualified_name
+                )
+    
+    def __repr__(self):
+        return f'<TextCommand {self.qualified_name!r}>'
+
+
+def _converter(annotation: Any) -> Callable[[str], Any]:
+    if annotation is inspect.Parameter.empty or annotation is str:
+        return str
+    
+    return _CONVERTERS.get(annotation, annotation)
+
+
+def _apply(converter: Callable[[str], Any], name: str, argument: str) -> Any:
+    try:
+        return converter(argument)
+    except Exception as exc:
+        raise BadArgument(
+            f"Converting '{argument}' for '{name}' failed: {exc}"
+        ) from exc
+
+
+def _as_tuple(prefixes: Prefixes) -> Tuple[str, ...]:
+    return (prefixes,) if isinstance(prefixes, str) else tuple(prefixes)
+
+
+class PrefixCommands:
+    
+    """ Prefix command registry and message router. """
+    
+    def __init__(
+        self,
+        prefix: Union[str, Sequence[str], PrefixResolver],
+        *,
+        case_insensitive: bool = True,
+        ignore_bots: bool = True,
+        prefix_cache: Optional[CachePolicy] = None
+    ):
+        """
+        :param prefix: prefix, prefixes or a function of the guild id
+            (None in DMs) returning them, may be a coroutine function.
+        :param case_insensitive: match command names in any case.
+        :param ignore_bots: skip messages sent by bots.
+        :param prefix_cache: how long resolved guild prefixes are kept,
+            5 minutes for up to 10000 guilds by default.
+        """
+        self.case_insensitive = case_insensitive
+        self.ignore_bots = ignore_bots
+        
+        self._commands = _Trie()
+        self._resolver: Optional[PrefixResolver] = None
+        self._static: Optional[Tuple[str, ...]] = None
+        self._prefixes = EntityStore(
+            prefix_cache or CachePolicy.expiring(300, 10000)
+        )
+        
+        if callable(prefix):
+            self._resolver = prefix
+        else:
+            self._static = _as_tuple(prefix)
+    
+    def command(
+        self,
+        name: str,
+        *,
+        aliases: Iterable[str] = (),
+        description: str = ''
+    ) -> Callable[[F], TextCommand]:
+        """
+        Command registers.
+        
+        :param name: invoked as `<prefix><name>`.
+        :param aliases: other names.
+        :param description: command's description.
+        """
+        def inner(function: F) -> TextCommand:
+            command = TextCommand(
+                function,
+                name=name,
+                aliases=aliases,
+                description=description,
+                key=self._key
+            )
+            
+            for key in (name, *command.aliases):
+                self._commands.insert(self._key(key), command)
+            
+            return command
+        
+        return inner
+    
+    def _key(self, name: str) -> str:
+        return name.lower() if self.case_insensitive else name
+    
+    def invalidate_prefix(self, guild_id: Optional[int] = None) -> None:
+        ''' Drop a resolved guild prefix, every one if :guild_id: is None. '''
+        if guild_id is None:
+            self._prefixes.clear()
+        else:
+            self._prefixes.pop(guild_id)
+    
+    async def get_prefixes(self, guild_id: Optional[int]) -> Tuple[str, ...]:
+        if self._static is not None:
+            return self._static
+        
+        if (prefixes := self._prefixes.get(guild_id)) is not None:
+            return prefixes
+        
+        prefixes = self._resolver(guild_id)
+        
+        if inspect.isawaitable(prefixes):
+            prefixes = await prefixes
+        
+        prefixes = _as_tuple(prefixes)
+        self._prefixes.set(guild_id, prefixes)
+        return prefixes
+    
+    def find(
+        self,
+        text: str
+    ) -> Optional[Tuple[TextCommand, str, _ArgumentView]]:
+        '''
+        Resolve the command at the start of :text:, prefix excluded.
+        
+        Return
+        ------
+        The deepest matching (sub)command, the name it was invoked with
+        and the view over its arguments, None if nothing matched.
+        '''
+        view = _ArgumentView(text)
+        
+        if (token := view.next()) is None:
+            return None
+        
+        if (command := self._commands.find(self._key(token))) is None:
+            return None
+        
+        invoked_with = token
+        
+        while command._children.children:
+            index = view.index
+            
+            token = view.next()
+            child = token and command._children.find(command._key(token))
+            
+            if not child:
+                view.index = index
+                break
+            
+            command = child
+            invoked_with += ' ' + token
+        
+        return command, invoked_with, view
+    
+    async def process(self, bot: Any, message: Message) -> bool:
+        '''
+        Run the command a message invokes.
+        
+        Return
+        ------
+        Whether a command ran.
+        '''
+        raw = message.raw
+        content: str = raw.get('content', '')
+        
+        if not content:
+            return False
+        
+        if self._static is not None:
+            # Fast reject, no lookup for the bulk of messages.
+            if not content.startswith(self._static):
+                return False
+            prefixes = self._static
+        else:
+            guild_id = raw.get('guild_id')
+            prefixes = await self.get_prefixes(
+                None if guild_id is None else int(guild_id)
+            )
+            
+            if not content.startswith(prefixes):
+                return False
+        
+        if self.ignore_bots and raw.get('author', {}).get('bot'):
+            return False
+        
+        # Longest first, '!!' wins over '!'.
+        prefix = max(
+            (prefix for prefix in prefixes if content.startswith(prefix)),
+            key=len
+        )
+        
+        if (found := self.find(content[len(prefix):])) is None:
+            return False
+        
+        command, invoked_with, view = found
+        ctx = Context(bot, message, prefix, command, invoked_with)
+        await command.invoke(ctx, view)
+        return True
@@ -0,0 +1,300 @@
+'''
+Listener profiling.
+
+A profiled listener's coroutine is driven one step at a time, every
+step's wall and thread CPU time is measured, so the time a handler
+held the event loop is told apart from the time it spent awaiting.
+A watchdog thread samples the loop thread's stack when a step runs
+past the threshold, and a monitor task measures how late the loop
+wakes up. Nothing of this runs unless the bot is given a :Profiler:.
+'''
+import asyncio
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+__all__ = (
+    'HandlerSample',
+    'Profiler',
+)
+
+log = logging.getLogger(__name__)
+
+F = Callable[..., Any]
+
+# 'handler' gets every HandlerSample, 'slow' the ones past the
+# threshold, 'lag' the loop lag in seconds on every monitor tick.
+HOOKS = ('handler', 'slow', 'lag')
+
+
+class HandlerSample:
+    ''' One listener call. '''
+    __slots__ = (
+        'listener',
+        'event',
+        'wall',
+        'on_loop',
+        'cpu',
+        'steps',
+        'longest_step',
+        'stack',
+        'error',
+    )
+    
+    def __init__(self, listener: str, event: str):
+        self.listener = listener
+        self.event = event
+        # Call to return, awaits included.
+        self.wall: float = 0.0
+        # Time the coroutine's steps held the loop, and their CPU time.
+        self.on_loop: float = 0.0
+        self.cpu: float = 0.0
+        self.steps: int = 0
+        self.longest_step: float = 0.0
+        # Loop thread's stack while the longest step was running late.
+        self.stack: Optional[traceback.StackSummary] = None
+        self.error: Optional[BaseException] = None
+    
+    def __repr__(self):
+        return (
+            f'<HandlerSample listener={self.listener!r} event={self.event!r} '
+            f'wall={self.wall:.4f} on_loop={self.on_loop:.4f} '
+            f'cpu={self.cpu:.4f} longest_step={self.longest_step:.4f}>'
+        )
+
+
+class _Profiled:
+    ''' Awaitable driving a listener's coroutine one step at a time. '''
+    __slots__ = ('_profiler', '_coro', '_sample')
+    
+    def __init__(self, profiler: 'Profiler', coro: Any, sample: HandlerSample):
+        self._profiler = profiler
+        self._coro = coro
+        self._sample = sample
+    
+    def __await__(self):
+        profiler, sample = self._profiler, self._sample
+        iterator = self._coro.__await__()
+        value, error = None, None
+        started = time.perf_counter()
+        
+        try:
+            while True:
+                previous = profiler._step
+                step_started = time.perf_counter()
+                cpu_started = time.thread_time()
+                profiler._step = (sample, step_started)
+                
+                try:
+                    if error is None:
+                        future = iterator.send(value)
+                    else:
+                        future = iterator.throw(error)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    profiler._step = previous
+                    step = time.perf_counter() - step_started
+                    sample.cpu += time.thread_time() - cpu_started
+                    sample.on_loop += step
+                    sample.steps += 1
+                    
+                    if step > sample.longest_step:
+                        sample.longest_step = step
+                
+                try:
+                    value, error = (yield future), None
+                except GeneratorExit:
+                    iterator.close()
+                    raise
+                except BaseException as exc:
+                    value, error = None, exc
+        
+        except BaseException as exc:
+            sample.error = exc
+            raise
+        
+        finally:
+            sample.wall = time.perf_counter() - started
+            profiler._record(sample)
+
+
+class Profiler:
+    
+    """ Per-listener timings, slow handler detection and loop lag. """
+    
+    def __init__(
+        self,
+        *,
+        threshold: float = 0.1,
+        lag_interval: float = 0.5,
+        sample_stacks: bool = True
+    ):
+        """
+        :param threshold: seconds a single step may hold the loop before
+            the handler is reported slow, also the loop lag warned about.
+        :param lag_interval: seconds between loop lag measurements.
+        :param sample_stacks: sample the loop thread's stack from a
+            watchdog thread when a step runs past the threshold.
+        """
+        self.threshold = threshold
+        self.lag_interval = lag_interval
+        self.sample_stacks = sample_stacks
+        
+        # listener -> calls, slow, wall, on_loop, cpu, longest_step
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.lag: float = 0.0
+        self.max_lag: float = 0.0
+        
+        self._hooks: Dict[str, List[F]] = {kind: [] for kind in HOOKS}
+        # (sample, started) of the step running on the loop,
+        # read by the watchdog.
+        self._step: Optional[Tuple[HandlerSample, float]] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+    
+    def hook(self, kind: str) -> Callable[[F], F]:
+        """
+        Hook registers, e.g. to hand the samples to a tracer.
+        Hooks are plain functions called on the loop, keep them short.
+        
+        :param kind: 'handler' (every HandlerSample), 'slow' (samples
+            past the threshold) or 'lag' (loop lag in seconds).
+        """
+        if kind not in HOOKS:
+            raise ValueError(
+                f"Unknown hook '{kind}', expected one of {HOOKS}."
+            )
+        
+        def inner(function: F) -> F:
+            self._hooks[kind].append(function)
+            return function
+        
+        return inner
+    
+    def remove_hook(self, kind: str, function: F) -> None:
+        self._hooks[kind].remove(function)
+    
+    def _emit(self, kind: str, value: Any) -> None:
+        for hook in self._hooks[kind]:
+            try:
+                hook(value)
+            except Exception:
+                log.exception("Ignoring exception in '%s' profiler hook", kind)
+    
+    def wrap(self, function: F, event: str) -> F:
+        ''' Profile every call of a listener. '''
+        name = function.__qualname__
+        
+        @functools.wraps(function)
+        async def profiled(*param):
+            sample = HandlerSample(name, event)
+            return await _Profiled(self, function(*param), sample)
+        
+        return profiled
+    
+    def _record(self, sample: HandlerSample) -> None:
+        if (stats := self.stats.get(sample.listener)) is None:
+            stats = self.stats[sample.listener] = dict.fromkeys(
+                ('calls', 'slow', 'wall', 'on_loop', 'cpu', 'longest_step'), 0
+            )
+        
+        stats['calls'] += 1
+        stats['wall'] += sample.wall
+        stats['on_loop'] += sample.on_loop
+        stats['cpu'] += sample.cpu
+        stats['longest_step'] = max(stats['longest_step'], sample.longest_step)
+        
+        self._emit('handler', sample)
+        
+        if sample.longest_step >= self.threshold:
+            stats['slow'] += 1
+            log.warning(
+                'Listener %s held the event loop for %.3fs on %s%s',
+                sample.listener,
+                sample.longest_step,
+                sample.event,
+                '' if sample.stack is None
+                else ':\n' + ''.join(sample.stack.format())
+            )
+            self._emit('slow', sample)
+    
+    @property
+    def running(self) -> bool:
+        return self._lag_task is not None
+    
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        '''
+        Start the lag monitor and the watchdog,
+        called from the loop's thread.
+        '''
+        if self.running:
+            return
+        
+        loop = loop or asyncio.get_event_loop()
+        self._stopped.clear()
+        self._lag_task = loop.create_task(self._monitor_lag(loop))
+        
+        if self.sample_stacks:
+            self._watchdog = threading.Thread(
+                target=self._watch,
+                args=(threading.get_ident(),),
+                name='dispycord-profiler',
+                daemon=True
+            )
+            self._watchdog.start()
+    
+    async def _monitor_lag(self, loop: asyncio.AbstractEventLoop) -> None:
+        interval = self.lag_interval
+        
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            
+            self.lag = lag = max(loop.time() - started - interval, 0.0)
+            self.max_lag = max(self.max_lag, lag)
+            
+            if lag >= self.threshold:
+                log.warning('Event loop lagged %.3fs', lag)
+            
+            self._emit('lag', lag)
+    
+    def _watch(self, thread_id: int) -> None:
+        interval = max(self.threshold / 2, 0.005)
+        
+        while not self._stopped.wait(interval):
+            if (step := self._step) is None:
+                continue
+            
+            sample, started = step
+            
+            running = time.perf_counter() - started
+            
+            if sample.stack is not None or running < self.threshold:
+                continue
+            
+            if (frame := sys._current_frames().get(thread_id)) is None:
+                continue
+            
+            stack = traceback.extract_stack(frame)
+            
+            # The step may have returned meanwhile.
+            if self._step is step:
+                sample.stack = stack
+    
+    async def close(self) -> None:
+        self._stopped.set()
+        
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+        
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
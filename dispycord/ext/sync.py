@@ -0,0 +1,193 @@
+'''
+Application command registration.
+
+Commands are grouped into the global set and one set per guild,
+every set is uploaded with a single bulk-overwrite request.
+A hash of every uploaded set is kept on disk,
+unchanged sets are not uploaded again on the next start.
+Sets missing from the cache are fetched first and only uploaded
+if they differ from the registered commands.
+'''
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..http import HTTP
+from .core import Command
+
+__all__ = (
+    'CommandCache',
+    'sync_commands',
+)
+
+log = logging.getLogger(__name__)
+
+
+def _digest(payload: List[dict]) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _key(command: dict) -> str:
+    return f"{command['type']}:{command['name']}"
+
+
+def _same(sent: Any, current: Any) -> bool:
+    '''
+    Whether :current: has every value of :sent:,
+    fields Discord fills with defaults are not compared.
+    '''
+    if isinstance(sent, dict):
+        return isinstance(current, dict) and all(
+            key in current and _same(value, current[key])
+            for key, value in sent.items()
+        )
+    
+    if isinstance(sent, list):
+        if not isinstance(current, list) or len(sent) != len(current):
+            return False
+        
+        return all(map(_same, sent, current))
+    
+    return sent == current
+
+
+class CommandCache:
+    ''' Uploaded command sets, scope -> {'hash', 'ids'}. '''
+    def __init__(self, path: Optional[str]):
+        '''
+        Parameter
+        ----------
+        :path: JSON file, None keeps nothing and always uploads.
+        '''
+        self.path = path
+        self.scopes: Dict[str, dict] = {}
+        
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    self.scopes = json.load(file)
+            except (OSError, ValueError) as exc:
+                log.warning(
+                    'Ignoring unreadable command cache %s: %s', path, exc
+                )
+    
+    def is_current(self, scope: str, digest: str) -> bool:
+        entry = self.scopes.get(scope)
+        return entry is not None and entry['hash'] == digest
+    
+    def set(self, scope: str, digest: str, ids: Dict[str, str]) -> None:
+        self.scopes[scope] = {'hash': digest, 'ids': ids}
+    
+    def save(self) -> None:
+        if self.path is None:
+            return
+        
+        # Written aside then renamed, a crash never leaves half a file.
+        # The temp name is unique, processes sharing the path never
+        # write into each other's file.
+        directory, name = os.path.split(self.path)
+        fd, temp = tempfile.mkstemp(
+            prefix=name + '.', suffix='.tmp', dir=directory or '.'
+        )
+        
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(self.scopes, file, sort_keys=True)
+            
+            os.replace(temp, self.path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+
+async def sync_commands(
+    http: HTTP,
+    application_id: int,
+    commands: Iterable[Command],
+    cache: CommandCache
+) -> int:
+    '''
+    Bulk-overwrite every changed command set.
+    
+    Only scopes with commands are uploaded, a scope which had commands
+    on the last sync (as the cache knows) and has none now is overwritten
+    with an empty set. Commands get their :ids: from the response or,
+    for skipped sets, from the cache or the fetched commands.
+    
+    Parameter
+    ----------
+    :http: bot's HTTP.
+    :application_id: the bot's application.
+    :commands: every registered command.
+    :cache: hashes of the sets uploaded last time.
+    
+    Return
+    ------
+    Number of sets uploaded.
+    '''
+    prefix = f'{application_id}:'
+    scopes: Dict[str, List[Command]] = {}
+    
+    for command in commands:
+        for guild_id in command.guild_ids or (None,):
+            scope = prefix + ('global' if guild_id is None else str(guild_id))
+            scopes.setdefault(scope, []).append(command)
+    
+    for scope in cache.scopes:
+        if scope.startswith(prefix):
+            scopes.setdefault(scope, [])
+    
+    uploaded = 0
+    changed = False
+    
+    for scope, group in scopes.items():
+        payload = [command.to_dict() for command in group]
+        digest = _digest(payload)
+        
+        if cache.is_current(scope, digest):
+            ids = cache.scopes[scope]['ids']
+        
+        else:
+            guild = scope[len(prefix):]
+            endpoint = (
+                f'/applications/{application_id}/commands'
+                if guild == 'global' else
+                f'/applications/{application_id}/guilds/{guild}/commands'
+            )
+            response = None
+            
+            # Without a cache entry, a restart would upload every set.
+            if scope not in cache.scopes:
+                current = await http.Route(None, endpoint, 'GET')
+                remote = {_key(data): data for data in current}
+                sent = {_key(command): command for command in payload}
+                
+                if sent.keys() == remote.keys() and _same(sent, remote):
+                    response = current
+            
+            if response is None:
+                response = await http.Route(payload, endpoint, 'PUT')
+                uploaded += 1
+                
+                log.debug(
+                    'Uploaded %s command(s) to %s', len(payload), guild
+                )
+            
+            ids = {_key(data): data['id'] for data in response}
+            cache.set(scope, digest, ids)
+            changed = True
+        
+        for command in group:
+            command_id = ids.get(f'{command.type}:{command.name}')
+            
+            if command_id is not None:
+                command.ids.add(int(command_id))
+    
+    if changed:
+        cache.save()
+    
+    return uploaded
@@ -1,30 +1,398 @@
+import asyncio
+import logging
+import re
+import time
 import aiohttp
-from typing import Union, Optional
+from typing import Any, Dict, Union, Optional, Tuple
+
+from .codec import JSONCodec, get_codec
+from .errors import HTTPException
+from .metrics import route_label
+from .outbound import OutboundQueue
 
 __all__ = (
 	"HTTP",
+	"Bucket",
+	"HTTPRateLimitter",
 )
 
 base_url = 'https://discord.com/api/v9'
 
+log = logging.getLogger(__name__)
+
+_MAJOR_PARAMETER = re.compile(
+    r'^(channels|guilds|webhooks|interactions)/(\d+)(?:/([^/]+))?'
+)
+_SNOWFLAKE = re.compile(r'/\d+')
+
+
+def get_route(method: str, endpoint: str) -> Tuple[str, str]:
+    '''
+    Split an endpoint into its route and major parameter.
+    
+    Discord keys ratelimits by route and by the major parameter
+    (channel_id, guild_id, webhook_id + token or interaction_id + token), so
+    `/channels/1/messages` and `/channels/2/messages` share a route
+    but never a bucket. Webhook and interaction tokens are masked
+    in the route, one interaction is not a route of its own.
+    
+    Return
+    ------
+    (route, major parameter)
+    '''
+    path = endpoint.split('?', 1)[0].strip('/')
+    major = ''
+    
+    if (match := _MAJOR_PARAMETER.match(path)) is not None:
+        major = match.group(2)
+        
+        # Tokens are per webhook / interaction, so are their limits.
+        if match.group(1) in ('webhooks', 'interactions') and match.group(3):
+            major += '/' + match.group(3)
+    
+    return route_label(f'{method} {_SNOWFLAKE.sub("/{id}", path)}'), major
+
+
+class Bucket:
+    ''' A single Discord ratelimit bucket. '''
+    def __init__(self):
+        '''
+        Attributes
+        -----------
+        :limit: requests allowed per window, None until Discord tells us.
+        :remaining: requests left in the current window.
+        :reset_at: monotonic time the current window resets.
+        '''
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: float = 0.0
+        
+        self._lock = asyncio.Lock()
+        self._known: bool = False
+        self._learning: bool = False
+        # Requests between acquire and release.
+        self._users: int = 0
+    
+    async def acquire(self) -> float:
+        '''
+        Wait until the bucket allows another request.
+        
+        Until the first response told us the bucket's limits, requests
+        are sent one at a time so we never overshoot an unknown limit.
+        
+        Return
+        ------
+        Seconds spent sleeping on this bucket, :release: must follow.
+        '''
+        self._users += 1
+        
+        try:
+            await self._lock.acquire()
+        except BaseException:
+            self._users -= 1
+            raise
+        
+        try:
+            slept = await self._wait()
+        except BaseException:
+            self._users -= 1
+            self._lock.release()
+            raise
+        
+        if self._known:
+            self._lock.release()
+        else:
+            self._learning = True
+        
+        return slept
+    
+    def release(self) -> None:
+        ''' Request done, release the lock held while learning the bucket. '''
+        self._users -= 1
+        
+        if self._learning:
+            self._learning = False
+            self._lock.release()
+    
+    async def _wait(self) -> float:
+        slept = 0.0
+        
+        while self.remaining is not None and self.remaining <= 0:
+            
+            if (delay := self.reset_at - time.monotonic()) <= 0:
+                # The next reset is unknown until this request comes back.
+                self.remaining = self.limit
+                self._known = False
+                break
+            
+            log.debug('Bucket exhausted, sleeping %.2f seconds.', delay)
+            await asyncio.sleep(delay)
+            slept += delay
+        
+        if self.remaining is not None:
+            self.remaining -= 1
+        
+        return slept
+    
+    def update(self, headers) -> None:
+        ''' Update the bucket from the response's ratelimit headers. '''
+        self._known = True
+        
+        if (limit := headers.get('X-RateLimit-Limit')) is not None:
+            self.limit = int(limit)
+        
+        if (remaining := headers.get('X-RateLimit-Remaining')) is not None:
+            # Requests still in flight already took their share locally.
+            self.remaining = (
+                int(remaining)
+                if self.remaining is None
+                else min(self.remaining, int(remaining))
+            )
+        
+        if (reset_after := headers.get('X-RateLimit-Reset-After')) is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+    
+    @property
+    def idle(self) -> bool:
+        ''' Nobody uses the bucket and its window is over, drop it. '''
+        return self._users == 0 and time.monotonic() >= self.reset_at
+    
+    def exhaust(self, retry_after: float) -> None:
+        ''' Mark the bucket empty for :retry_after: seconds. '''
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+
+
+class HTTPRateLimitter:
+    ''' REST ratelimit. '''
+    def __init__(self, *, per_second: int = 50, prune_interval: float = 60.0):
+        '''
+        ..REST Ratelimit::
+            Every route belongs to a bucket, announced by Discord in the
+            `X-RateLimit-Bucket` header. On top of that a bot may send
+            50 requests per second across all routes.
+        
+        Parameter
+        ----------
+        :per_second: global requests allowed per second
+        :prune_interval: seconds between dropping idle buckets,
+            e.g. one per webhook token.
+        '''
+        self.per_second = per_second
+        self.prune_interval = prune_interval
+        
+        self._buckets: Dict[Tuple[str, str], Bucket] = {}
+        self._bucket_hashes: Dict[str, str] = {}
+        self._prune_at = time.monotonic() + prune_interval
+        
+        self._global_remaining = per_second
+        self._global_reset_at = 0.0
+        self._global_lock = asyncio.Lock()
+        self._global_over = asyncio.Event()
+        self._global_over.set()
+    
+    def get_bucket(self, route: str, major: str) -> Bucket:
+        ''' Bucket for a route, keyed by learned bucket hash when known. '''
+        key = (self._bucket_hashes.get(route, route), major)
+        
+        if (bucket := self._buckets.get(key)) is None:
+            
+            if time.monotonic() >= self._prune_at:
+                self.prune()
+            
+            bucket = self._buckets[key] = Bucket()
+        
+        return bucket
+    
+    def prune(self) -> int:
+        '''
+        Drop the buckets whose window is over and nobody waits on,
+        a new request simply learns them again.
+        
+        Return
+        ------
+        Number of buckets dropped.
+        '''
+        idle = [key for key, bucket in self._buckets.items() if bucket.idle]
+        
+        for key in idle:
+            del self._buckets[key]
+        
+        self._prune_at = time.monotonic() + self.prune_interval
+        return len(idle)
+    
+    def update(
+        self,
+        route: str,
+        major: str,
+        bucket: Bucket,
+        headers
+    ) -> Bucket:
+        '''
+        Learn the route's bucket hash and update the bucket from headers.
+        
+        Return
+        ------
+        The bucket the route belongs to from now on.
+        '''
+        bucket_hash = headers.get('X-RateLimit-Bucket')
+        
+        known = self._bucket_hashes.get(route)
+        
+        if bucket_hash is not None and known != bucket_hash:
+            self._bucket_hashes[route] = bucket_hash
+            self._buckets.pop((route, major), None)
+            bucket = self._buckets.setdefault((bucket_hash, major), bucket)
+        
+        bucket.update(headers)
+        return bucket
+    
+    async def acquire_global(self) -> float:
+        '''
+        Wait for the global limit.
+        
+        Return
+        ------
+        Seconds spent sleeping.
+        '''
+        slept = 0.0
+        
+        if not self._global_over.is_set():
+            start = time.monotonic()
+            await self._global_over.wait()
+            slept += time.monotonic() - start
+        
+        async with self._global_lock:
+            
+            while True:
+                
+                if (now := time.monotonic()) >= self._global_reset_at:
+                    self._global_reset_at = now + 1
+                    self._global_remaining = self.per_second
+                
+                if self._global_remaining > 0:
+                    self._global_remaining -= 1
+                    return slept
+                
+                await asyncio.sleep(delay := self._global_reset_at - now)
+                slept += delay
+    
+    async def lock_global(self, retry_after: float) -> None:
+        ''' Hold every route for :retry_after: seconds. '''
+        if not self._global_over.is_set():
+            await self._global_over.wait()
+            return
+        
+        log.warning('Global ratelimit, sleeping %.2f seconds.', retry_after)
+        
+        self._global_over.clear()
+        try:
+            await asyncio.sleep(retry_after)
+        finally:
+            self._global_over.set()
+
+
+async def _json_or_text(
+    response: aiohttp.ClientResponse,
+    codec: JSONCodec
+) -> Any:
+    body = await response.read()
+    
+    if response.content_type == 'application/json' and body:
+        return codec.loads(body)
+    
+    return body.decode('utf-8')
+
 
 class HTTP:
+    
+    methods = ('GET', 'POST', 'PATCH', 'PUT', 'DELETE')
+    
     def __init__(self, *args, **kwargs):
-        
+        '''
+        Parameter
+        ---------
+        :token: Bot's token.
+        :max_retries: retries for 429 and 5xx responses.
+        :limit: total REST connections kept in the pool, gateway
+            websockets have their own unbounded connector.
+        :limit_per_host: connections per host, 0 means only :limit: applies.
+        :ttl_dns_cache: seconds resolved DNS entries are cached.
+        :keepalive_timeout: seconds an idle connection is kept warm.
+        :codec: JSON codec name or JSONCodec, see :get_codec:.
+        :outbound_queue: queue message sends per channel and coalesce
+            them, see :OutboundQueue:.
+        :base_url: API root, e.g. a local fake server's.
+        '''
         self._client = args[0]
-        self._client_session = aiohttp.ClientSession()
+        self._client_session: Optional[aiohttp.ClientSession] = None
+        self._gateway_session: Optional[aiohttp.ClientSession] = None
         self._token = kwargs.get('token')
         self._authorization = {'Authorization': f'Bot {self._token}'}
+        self.base_url: str = kwargs.get('base_url', base_url).rstrip('/')
+        
+        self.max_retries: int = kwargs.get('max_retries', 5)
+        self.ratelimitter = HTTPRateLimitter()
+        self.codec: JSONCodec = get_codec(kwargs.get('codec'))
+        self.outbound: Optional[OutboundQueue] = (
+            OutboundQueue(self) if kwargs.get('outbound_queue') else None
+        )
+        self.metrics = getattr(self._client, 'metrics', None)
+        
+        self.connector_options: Dict[str, Any] = {
+            'limit': kwargs.get('limit', 100),
+            'limit_per_host': kwargs.get('limit_per_host', 0),
+            'ttl_dns_cache': kwargs.get('ttl_dns_cache', 300),
+            'keepalive_timeout': kwargs.get('keepalive_timeout', 60),
+        }
+        
+    def _create_session(self) -> aiohttp.ClientSession:
+        ''' REST session bound to the running loop. '''
+        connector = aiohttp.TCPConnector(**self.connector_options)
+        
+        return aiohttp.ClientSession(
+            connector=connector,
+            json_serialize=self.codec.dumps_str
+        )
+        
+    def _create_gateway_session(self) -> aiohttp.ClientSession:
+        '''
+        Gateway session bound to the running loop.
+        A websocket holds its connection until it closes, with REST's
+        pool every shard would take one of :limit: connections away.
+        '''
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            ttl_dns_cache=self.connector_options['ttl_dns_cache']
+        )
+        return aiohttp.ClientSession(connector=connector)
+        
+    async def close(self) -> None:
+        ''' Close the sessions and every pooled connection. '''
+        if self.outbound is not None:
+            await self.outbound.close()
+            
+        for session in (self._client_session, self._gateway_session):
+            if session is not None and not session.closed:
+                await session.close()
+            
+        self._client_session = None
+        self._gateway_session = None
         
     async def Route(
         self,
-        data: dict,
+        data: Optional[dict],
         endpoint: str,
-        method: str
-    ) -> None:
+        method: str,
+        *,
+        reason: Optional[str] = None
+    ) -> Any:
         """
         Send data to Discord HTTP
         
+        Requests wait for their bucket and the global limit,
+        429 responses are retried once the limit resets.
+        
         Parameter
         ---------
         :data: data payload to send
@@ -32,28 +400,131 @@ class HTTP:
         :endpoint: HTTP endpoint
         
         :method:	either post, delete, put, patch or get
-        mostly of methods are not implemented yet.
         
+        :reason: optional audit log reason.
+        
+        Return
+        ------
+        Parsed JSON response.
+        
+        Raise
+        -----
+        :HTTPException: Discord responded with a non-2xx status.
         """
-        url = f"{base_url}/{endpoint}"
+        if (method := method.upper()) not in self.methods:
+            raise ValueError(f"'{method}' is not a supported HTTP method.")
+            
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        route, major = get_route(method, endpoint)
         
-        if (met := method.lower()) == 'get':
-            return await self.client_session.get(url)
+        headers = self._authorization
+        kwargs: Dict[str, Any] = {}
+        
+        if data is not None:
+            headers = {**headers, 'Content-Type': 'application/json'}
+            kwargs['data'] = self.codec.dumps(data)
             
-        elif met == 'post':
-            data = await self.client_session.post(
-                url,
-                json=data,
-                headers=self._authorization
-            )
+        if reason is not None:
+            headers = {**headers, 'X-Audit-Log-Reason': reason}
+            
+        kwargs['headers'] = headers
+        
+        for attempt in range(self.max_retries + 1):
+            
+            bucket = self.ratelimitter.get_bucket(route, major)
+            slept = await bucket.acquire()
+            
+            try:
+                slept_global = await self.ratelimitter.acquire_global()
+                
+                if (metrics := self.metrics) is not None:
+                    if slept:
+                        metrics.ratelimit_sleep.inc(('rest_bucket',), slept)
+                    if slept_global:
+                        metrics.ratelimit_sleep.inc(
+                            ('rest_global',), slept_global
+                        )
+                    started = time.perf_counter()
+                    
+                async with self.client_session.request(
+                    method, url, **kwargs
+                ) as response:
+                    
+                    data = await _json_or_text(response, self.codec)
+                    
+                    if metrics is not None:
+                        # Routes already have their tokens masked.
+                        metrics.rest_latency.observe(
+                            (route,), time.perf_counter() - started
+                        )
+                        metrics.rest_responses.inc((route, response.status))
+                        
+                    current = self.ratelimitter.update(
+                        route,
+                        major,
+                        bucket,
+                        response.headers
+                    )
+                    
+                    if 200 <= response.status < 300:
+                        return data
+                    
+                    if response.status == 429:
+                        retry_after = self._retry_after(response, data)
+                        
+                        is_global = (
+                            isinstance(data, dict) and data.get('global')
+                        ) or response.headers.get('X-RateLimit-Global')
+                        
+                        if is_global:
+                            await self.ratelimitter.lock_global(retry_after)
+                        else:
+                            log.warning(
+                                'Ratelimited on %s, retrying in %.2f seconds.',
+                                route,
+                                retry_after
+                            )
+                            current.exhaust(retry_after)
+                        continue
+                    
+                    retry = attempt < self.max_retries
+                    
+                    if response.status in (500, 502, 503, 504) and retry:
+                        await asyncio.sleep(1 + attempt * 2)
+                        continue
+                    
+                    raise HTTPException(response, data)
+            
+            finally:
+                bucket.release()
         
-        if (status := str(data.status))[0] != '2': # type: ignore
-            print(f"something went wrong: {status}")
+        raise HTTPException(response, data)
+    
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse, data: Any) -> float:
+        if isinstance(data, dict) and 'retry_after' in data:
+            return float(data['retry_after'])
         
+        return float(response.headers.get('Retry-After', 1))
+    
     @property
     def token(self):
         return self._token
+    
+    @property
+    def client_session(self) -> aiohttp.ClientSession:
+        ''' Created lazily, first accessed on the client's loop. '''
+        if self._client_session is None or self._client_session.closed:
+            self._client_session = self._create_session()
+            
+        return self._client_session
         
     @property
-    def client_session(self):
-        return self._client_session
\ No newline at end of file
+    def gateway_session(self) -> aiohttp.ClientSession:
+        ''' Created lazily like :client_session:, for gateway websockets. '''
+        session = self._gateway_session
+        
+        if session is None or session.closed:
+            session = self._gateway_session = self._create_gateway_session()
+            
+        return session
\ No newline at end of file
@@ -0,0 +1,256 @@
+'''
+Interaction model.
+
+Like :Message:, only the raw payload is kept,
+the command path and options are resolved on first access.
+'''
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from . import http
+from .abc import _snowflake
+from .embeds import Embed
+
+__all__ = ("Interaction",)
+
+PING = 1
+APPLICATION_COMMAND = 2
+
+# Option types nesting other options.
+SUB_COMMAND = 1
+SUB_COMMAND_GROUP = 2
+
+# Callback types
+CHANNEL_MESSAGE_WITH_SOURCE = 4
+DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE = 5
+
+EPHEMERAL = 1 << 6
+
+PENDING = 0
+DEFERRED = 1
+RESPONDED = 2
+
+
+def _message(
+    content: Optional[str],
+    embed: Optional[Embed],
+    ephemeral: bool
+) -> dict:
+    data = {}
+    
+    if content:
+        data['content'] = content
+    
+    if isinstance(embed, Embed):
+        data['embeds'] = embed.to_dict
+    
+    if ephemeral:
+        data['flags'] = EPHEMERAL
+    
+    return data
+
+
+class Interaction:
+    '''
+    An INTERACTION_CREATE.
+    
+    Discord wants a response within 3 seconds, :respond: answers,
+    edits the deferred response or sends a followup depending on
+    what was already sent.
+    '''
+    __slots__ = ('_http', 'raw', 'received_at', '_state', '_path', '_options')
+    
+    def __init__(self, http: http.HTTP, payload: dict):
+        
+        self._http = http
+        self.raw = payload
+        self.received_at: float = time.monotonic()
+        
+        self._state: int = PENDING
+        self._path: Optional[Tuple[str, ...]] = None
+        self._options: Optional[Dict[str, Any]] = None
+    
+    @property
+    def id(self) -> int:
+        return int(self.raw['id'])
+    
+    @property
+    def token(self) -> str:
+        return self.raw['token']
+    
+    @property
+    def type(self) -> int:
+        return self.raw['type']
+    
+    @property
+    def application_id(self) -> int:
+        return int(self.raw['application_id'])
+    
+    @property
+    def guild_id(self) -> Optional[int]:
+        return _snowflake(self.raw.get('guild_id'))
+    
+    @property
+    def channel_id(self) -> Optional[int]:
+        return _snowflake(self.raw.get('channel_id'))
+    
+    @property
+    def user(self) -> dict:
+        ''' The invoking user, from member in guilds. '''
+        return (self.raw.get('member') or self.raw)['user']
+    
+    @property
+    def data(self) -> dict:
+        return self.raw.get('data', {})
+    
+    @property
+    def command_id(self) -> Optional[int]:
+        return _snowflake(self.data.get('id'))
+    
+    @property
+    def command_name(self) -> Optional[str]:
+        return self.data.get('name')
+    
+    @property
+    def command_path(self) -> Tuple[str, ...]:
+        ''' Subcommand group and subcommand names, empty for a command. '''
+        if self._path is None:
+            self._resolve()
+        return self._path
+    
+    @property
+    def options(self) -> Dict[str, Any]:
+        ''' The invoked (sub)command's option values by name. '''
+        if self._options is None:
+            self._resolve()
+        return self._options
+    
+    def _resolve(self) -> None:
+        path = []
+        options = self.data.get('options', [])
+        
+        nested = (SUB_COMMAND, SUB_COMMAND_GROUP)
+        
+        while options and options[0]['type'] in nested:
+            path.append(options[0]['name'])
+            options = options[0].get('options', [])
+        
+        self._path = tuple(path)
+        self._options = {
+            option['name']: option.get('value') for option in options
+        }
+    
+    @property
+    def responded(self) -> bool:
+        ''' Whether Discord got its response, deferred or not. '''
+        return self._state != PENDING
+    
+    @property
+    def deferred(self) -> bool:
+        return self._state == DEFERRED
+    
+    def _callback_endpoint(self) -> str:
+        return f'/interactions/{self.raw["id"]}/{self.token}/callback'
+    
+    def _original_endpoint(self) -> str:
+        application_id = self.raw['application_id']
+        return f'/webhooks/{application_id}/{self.token}/messages/@original'
+    
+    async def respond(
+        self,
+        content: Optional[str] = None,
+        *,
+        embed: Optional[Embed] = None,
+        ephemeral: bool = False
+    ) -> None:
+        '''
+        Answer the interaction.
+        After a defer it edits the deferred response,
+        after a response it sends a followup.
+        '''
+        data = _message(content, embed, ephemeral)
+        
+        if self._state == PENDING:
+            # Set before the request, an auto-defer must not race it.
+            self._state = RESPONDED
+            await self._http.Route(
+                {'type': CHANNEL_MESSAGE_WITH_SOURCE, 'data': data},
+                self._callback_endpoint(),
+                'POST'
+            )
+        
+        elif self._state == DEFERRED:
+            self._state = RESPONDED
+            await self._http.Route(data, self._original_endpoint(), 'PATCH')
+        
+        else:
+            await self.followup(content, embed=embed, ephemeral=ephemeral)
+    
+    async def defer(self, *, ephemeral: bool = False) -> bool:
+        '''
+        Tell Discord the response comes later, "Bot is thinking...".
+        
+        Return
+        ------
+        False if the interaction was already answered.
+        '''
+        if self._state != PENDING:
+            return False
+        
+        self._state = DEFERRED
+        await self._http.Route(
+            {
+                'type': DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE,
+                'data': {'flags': EPHEMERAL} if ephemeral else {}
+            },
+            self._callback_endpoint(),
+            'POST'
+        )
+        return True
+    
+    async def followup(
+        self,
+        content: Optional[str] = None,
+        *,
+        embed: Optional[Embed] = None,
+        ephemeral: bool = False
+    ) -> None:
+        await self._http.Route(
+            _message(content, embed, ephemeral),
+            f'/webhooks/{self.raw["application_id"]}/{self.token}',
+            'POST'
+        )
+    
+    async def replay(self, data: Any, endpoint: str, method: str) -> None:
+        '''
+        Send a request recorded by this interaction's snapshot,
+        the response state is the live one, e.g. after an auto-defer.
+        '''
+        if endpoint != self._callback_endpoint():
+            await self._http.Route(data, endpoint, method)
+        
+        elif data['type'] == DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE:
+            await self.defer(ephemeral=bool(data['data'].get('flags')))
+        
+        elif self._state == PENDING:
+            self._state = RESPONDED
+            await self._http.Route(data, endpoint, method)
+        
+        elif self._state == DEFERRED:
+            self._state = RESPONDED
+            await self._http.Route(
+                data['data'], self._original_endpoint(), 'PATCH'
+            )
+        
+        else:
+            await self._http.Route(
+                data['data'],
+                f'/webhooks/{self.raw["application_id"]}/{self.token}',
+                'POST'
+            )
+    
+    def __repr__(self):
+        return (
+            f'<Interaction id={self.raw["id"]} type={self.type} '
+            f'command={self.command_name!r}>'
+        )
@@ -0,0 +1,341 @@
+'''
+Metrics registry and Prometheus text exporter.
+
+Counters and histograms are plain dict updates keyed by label tuples,
+cheap enough for the gateway's hot path. Gauges are collected when
+scraped. Nothing is recorded unless the client is built with
+`metrics=True`.
+'''
+import bisect
+import logging
+import re
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+)
+
+from aiohttp import web
+
+__all__ = (
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'Metrics',
+)
+
+log = logging.getLogger(__name__)
+
+Labels = Tuple[Any, ...]
+
+# Seconds, handlers and REST calls.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0
+)
+
+# Webhook and interaction tokens must not end up in labels.
+_TOKEN = re.compile(r'(webhooks|interactions)/\{id\}/[^/]+')
+
+
+def route_label(route: str) -> str:
+    return _TOKEN.sub(r'\1/{id}/{token}', route)
+
+
+def _escape(value: Any) -> str:
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format_labels(
+    names: Sequence[str],
+    values: Labels,
+    extra: str = ''
+) -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    
+    if extra:
+        pairs.append(extra)
+    
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    ''' Monotonic total per label values. '''
+    __slots__ = ('name', 'help', 'labels', 'values')
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Labels, float] = {}
+    
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+    
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            label = _format_labels(self.labels, labels)
+            yield f'{self.name}{label} {_number(value)}'
+
+
+class Gauge:
+    ''' Current value per label values, set or collected on scrape. '''
+    __slots__ = ('name', 'help', 'labels', 'values', '_collect')
+    
+    kind = 'gauge'
+    
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[Labels, float]]] = None
+    ):
+        '''
+        Parameter
+        ----------
+        :collect: returns label values -> value, called on every scrape.
+        '''
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Labels, float] = {}
+        self._collect = collect
+    
+    def set(self, labels: Labels = (), value: float = 0) -> None:
+        self.values[labels] = value
+    
+    def samples(self) -> Iterable[str]:
+        values = self.values
+        
+        if self._collect is not None:
+            values = {**values, **self._collect()}
+        
+        for labels, value in values.items():
+            label = _format_labels(self.labels, labels)
+            yield f'{self.name}{label} {_number(value)}'
+
+
+class Histogram:
+    ''' Bucketed observations per label values. '''
+    __slots__ = ('name', 'help', 'labels', 'buckets', 'values')
+    
+    kind = 'histogram'
+    
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.values: Dict[Labels, List[float]] = {}
+    
+    def observe(self, labels: Labels, value: float) -> None:
+        if (counts := self.values.get(labels)) is None:
+            # A count per bucket, +Inf, then the sum.
+            counts = [0] * (len(self.buckets) + 1) + [0.0]
+            self.values[labels] = counts
+        
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+    
+    def quantile(self, labels: Labels, q: float) -> Optional[float]:
+        ''' Upper bound of the bucket holding the :q: quantile. '''
+        if (counts := self.values.get(labels)) is None:
+            return None
+        
+        total = sum(counts[:-1])
+        running = 0
+        
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            
+            if running >= q * total:
+                return bound
+        
+        return float('inf')
+    
+    def samples(self) -> Iterable[str]:
+        for labels, counts in self.values.items():
+            running = 0
+            
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                bucket = f'le="{_number(bound)}"'
+                le = _format_labels(self.labels, labels, bucket)
+                yield f'{self.name}_bucket{le} {running}'
+            
+            plain = _format_labels(self.labels, labels)
+            yield f'{self.name}_sum{plain} {_number(counts[-1])}'
+            yield f'{self.name}_count{plain} {running}'
+
+
+def _dispatch_depth(client: Any) -> Dict[Labels, float]:
+    executor = getattr(client, 'dispatch_executor', None)
+    return {} if executor is None else {(): executor.depth}
+
+
+class Metrics:
+    
+    """ The client's metrics. """
+    
+    def __init__(self, client: Any = None):
+        """
+        :param client: Client whose shards, cache and executor are
+            collected as gauges on scrape.
+        """
+        self.gateway_events = Counter(
+            'dispycord_gateway_events_total',
+            'Gateway dispatches received.',
+            ('shard', 'event')
+        )
+        self.gateway_reconnects = Counter(
+            'dispycord_gateway_reconnects_total',
+            'Gateway reconnects, by whether the session was resumed.',
+            ('shard', 'mode')
+        )
+        self.dispatch_latency = Histogram(
+            'dispycord_dispatch_latency_seconds',
+            'Time from dispatch to the handler starting.',
+            ('listener',)
+        )
+        self.handler_duration = Histogram(
+            'dispycord_handler_duration_seconds',
+            'Handler run time.',
+            ('listener',)
+        )
+        self.rest_latency = Histogram(
+            'dispycord_rest_request_duration_seconds',
+            'REST request time, rate limit waits excluded.',
+            ('route',)
+        )
+        self.rest_responses = Counter(
+            'dispycord_rest_responses_total',
+            'REST responses by route and status.',
+            ('route', 'status')
+        )
+        self.ratelimit_sleep = Counter(
+            'dispycord_ratelimit_sleep_seconds_total',
+            'Time spent waiting on rate limits.',
+            ('limiter',)
+        )
+        
+        self._metrics: List[Any] = [
+            self.gateway_events,
+            self.gateway_reconnects,
+            self.dispatch_latency,
+            self.handler_duration,
+            self.rest_latency,
+            self.rest_responses,
+            self.ratelimit_sleep,
+        ]
+        
+        if client is not None:
+            self._metrics += [
+                Gauge(
+                    'dispycord_cache_entries',
+                    'Entities in the cache.',
+                    ('entity',),
+                    lambda: {
+                        (entity.lower(),): stats['size']
+                        for entity, stats in client.cache.stats.items()
+                    }
+                ),
+                Gauge(
+                    'dispycord_gateway_latency_seconds',
+                    'Last heartbeat round trip.',
+                    ('shard',),
+                    lambda: {
+                        (shard.shard_id,): shard.latency
+                        for shard in client.shards.values()
+                    }
+                ),
+                Gauge(
+                    'dispycord_gateway_guilds',
+                    'Guilds per shard.',
+                    ('shard',),
+                    lambda: {
+                        (shard.shard_id,): len(shard.guilds)
+                        for shard in client.shards.values()
+                    }
+                ),
+                Gauge(
+                    'dispycord_dispatch_queue_depth',
+                    'Handlers waiting in the dispatch executor.',
+                    (),
+                    lambda: _dispatch_depth(client)
+                ),
+            ]
+        
+        self._runner: Optional[web.AppRunner] = None
+    
+    def register(self, metric: Any) -> Any:
+        ''' Export a custom Counter, Gauge or Histogram too. '''
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        ''' Every metric in the Prometheus text format. '''
+        lines = []
+        
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            
+            try:
+                lines.extend(metric.samples())
+            except Exception:
+                log.exception('Collecting %s failed.', metric.name)
+        
+        return '\n'.join(lines) + '\n'
+    
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.render(),
+            content_type='text/plain',
+            charset='utf-8',
+            headers={'X-Content-Type-Options': 'nosniff'}
+        )
+    
+    async def serve(self, host: str = '127.0.0.1', port: int = 9100) -> None:
+        '''
+        Serve GET /metrics on a local HTTP endpoint.
+        
+        Parameter
+        ----------
+        :host: interface to bind, loopback by default.
+        :port: port to bind.
+        '''
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        
+        log.info('Serving metrics on http://%s:%s/metrics', host, port)
+    
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,249 @@
+'''
+Microbenchmarks of single hot paths, no sockets involved.
+    
+    python -m dispycord.microbench decode --recording events.jsonl
+
+Payloads come from a recording (see :dispycord.testing.load_recording:)
+or from :dispycord.testing.synthetic_stream:.
+'''
+import argparse
+import asyncio
+import time
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .testing import load_recording, synthetic_stream
+
+__all__ = ('main',)
+
+DISPATCH = 0
+
+Benchmark = Callable[[argparse.Namespace], List[Dict[str, Any]]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def inner(function: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = function
+        return function
+    
+    return inner
+
+
+def _payloads(args: argparse.Namespace) -> List[dict]:
+    ''' Gateway payloads, as received. '''
+    if args.recording is not None:
+        stream = load_recording(args.recording)
+    else:
+        stream = synthetic_stream(messages=args.messages)
+    
+    return [
+        {'op': DISPATCH, 's': sequence, 't': event, 'd': data}
+        for sequence, (event, data) in enumerate(stream(0, 1), 1)
+    ]
+
+
+def _best(function: Callable[[], Any], args: argparse.Namespace) -> float:
+    ''' Seconds per call of :function:, best of the repeats. '''
+    timer = timeit.Timer(function)
+    return min(timer.repeat(args.repeat, args.number)) / args.number
+
+
+@benchmark('decode')
+def decode(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    ''' Gateway payload decoding, JSON codecs against ETF. '''
+    from . import etf
+    from .codec import get_codec
+    from .bench import _installed_codecs
+    
+    payloads = _payloads(args)
+    results = []
+    
+    candidates = [
+        (name, get_codec(name).dumps, get_codec(name).loads)
+        for name in _installed_codecs()
+    ]
+    backend = 'erlpack' if etf.erlpack is not None else 'pure python'
+    candidates.append((f'etf ({backend})', etf.dumps, etf.loads))
+    
+    for name, dumps, loads in candidates:
+        encoded = [dumps(payload) for payload in payloads]
+        size = sum(map(len, encoded))
+        
+        def run():
+            for data in encoded:
+                loads(data)
+        
+        seconds = _best(run, args)
+        results.append({
+            'decoder': name,
+            'payloads_per_sec': len(encoded) / seconds,
+            'mb_per_sec': size / seconds / 2 ** 20,
+            'bytes_per_payload': size / len(encoded),
+        })
+    
+    return results
+
+
+def _allocated(function: Callable[[], Any]) -> Tuple[int, int]:
+    ''' Blocks and bytes still held by what :function: returned. '''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = function()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    
+    stats = after.compare_to(before, 'filename')
+    del kept
+    return (
+        sum(stat.count_diff for stat in stats),
+        sum(stat.size_diff for stat in stats)
+    )
+
+
+@benchmark('models')
+def models(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    '''
+    Message model cost per MESSAGE_CREATE, reading only the content
+    against building author, channel and guild as every message used to.
+    '''
+    from .abc import Message
+    
+    messages = [
+        payload['d'] for payload in _payloads(args)
+        if payload['t'] == 'MESSAGE_CREATE'
+    ]
+    
+    def content():
+        return [
+            (message, message.content)
+            for message in (Message(None, data) for data in messages)
+        ]
+    
+    def full():
+        return [
+            (message, message.author, message.channel, message.guild,
+             message.channel.guild, message.content)
+            for message in (Message(None, data) for data in messages)
+        ]
+    
+    results = []
+    
+    for name, build in (('content only', content), ('full', full)):
+        blocks, size = _allocated(build)
+        results.append({
+            'access': name,
+            'us_per_message': _best(build, args) / len(messages) * 1e6,
+            'blocks_per_message': blocks / len(messages),
+            'bytes_per_message': size / len(messages),
+        })
+    
+    return results
+
+
+@benchmark('dispatch')
+def dispatch(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    '''
+    Replay through :Shard.handle_event:, with no listener (the table
+    skips every parser), one on MESSAGE_CREATE, and one on every event
+    so every payload is parsed as it used to be.
+    '''
+    from . import events
+    from .ext import Bot
+    from .shard import Shard
+    
+    payloads = [(payload['t'], payload['d']) for payload in _payloads(args)]
+    heard = {event for event, _ in payloads} & set(events.parsers)
+    scenarios = (
+        ('none', set()),
+        ('message_create', {'MESSAGE_CREATE'} & heard),
+        ('every event', heard),
+    )
+    
+    async def replay(listened) -> float:
+        bot = Bot(sync_commands=False, command_cache=None)
+        
+        for event in listened:
+            async def listener(*param):
+                pass
+            
+            listener.__name__ = events.parsers[event][0]
+            bot.event()(listener)
+        
+        shard = Shard(bot, 0)
+        best = float('inf')
+        
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            
+            for _ in range(args.number):
+                for event, payload in payloads:
+                    await shard.handle_event(event, payload)
+                # Run the listener tasks, they are part of the cost.
+                await asyncio.sleep(0)
+            
+            best = min(best, time.perf_counter() - started)
+        
+        return best
+    
+    results = []
+    
+    for name, listened in scenarios:
+        seconds = asyncio.run(replay(listened))
+        results.append({
+            'listeners': name,
+            'events_per_sec': len(payloads) * args.number / seconds,
+        })
+    
+    return results
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    columns = list(results[0])
+    rows = [
+        [
+            f'{value:.2f}' if isinstance(value, float) else str(value)
+            for value in result.values()
+        ]
+        for result in results
+    ]
+    widths = [
+        max(len(column), *(len(row[index]) for row in rows))
+        for index, column in enumerate(columns)
+    ]
+    
+    for row in [columns, *rows]:
+        print('  '.join(
+            value.ljust(width) for value, width in zip(row, widths)
+        ))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m dispycord.microbench',
+        description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument('benchmarks', nargs='*', help=', '.join(BENCHMARKS))
+    parser.add_argument(
+        '--recording', help='JSON lines of recorded dispatches'
+    )
+    parser.add_argument(
+        '--messages', type=int, default=2000,
+        help='synthetic MESSAGE_CREATEs, without a recording'
+    )
+    parser.add_argument('--number', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    
+    for name in args.benchmarks or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+        
+        print(f'{name}:')
+        _print_table(BENCHMARKS[name](args))
+        print()
+
+
+if __name__ == '__main__':
+    main()
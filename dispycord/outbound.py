@@ -0,0 +1,166 @@
+'''
+Per-channel outbound message queue.
+
+Sends to a channel are queued and posted one request at a time.
+While a request waits for its rate limit, the sends queued behind it
+are coalesced: consecutive plain-text sends are joined into one message
+of up to 2000 characters, consecutive embed-only sends share a message
+of up to 10 embeds.
+'''
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .http import HTTP
+
+__all__ = ("OutboundQueue",)
+
+MAX_CONTENT = 2000
+MAX_EMBEDS = 10
+
+TEXT = 1
+EMBEDS = 2
+
+# (payload, future)
+_Pending = Tuple[dict, asyncio.Future]
+
+
+def _kind(payload: dict) -> Optional[int]:
+    ''' How a send may be coalesced, None if it is sent alone. '''
+    if payload.get('tts') or payload.keys() - {'tts', 'content', 'embeds'}:
+        return None
+    
+    if 'embeds' not in payload:
+        return TEXT if len(payload.get('content', '')) <= MAX_CONTENT else None
+    
+    if 'content' not in payload:
+        return EMBEDS if len(payload['embeds']) <= MAX_EMBEDS else None
+    
+    return None
+
+
+class OutboundQueue:
+    ''' Queues and coalesces message sends per channel. '''
+    def __init__(self, http: 'HTTP'):
+        self._http = http
+        self._queues: Dict[int, Deque[_Pending]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        
+        self.sends: int = 0
+        self.requests: int = 0
+    
+    def send(self, channel_id: int, payload: dict) -> asyncio.Future:
+        '''
+        Queue a message.
+        
+        Parameter
+        ----------
+        :channel_id: target channel.
+        :payload: message create payload.
+        
+        Return
+        ------
+        Future resolving to the created message's payload,
+        shared by every send coalesced into it.
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        if (queue := self._queues.get(channel_id)) is None:
+            queue = self._queues[channel_id] = deque()
+        
+        queue.append((payload, future))
+        self.sends += 1
+        
+        if channel_id not in self._tasks:
+            self._tasks[channel_id] = loop.create_task(
+                self._drain(channel_id, queue)
+            )
+        
+        return future
+    
+    def _batch(
+        self,
+        queue: Deque[_Pending]
+    ) -> Tuple[dict, List[asyncio.Future]]:
+        payload, future = queue.popleft()
+        
+        if (kind := _kind(payload)) is None:
+            return payload, [future]
+        
+        futures = [future]
+        
+        if kind == TEXT:
+            parts = [payload.get('content', '')]
+            size = len(parts[0])
+            
+            while queue and _kind(queue[0][0]) == TEXT:
+                content = queue[0][0].get('content', '')
+                
+                if size + 1 + len(content) > MAX_CONTENT:
+                    break
+                
+                parts.append(content)
+                size += 1 + len(content)
+                futures.append(queue.popleft()[1])
+            
+            return {'content': '\n'.join(parts)}, futures
+        
+        embeds = list(payload['embeds'])
+        
+        while queue and _kind(queue[0][0]) == EMBEDS:
+            if len(embeds) + len(queue[0][0]['embeds']) > MAX_EMBEDS:
+                break
+            
+            embeds.extend(queue[0][0]['embeds'])
+            futures.append(queue.popleft()[1])
+        
+        return {'embeds': embeds}, futures
+    
+    async def _drain(self, channel_id: int, queue: Deque[_Pending]) -> None:
+        try:
+            while queue:
+                payload, futures = self._batch(queue)
+                self.requests += 1
+                
+                try:
+                    message = await self._http.Route(
+                        payload,
+                        f'/channels/{channel_id}/messages',
+                        'POST'
+                    )
+                except asyncio.CancelledError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                    
+                except Exception as exc:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                
+                for future in futures:
+                    if not future.done():
+                        future.set_result(message)
+        finally:
+            del self._tasks[channel_id]
+            del self._queues[channel_id]
+            
+            for _, future in queue:
+                future.cancel()
+    
+    @property
+    def depth(self) -> int:
+        ''' Sends waiting, every channel. '''
+        return sum(len(queue) for queue in self._queues.values())
+    
+    async def close(self) -> None:
+        ''' Cancel the pending sends. '''
+        tasks = list(self._tasks.values())
+        
+        for task in tasks:
+            task.cancel()
+        
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -22,14 +22,22 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 import asyncio
-import json
+import collections
+import itertools
 import logging
+import random
 import time
-from typing import Any, TYPE_CHECKING, Union, Optional
+import zlib
+from typing import (
+    Any, Callable, Dict, Iterable, List, Set, Tuple,
+    TYPE_CHECKING, Union, Optional
+)
 
 import aiohttp
+from yarl import URL
 
-from .abc import Message
+from . import etf, events
+from .codec import get_codec
 from .errors import error
 
 if TYPE_CHECKING:
@@ -47,13 +55,38 @@ INVALID_SESSION = 9
 HELLO = 10
 ACK = 11
 WSS = "wss://gateway.discord.gg/?v=9&encoding=json"
+PRIORITY_OPCODES = frozenset((HEARTBEAT, IDENTIFY, RESUME))
+
+# Invalid seq / session timed out, the session is gone but a new one may start.
+NON_RESUMABLE_CLOSE_CODES = frozenset((1000, 4007, 4009))
+CLOSE_TYPES = frozenset((
+    aiohttp.WSMsgType.CLOSE,
+    aiohttp.WSMsgType.CLOSING,
+    aiohttp.WSMsgType.CLOSED,
+    aiohttp.WSMsgType.ERROR,
+))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+ZLIB_SUFFIX = b'\x00\x00\xff\xff'
+# Seconds between two presence updates of a shard,
+# newer ones replace the pending one.
+PRESENCE_INTERVAL = 5.0
 
 log = logging.getLogger(__name__)
 
+_LOG_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
 __all__ = (
     'AutoSharded',
     'Shard',
     'GatewayRateLimitter',
+    'IdentifyRateLimitter',
 )
 
 
@@ -62,56 +95,153 @@ class GatewayRateLimitter:
     def __init__(
         self,
         *,
-        per_minute: int = 110,
-        per_second: int = 2
+        rate: int = 120,
+        per: float = 60.0,
+        reserved: int = 5,
+        clock: Callable[[], float] = time.monotonic
     ):
         '''
         ..Gateway Ratelimit::
-            Client are allowed to send 120 gateway commands per minute
-            or average 2 command per second.
+            Client are allowed to send 120 gateway commands per minute.
+            Token bucket refilling continuously at rate / per,
+            the last :reserved: tokens are only for priority commands
+            (HEARTBEAT, IDENTIFY, RESUME) so a burst of other commands
+            can never starve the heartbeat.
             
         Parameter
         ----------
-        :per_minute: command can be sent per minute
-        :per_second: command can be sent per second
+        :rate: commands allowed per :per: seconds
+        :per: window in seconds
+        :reserved: tokens kept for priority commands
+        :clock: monotonic time source, replaceable for tests
         
         Attributes
         -----------
-        :remain_per_minute:
-        :remain_per_second:
+        :tokens: tokens currently available
         '''
-        self.per_minute = per_minute
-        self.per_second = per_second
+        self.rate = rate
+        self.per = per
+        self.reserved = reserved
+        
+        self.tokens: float = float(rate)
         
-        self.remain_per_minute = self.per_minute
-        self.remain_per_second = self.per_second
+        self._clock = clock
+        self._last_refill = clock()
+        self._lock = asyncio.Lock()
+        self._waiting: int = 0
+        self._priority_waiting: int = 0
         
-        self.minute_future_tick = self.get_current() + 60
-        self.second_future_tick = self.minute_future_tick - 60
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(
+            float(self.rate),
+            self.tokens + (now - self._last_refill) * self.rate / self.per
+        )
+        self._last_refill = now
         
-    async def tick(self) -> None:
-        ''' Ratelimit ticker '''
-        if self.remain_per_minute <= 0 or self.remain_per_second <= 0:
+    def get_wait(self, priority: bool = False) -> float:
+        ''' Seconds until a command of this lane may be sent. '''
+        self._refill()
+        missing = (0 if priority else self.reserved) + 1 - self.tokens
+        return max(0.0, missing * self.per / self.rate)
+        
+    def try_acquire(self, priority: bool = False) -> bool:
+        ''' Take a token without waiting. '''
+        if self.get_wait(priority) > 0:
+            return False
             
-            log.warning('Gateway ratelimit.')
+        self.tokens -= 1
+        return True
+        
+    async def tick(self, priority: bool = False) -> float:
+        '''
+        Ratelimit ticker, wait for a token.
+        
+        Parameter
+        ----------
+        :priority: use the reserved lane.
+        
+        Return
+        ------
+        Seconds spent waiting.
+        '''
+        # Normal commands queue behind the ones already waiting.
+        if (priority or not self._waiting) and self.try_acquire(priority):
+            return 0.0
             
-            await asyncio.sleep(
-                self.minute_future_tick - self.get_current()
-                if self.remain_per_minute <= 0
-                else 1
+        start = self._clock()
+        
+        if priority:
+            self._priority_waiting += 1
+            try:
+                while not self.try_acquire(True):
+                    await asyncio.sleep(self.get_wait(True))
+            finally:
+                self._priority_waiting -= 1
+                
+        else:
+            self._waiting += 1
+            log.warning(
+                'Gateway ratelimit, %s commands queued.', self._waiting
             )
+            try:
+                # Normal commands are sent in order.
+                async with self._lock:
+                    while not self.try_acquire():
+                        await asyncio.sleep(self.get_wait())
+            finally:
+                self._waiting -= 1
+                
+        return self._clock() - start
+        
+    @property
+    def wait_time(self) -> float:
+        ''' Seconds a normal command would wait right now. '''
+        return self.get_wait()
+        
+    @property
+    def queue_depth(self) -> int:
+        ''' Commands waiting for a token. '''
+        return self._waiting + self._priority_waiting
+
+
+class IdentifyRateLimitter:
+    ''' IDENTIFY ratelimit. '''
+    def __init__(self, max_concurrency: int = 1):
+        '''
+        ..Identify concurrency::
+            One IDENTIFY per 5 seconds for every
+            rate limit key (shard_id % max_concurrency),
+            different keys identify in parallel.
             
-        if (t := self.get_current()) >= self.minute_future_tick:
-            self.remain_per_minute = self.per_minute
-            
-        if t >= self.second_future_tick:
-            self.remain_per_second = self.per_second
+        Parameter
+        ----------
+        :max_concurrency: session_start_limit.max_concurrency
+        '''
+        self.max_concurrency = max_concurrency
         
-        self.remain_per_minute -= 1
-        self.remain_per_second -= 1
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._next_identify: Dict[int, float] = {}
         
-    def get_current(self) -> int:
-        return int(time.time())
+    async def wait(self, shard_id: int) -> None:
+        key = shard_id % self.max_concurrency
+        
+        if (lock := self._locks.get(key)) is None:
+            lock = self._locks[key] = asyncio.Lock()
+            
+        async with lock:
+            
+            delay = self._next_identify.get(key, 0) - time.monotonic()
+            
+            if delay > 0:
+                log.debug(
+                    'Shard %s waiting %.2f seconds to identify.',
+                    shard_id,
+                    delay
+                )
+                await asyncio.sleep(delay)
+                
+            self._next_identify[key] = time.monotonic() + 5
 
 
 class Shard:
@@ -125,69 +255,280 @@ class Shard:
         self._client = client
         
         self.pacemaker: Optional[asyncio.Task] = None
+        # IDENTIFY / RESUME of the current connection, cancelled with it.
+        self._handshake: Optional[asyncio.Task] = None
         self.shard_id = shard_id
         self.num_shards = self._client.num_shards
         self._ratelimitter = GatewayRateLimitter()
         
         self._ws = None
-        self._acked: bool = False
         self._interval: Union[int, float] = 41.25
-        self._reconnect: bool = False
+        self._ready: bool = False
+        self._closing: bool = False
+        # Set when this side closed the socket to resume, the close code
+        # then is the server's echo and says nothing about the session.
+        self._resume_after_close: bool = False
+        
+        self._heartbeat_acked: bool = True
+        self._heartbeat_sent: float = 0.0
+        self._latencies: collections.deque = collections.deque(maxlen=20)
         
         self._sequence: Optional[int] = None
         self._session_id: Optional[str] = None
+        self._resume_url: Optional[str] = None
+        
+        self.encoding: str = getattr(client, 'encoding', 'json')
+        
+        if self.encoding == 'etf':
+            self._loads = etf.loads
+            self._dumps = etf.dumps
+            self._opcode = aiohttp.WSMsgType.BINARY
+        elif self.encoding == 'json':
+            codec = getattr(client, 'codec', None) or get_codec()
+            self._loads = codec.loads
+            self._dumps = codec.dumps
+            self._opcode = aiohttp.WSMsgType.TEXT
+        else:
+            raise ValueError(f"Unknown gateway encoding '{self.encoding}'.")
+            
+        self._compress: bool = getattr(client, 'compress', False)
+        self._inflator = None
+        self._buffer = bytearray()
+        
+        self.bytes_received: int = 0
+        self.bytes_inflated: int = 0
+        
+        self.events: int = 0
+        self.guilds: Set[str] = set()
+        
+        # nonce -> (queue, keep members), see :request_members:
+        self._member_requests: Dict[str, Tuple[asyncio.Queue, bool]] = {}
+        self._nonces = itertools.count()
+        
+        # Latest presence asked for, also sent on IDENTIFY.
+        self.presence: Optional[dict] = None
+        self._presence_dirty: bool = False
+        # Bumped by every update, IDENTIFY records the one it carried.
+        self._presence_version: int = 0
+        self._identified_version: int = 0
+        # (version, future)
+        self._presence_waiters: List[Tuple[int, asyncio.Future]] = []
+        self._presence_task: Optional[asyncio.Task] = None
+        
+        self._state_handlers: Dict[str, Callable[[dict], None]] = {
+            'READY': self._parse_ready,
+            'RESUMED': self._parse_resumed,
+            'GUILD_CREATE': self._parse_guild_create,
+            'GUILD_DELETE': self._parse_guild_delete,
+            'GUILD_MEMBERS_CHUNK': self._parse_members_chunk,
+        }
+        
+    @property
+    def latency(self) -> float:
+        '''
+        Seconds between the last heartbeat and its ACK,
+        inf before the first.
+        '''
+        return self._latencies[-1] if self._latencies else float('inf')
+        
+    @property
+    def average_latency(self) -> float:
+        ''' Latency averaged over the last 20 heartbeats. '''
+        if not self._latencies:
+            return float('inf')
+            
+        return sum(self._latencies) / len(self._latencies)
         
-    def shard_log(self, message: str = 'No content.', logtype: str = 'debug'):
-        getattr(log, logtype)(f'Shard {self.shard_id}: {message}')
+    def shard_log(
+        self,
+        message: str = 'No content.',
+        logtype: str = 'debug',
+        *args
+    ):
+        '''
+        Log with %-style :args:,
+        nothing is formatted when the level is off.
+        '''
+        if log.isEnabledFor(_LOG_LEVELS[logtype]):
+            getattr(log, logtype)('Shard %s: ' + message, self.shard_id, *args)
         
     async def spawn_ws(self) -> None:
-        ''' Method call for spawning shard '''
-        async with self._client.http.client_session.ws_connect(WSS) as ws:
+        '''
+        Method call for spawning shard.
+        
+        Connects and reconnects in a loop until the shard is closed
+        or Discord closes it with a fatal code.
+        Reconnects back off exponentially with jitter and RESUME
+        whenever the session is still valid.
+        '''
+        attempt = 0
+        
+        while not self._closing:
+            
+            try:
+                code, extra = await self.poll_ws()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                self.shard_log('Connection failed: %r', 'warning', exc)
+                code, extra = None, None
+                
+            if self.pacemaker is not None:
+                self.pacemaker.cancel()
+                
+            # A handshake still waiting must not land on the next socket.
+            if self._handshake is not None:
+                self._handshake.cancel()
+                self._handshake = None
+                
+            if self._closing:
+                break
+                
+            if self._resume_after_close:
+                self.shard_log(
+                    'Closed the connection to resume, code %s.', 'debug', code
+                )
+            else:
+                await self.handle_disconnect(code, extra)
+                
+            if self._ready:
+                attempt = 0
+                
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            delay = backoff * random.random()
+            attempt += 1
+            
+            mode = 'resume' if self.resumable else 'identify'
+            
+            if (metrics := self._client.metrics) is not None:
+                metrics.gateway_reconnects.inc((self.shard_id, mode))
+                
+            self.shard_log('Reconnecting in %.2fs, %s.', 'info', delay, mode)
+            await asyncio.sleep(delay)
+            
+    async def poll_ws(self) -> Tuple[Optional[int], Any]:
+        '''
+        Run a single gateway connection until it closes.
+        
+        Return
+        ------
+        (close code, close reason)
+        '''
+        url = URL(self._client.gateway_url or WSS)
+        url = url.update_query(encoding=self.encoding)
+        
+        if self.resumable and self._resume_url:
+            url = URL(self._resume_url).with_query(url.query)
+        
+        if self._compress:
+            url = url.update_query(compress='zlib-stream')
+            # One inflate context per connection, frames share its window.
+            self._inflator = zlib.decompressobj()
+            self._buffer.clear()
+            
+        self._ready = False
+        self._resume_after_close = False
+        
+        async with self._client.http.gateway_session.ws_connect(url) as ws:
             self._ws = ws
             
             self.shard_log('Connected to gateway', 'debug')
             
             while True:
                 
-                if isinstance((message := await ws.receive()).data, int) or message.data is None:
+                if (message := await ws.receive()).type in CLOSE_TYPES:
+                    return ws.close_code, message.extra
                     
-                    await self.handle_disconnect(
-                        message.data,
-                        message.extra
-                    )
-                    break
-            
-                data = json.loads(message.data)
+                raw = message.data
+                
+                if self._compress and message.type is aiohttp.WSMsgType.BINARY:
+                    if (raw := self.inflate(raw)) is None:
+                        continue
+                        
+                data = self._loads(raw)
                 op = data['op']
                 event = data['t']
-                self.seq = data['s']
                 d = data['d']
                 
+                if data['s'] is not None:
+                    self._sequence = data['s']
+                    
                 if op == HELLO:
                     
                     self.shard_log('Recieved HELLO', 'debug')
+                    self._interval = d['heartbeat_interval'] / 1000
+                    self._heartbeat_acked = True
                     self.pacemaker = self._client.loop.create_task(
                         self.start_heartbeat()
                     )
+                    # IDENTIFY may wait on its concurrency bucket,
+                    # ACKs must keep being read meanwhile.
+                    self._start_handshake(
+                        self.resume() if self.resumable else self.identify()
+                    )
                     
                 elif op == ACK:
                     self.shard_log('Recieved ACK', 'debug')
-                    await self.identify()
+                    self._heartbeat_acked = True
+                    self._latencies.append(
+                        time.perf_counter() - self._heartbeat_sent
+                    )
+                    
+                elif op == HEARTBEAT:
+                    await self.heartbeat()
+                    
+                elif op == RECONNECT:
+                    self.shard_log('Gateway asked to reconnect', 'debug')
+                    await self._close_to_resume()
                     
                 elif op == INVALID_SESSION:
-                    self.shard_log('Stopped working', 'warning')
-                    self.pacemaker.cancel()
-                    self._ws.close(code=1002)
+                    self.shard_log('Session invalidated', 'warning')
+                    self._start_handshake(
+                        self.handle_invalid_session(bool(d))
+                    )
                     
                 elif op == DISPATCH:
-                    await self.handle_event(event, d)
+                    self.events += 1
+                    
+                    if (metrics := self._client.metrics) is not None:
+                        metrics.gateway_events.inc((self.shard_id, event))
                         
-        if not self._acked:
-            exit(1)
+                    await self.handle_event(event, d)
+                    
+    async def _close_to_resume(self) -> None:
+        ''' Close the socket, the next connection resumes the session. '''
+        self._resume_after_close = True
+        # Any code but 1000 / 1001 keeps the session resumable.
+        await self._ws.close(code=4000)
+        
+    def _start_handshake(self, coro) -> None:
+        ''' Run an IDENTIFY / RESUME, replacing the pending one. '''
+        if self._handshake is not None:
+            self._handshake.cancel()
             
-        if self._ws.closed and self._reconnect:
-            await self.spawn_ws()
+        self._handshake = self._client.loop.create_task(coro)
+        
+    def inflate(self, frame: bytes) -> Optional[bytes]:
+        '''
+        Buffer a zlib-stream frame.
+        
+        Discord may split a payload across several frames,
+        the last one ends with the Z_SYNC_FLUSH suffix.
+        
+        Return
+        ------
+        The decompressed payload, or None while it is still incomplete.
+        '''
+        self._buffer += frame
+        self.bytes_received += len(frame)
+        
+        if len(frame) < 4 or frame[-4:] != ZLIB_SUFFIX:
+            return None
             
+        raw = self._inflator.decompress(self._buffer)
+        self._buffer.clear()
+        
+        self.bytes_inflated += len(raw)
+        return raw
+        
     async def identify(self) -> None:
         '''
         ..identify::
@@ -197,15 +538,10 @@ class Shard:
         -------
         on success: Your bot will appear online
                     and ready to accept requests.
-        on disconnect: resuming if possible.
         '''
-        if self._reconnect:
-            await self.resume()
-            return
-        
-        if self._acked:
-            return
+        await self._client.wait_identify(self.shard_id)
         
+        self._identified_version = self._presence_version
         await self.send_as_json({
             'op': IDENTIFY,
             'd': {
@@ -216,30 +552,55 @@ class Shard:
                     '$browser': 'dispycord',
                     '$device': 'dispycord'
                 },
-                'shard': [self.shard_id, self.num_shards]
+                'shard': [self.shard_id, self.num_shards],
+                **(
+                    {} if self.presence is None
+                    else {'presence': self.presence}
+                )
             }
         })
         
-        self._acked = True
+        self.shard_log('Sent IDENTIFY')
         
-        self.shard_log('Connected to Discord and recieved READY state')
-    
     async def start_heartbeat(self) -> None:
-        ''' Start heartbeat. '''
+        '''
+        Start heartbeat.
+        
+        The first beat is jittered, as the gateway asks,
+        then one every heartbeat_interval from HELLO.
+        A beat whose ACK never came means a zombie connection,
+        it is closed and resumed.
+        '''
+        await asyncio.sleep(self._interval * random.random())
+        
         while True:
             
-            await asyncio.sleep(
-                4
-                if self._acked is False
-                else self._interval
-            )
+            if not self._heartbeat_acked:
+                self.shard_log(
+                    'Heartbeat was not acknowledged, reconnecting.', 'warning'
+                )
+                await self._close_to_resume()
+                return
+                
+            try:
+                await self.heartbeat()
+            except (ConnectionResetError, aiohttp.ClientError):
+                # The receive loop sees the close and reconnects.
+                return
+                
+            await asyncio.sleep(self._interval)
             
-            await self.send_as_json(
-                {
-                    'op': HEARTBEAT,
-                    'd': None
-                }
-            )
+    async def heartbeat(self) -> None:
+        ''' Send a heartbeat with the last sequence. '''
+        self._heartbeat_acked = False
+        self._heartbeat_sent = time.perf_counter()
+        
+        await self.send_as_json(
+            {
+                'op': HEARTBEAT,
+                'd': self._sequence
+            }
+        )
             
     async def send_as_json(self, data: dict):
         '''
@@ -247,15 +608,131 @@ class Shard:
         
         Parameter
         ----------
-        :data: takes a dict to parse to JSON.
+        :data: takes a dict to parse to JSON, or ETF with encoding='etf'.
         '''
-        await self._ratelimitter.tick()
+        waited = await self._ratelimitter.tick(data['op'] in PRIORITY_OPCODES)
+        
+        if waited and (metrics := self._client.metrics) is not None:
+            metrics.ratelimit_sleep.inc(('gateway',), waited)
         
-        await self._ws.send_json(data)
+        await self._ws.send_frame(self._dumps(data), self._opcode)
         
-    async def resume(self):
-        self.shard_log('Shard sending resume request', 'debug')
-        self._ws.send_json({
+    async def request_members(
+        self,
+        guild_id: int,
+        *,
+        query: str = '',
+        limit: int = 0,
+        presences: bool = False,
+        user_ids: Optional[Iterable[int]] = None,
+        members: bool = True
+    ) -> Tuple[str, asyncio.Queue]:
+        '''
+        Send REQUEST_GUILD_MEMBERS through the gateway limiter.
+        
+        Parameter
+        ----------
+        :guild_id: guild on this shard.
+        :query: username prefix, '' for everyone.
+        :limit: max members, 0 for no limit with an empty query.
+        :presences: include the members' presences.
+        :user_ids: fetch these members instead of querying.
+        :members: False leaves the member lists out of the queued chunks,
+            for callers only filling the cache.
+        
+        Return
+        ------
+        The request's nonce and the queue its GUILD_MEMBERS_CHUNK land in.
+        Call :finish_member_request: when done with it.
+        '''
+        nonce = f'{self.shard_id}.{next(self._nonces)}'
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        data = {
+            'guild_id': str(guild_id),
+            'limit': limit,
+            'presences': presences,
+            'nonce': nonce,
+        }
+        
+        if user_ids is not None:
+            data['user_ids'] = [str(user_id) for user_id in user_ids]
+        else:
+            data['query'] = query
+            
+        self._member_requests[nonce] = (queue, members)
+        
+        try:
+            await self.send_as_json({'op': REQUEST_GUILD_MEMBERS, 'd': data})
+        except BaseException:
+            self.finish_member_request(nonce)
+            raise
+            
+        return nonce, queue
+        
+    def finish_member_request(self, nonce: str) -> None:
+        self._member_requests.pop(nonce, None)
+        
+    def update_presence(self, presence: dict) -> asyncio.Future:
+        '''
+        Queue a PRESENCE_UPDATE, last write wins.
+        
+        One update is sent every :PRESENCE_INTERVAL: at most,
+        updates made meanwhile only leave the newest to send.
+        
+        Parameter
+        ----------
+        :presence: the update's `d`.
+        
+        Return
+        ------
+        Future resolved once this presence, or a newer one, is sent.
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        self.presence = presence
+        self._presence_dirty = True
+        self._presence_version += 1
+        self._presence_waiters.append((self._presence_version, future))
+        
+        self._flush_presence()
+        return future
+        
+    def _flush_presence(self) -> None:
+        if self._presence_task is None or self._presence_task.done():
+            loop = asyncio.get_running_loop()
+            self._presence_task = loop.create_task(self._send_presence())
+            
+    async def _send_presence(self) -> None:
+        
+        # Not connected, IDENTIFY carries it or RESUMED flushes it.
+        while self._presence_dirty and self._ready and not self._closing:
+            presence, waiters = self.presence, self._presence_waiters
+            
+            self._presence_dirty = False
+            self._presence_waiters = []
+            
+            try:
+                await self.send_as_json({'op': PRESENCE_UPDATE, 'd': presence})
+            except (ConnectionResetError, aiohttp.ClientError):
+                self._presence_dirty = True
+                self._presence_waiters = waiters + self._presence_waiters
+                return
+                
+            for _, future in waiters:
+                if not future.done():
+                    future.set_result(None)
+                    
+            await asyncio.sleep(PRESENCE_INTERVAL)
+            
+    async def resume(self) -> None:
+        ''' Replay missed events of the previous session. '''
+        self.shard_log(
+            'Shard sending resume request at seq %s', 'debug', self._sequence
+        )
+        
+        await self.send_as_json({
             'op': RESUME,
             'd': {
                 'token': self._client.http.token,
@@ -263,83 +740,276 @@ class Shard:
                 'seq': self._sequence
             }
         })
-        self._reconnect = False
         
-    async def handle_disconnect(self, message=None, extra=None) -> None:
+    async def handle_invalid_session(self, resumable: bool) -> None:
+        '''
+        INVALID_SESSION, wait 1 - 5 seconds as Discord asks then
+        resume or start a new session.
+        '''
+        if not resumable:
+            self.invalidate_session()
+            
+        await asyncio.sleep(random.uniform(1, 5))
+        
+        if self.resumable:
+            await self.resume()
+        else:
+            await self.identify()
+            
+    def invalidate_session(self) -> None:
+        self._session_id = None
+        self._sequence = None
+        self._resume_url = None
+        
+    async def handle_disconnect(
+        self,
+        code: Optional[int] = None,
+        extra=None
+    ) -> None:
         '''
         Websockets are encountered an issues.
         Checking whether resume is possible or raise an error.
         '''
-        self.shard_log('Recieved a close signal.', 'warning')
-        self.pacemaker.cancel()
+        self.shard_log('Recieved a close signal: %s.', 'warning', code)
         
-        if (code := str(message)) in error.keys():
-            raise error[code](extra)
-        self._reconnect = True
+        if str(code) in error.keys():
+            raise error[str(code)](extra)
+            
+        if code in NON_RESUMABLE_CLOSE_CODES:
+            self.invalidate_session()
+            
+    async def close(self) -> None:
+        ''' Disconnect for good, the session is invalidated. '''
+        self._closing = True
+        
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close(code=1000)
+            
+    @property
+    def resumable(self) -> bool:
+        return self._session_id is not None and self._sequence is not None
         
     async def handle_event(self, ev: str, payload: dict) -> Optional[Any]:
         '''
         Event Handler
         
+        Shard state and the cache are always updated,
+        the listener's arguments are only built if someone listens.
+        
         Parameters
         ----------
         :ev: Event's name
         :payload: Event's data
         '''
-        if (ev := ev.lower()) == "ready":
+        self._client.cache.parse(ev, payload)
+        
+        if (handler := self._state_handlers.get(ev)) is not None:
+            handler(payload)
             
-            self._session_id = payload['session_id']
-            self._client.user = payload['user']
+        if (entry := events.parsers.get(ev)) is None:
+            return None
             
-            self._client._build_command()
+        listener, parser = entry
+        
+        if not self._client.has_listener(listener):
+            return None
             
-            return await self._client.dispatch('on_ready')
+        return await self._client.dispatch(listener, *parser(self, payload))
+        
+    def _parse_ready(self, payload: dict) -> None:
+        self._session_id = payload['session_id']
+        self._resume_url = payload.get('resume_gateway_url')
+        self._ready = True
+        self._client.user = payload['user']
         
-        if ev.split('_')[0] == "message":
+        if self._presence_dirty:
+            # IDENTIFY sent the presence up to its version,
+            # updates made while it was on the way are still due.
+            sent = self._identified_version
+            waiters, self._presence_waiters = self._presence_waiters, []
             
-            return await self._client.dispatch(
-                'on_' + ev,
-                Message(self._client.http, payload)
-            )
+            for version, future in waiters:
+                if version > sent:
+                    self._presence_waiters.append((version, future))
+                elif not future.done():
+                    future.set_result(None)
+                    
+            self._presence_dirty = self._presence_version > sent
+            
+            if self._presence_dirty:
+                self._flush_presence()
         
-        # Interaction create handler
+        if (application := payload.get('application')) is not None:
+            self._client.application_id = int(application['id'])
         
-    async def next_shard(self) -> None:
-        ''' Calling for next shard '''
-        try:
-            await self._client._lock_sentinel.release()
-        except Exception:
-            ...
+        self.shard_log('Connected to Discord and recieved READY state')
+        self.guilds = {guild['id'] for guild in payload['guilds']}
+        
+        self._client._build_command()
+        
+    def _parse_resumed(self, payload: dict) -> None:
+        self._ready = True
+        
+        if self._presence_dirty:
+            self._flush_presence()
+        self.shard_log('Resumed at seq %s', 'debug', self._sequence)
+        
+    def _parse_guild_create(self, payload: dict) -> None:
+        self.guilds.add(payload['id'])
+        
+    def _parse_members_chunk(self, payload: dict) -> None:
+        
+        request = self._member_requests.get(payload.get('nonce'))
+        
+        if request is None:
+            return
+            
+        queue, members = request
+        
+        if not members:
+            # Already in the cache, the caller only wants progress.
+            count = len(payload.get('members', ()))
+            payload = {
+                key: value for key, value in payload.items()
+                if key not in ('members', 'presences')
+            }
+            payload['count'] = count
+            
+        queue.put_nowait(payload)
+        
+    def _parse_guild_delete(self, payload: dict) -> None:
+        if not payload.get('unavailable'):
+            self.guilds.discard(payload['id'])
             
             
 class AutoSharded:
     
-    def __init__(self):
-        
-        self.num_shards = 1 # Default 2:: not needed for now.
+    def __init__(
+        self,
+        *,
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[Iterable[int]] = None
+    ):
+        '''
+        Parameter
+        ----------
+        :shard_count: total shards of the bot,
+            Discord's recommendation if None.
+        :shard_ids: shards run by this process, all of them if None.
+            Lets several processes split one bot.
+        '''
+        if shard_ids is not None and shard_count is None:
+            raise ValueError(
+                'shard_count must be set when shard_ids is given.'
+            )
+            
+        self.num_shards: Optional[int] = shard_count
+        self.shard_ids: Optional[List[int]] = (
+            None if shard_ids is None else list(shard_ids)
+        )
         self.shards: dict = {}
+        self.identify_ratelimitter = IdentifyRateLimitter()
+        # dispycord.metrics.Metrics, set by the client when enabled.
+        self.metrics = None
+        # Overrides :WSS:, e.g. to connect to a local fake gateway.
+        self.gateway_url: Optional[str] = None
+        
+        self._shard_tasks: List[asyncio.Task] = []
+        self.shard_error: Optional[BaseException] = None
+        
+    async def fetch_gateway(self) -> dict:
+        '''
+        GET /gateway/bot
+        
+        Return
+        ------
+        url, recommended shards and session_start_limit.
+        '''
+        return await self.http.Route(None, '/gateway/bot', 'GET')
+        
+    def get_shard(self, guild_id: int) -> 'Shard':
+        '''
+        The shard a guild's events come from.
         
-        self._lock_sentinel = asyncio.Lock()
+        Raise
+        -----
+        :ValueError: the shard is run by another process.
+        '''
+        shard_id = (int(guild_id) >> 22) % self.num_shards
+        
+        if (shard := self.shards.get('shard' + str(shard_id))) is None:
+            raise ValueError(
+                f'Guild {guild_id} is on shard {shard_id}, '
+                'not run by this process.'
+            )
+            
+        return shard
         
+    async def wait_identify(self, shard_id: int) -> None:
+        ''' Wait until :shard_id: may send IDENTIFY. '''
+        await self.identify_ratelimitter.wait(shard_id)
+            
     async def new_shard(self) -> None:
-        ''' Creating new shard object '''
-        for shard in range(self.num_shards):
+        ''' Creating shard objects and connecting them. '''
+        gateway = await self.fetch_gateway()
+        limit = gateway['session_start_limit']
+        
+        self.identify_ratelimitter.max_concurrency = limit.get(
+            'max_concurrency', 1
+        )
+        
+        if self.num_shards is None:
+            self.num_shards = gateway['shards']
+            
+        if self.shard_ids is None:
+            self.shard_ids = list(range(self.num_shards))
+            
+        if limit['remaining'] < len(self.shard_ids):
+            log.warning(
+                'Only %s of %s session starts left, resets in %s ms.',
+                limit['remaining'],
+                limit['total'],
+                limit['reset_after']
+            )
+            
+        log.debug(
+            'Spawning shards %s of %s, max_concurrency %s',
+            self.shard_ids,
+            self.num_shards,
+            self.identify_ratelimitter.max_concurrency
+        )
+        
+        for shard in self.shard_ids:
             
             sharder = Shard(
                 self,
                 shard
             )
             
-            log.debug('Spawning shard %s', shard)
-            
             self.shards['shard' + str(shard)] = sharder
             
-            async with self._lock_sentinel:
-                
-                self.loop.create_task(
-                    sharder.spawn_ws()
-                )
-                
-                await self._lock_sentinel.acquire()
-                
-            await asyncio.sleep(1)
\ No newline at end of file
+            # IDENTIFY is paced by wait_identify,
+            # so every shard connects at once.
+            task = self.loop.create_task(
+                sharder.spawn_ws()
+            )
+            task.add_done_callback(self._shard_done)
+            self._shard_tasks.append(task)
+            
+    def _shard_done(self, task: asyncio.Task) -> None:
+        '''
+        A shard stopped for good, e.g. on a fatal close code.
+        The error is kept in :shard_error: and the loop is stopped,
+        :Client.run: raises it.
+        '''
+        if task.cancelled() or (exc := task.exception()) is None:
+            return
+            
+        log.error(
+            'A shard stopped with a fatal error, shutting down.', exc_info=exc
+        )
+        
+        if self.shard_error is None:
+            self.shard_error = exc
+            
+        self.loop.stop()
\ No newline at end of file
@@ -0,0 +1,567 @@
+'''
+Local fake gateway.
+
+Speaks enough of the gateway protocol for a client to connect,
+identify, heartbeat, resume and receive dispatches, without Discord:
+HELLO, IDENTIFY / READY, heartbeat ACK, RESUME / RESUMED,
+INVALID_SESSION and RECONNECT. Every shard is sent a stream of
+dispatches, synthetic or recorded, at a configurable rate.
+The REST routes the client needs on start are served too.
+    
+    gateway = FakeGateway(stream=synthetic_stream(messages=10000))
+    await gateway.start()
+    
+    client = Bot(
+        gateway_url=gateway.url,
+        http_options={'base_url': gateway.api_url}
+    )
+'''
+import asyncio
+import collections
+import json
+import logging
+import time
+import uuid
+import zlib
+from typing import (
+    Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+)
+
+from aiohttp import WSMsgType, web
+
+from . import etf
+from .codec import get_codec
+from .shard import (
+    ACK,
+    DISPATCH,
+    HEARTBEAT,
+    HELLO,
+    IDENTIFY,
+    INVALID_SESSION,
+    RECONNECT,
+    RESUME,
+)
+
+__all__ = (
+    'FakeGateway',
+    'load_recording',
+    'synthetic_stream',
+)
+
+log = logging.getLogger(__name__)
+
+# (event name, payload)
+Dispatch = Tuple[str, dict]
+# (shard id, shard count) -> dispatches sent after READY
+Stream = Callable[[int, int], Iterable[Dispatch]]
+
+# Discord's epoch in ms, snowflakes carry their creation time after it.
+DISCORD_EPOCH = 1420070400000
+
+
+def _snowflake(index: int) -> str:
+    elapsed = int(time.time() * 1000) - DISCORD_EPOCH
+    return str((elapsed << 22) | (index & 0x3FFFFF))
+
+
+def _member(**fields: Any) -> dict:
+    return {
+        'roles': [],
+        'joined_at': '2021-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        **fields,
+    }
+
+
+def _control(op: int, data: Any = None) -> dict:
+    ''' A non dispatch payload. '''
+    return {'op': op, 't': None, 's': None, 'd': data}
+
+
+def _guild_id(index: int, shard_id: int, shard_count: int) -> str:
+    ''' A guild id routed to :shard_id:, see :AutoSharded.get_shard:. '''
+    return str(((index * shard_count + shard_id) << 22) | 1)
+
+
+def synthetic_stream(
+    *,
+    messages: int = 1000,
+    guilds: int = 10,
+    channels: int = 5,
+    members: int = 50,
+    content_size: int = 64
+) -> Stream:
+    '''
+    A GUILD_CREATE per guild, then MESSAGE_CREATEs spread over
+    their channels. Payloads have the fields and size Discord sends.
+    
+    Parameter
+    ----------
+    :messages: MESSAGE_CREATEs per shard.
+    :guilds: guilds per shard.
+    :channels: text channels per guild.
+    :members: members per guild, sent in GUILD_CREATE.
+    :content_size: characters of message content.
+    '''
+    lorem = 'lorem ipsum dolor sit amet '
+    content = (lorem * (content_size // len(lorem) + 1))[:content_size]
+    
+    def stream(shard_id: int, shard_count: int) -> Iterator[Dispatch]:
+        guild_ids = [
+            _guild_id(index, shard_id, shard_count) for index in range(guilds)
+        ]
+        channel_ids: Dict[str, List[str]] = {}
+        users = [
+            {
+                'id': str(1000 + index),
+                'username': f'user{index}',
+                'discriminator': '0000',
+                'avatar': None,
+                'bot': False,
+            }
+            for index in range(members)
+        ]
+        
+        for guild_id in guild_ids:
+            channel_ids[guild_id] = [
+                str(int(guild_id) + index + 1) for index in range(channels)
+            ]
+            
+            yield 'GUILD_CREATE', {
+                'id': guild_id,
+                'name': f'guild {guild_id}',
+                'owner_id': users[0]['id'] if users else '1000',
+                'unavailable': False,
+                'member_count': members,
+                'roles': [
+                    {'id': guild_id, 'name': '@everyone', 'permissions': '0'}
+                ],
+                'channels': [
+                    {
+                        'id': channel_id,
+                        'type': 0,
+                        'name': f'channel-{channel_id}',
+                        'position': position,
+                    }
+                    for position, channel_id in enumerate(
+                        channel_ids[guild_id]
+                    )
+                ],
+                'members': [_member(user=user) for user in users],
+            }
+        
+        for index in range(messages):
+            guild_id = guild_ids[index % len(guild_ids)]
+            if users:
+                user = users[index % len(users)]
+            else:
+                user = {'id': '1000', 'username': 'user'}
+            
+            yield 'MESSAGE_CREATE', {
+                'id': _snowflake(index),
+                'type': 0,
+                'guild_id': guild_id,
+                'channel_id': channel_ids[guild_id][index % channels],
+                'author': user,
+                'member': _member(),
+                'content': content,
+                'timestamp': '2021-01-01T00:00:00.000000+00:00',
+                'edited_timestamp': None,
+                'tts': False,
+                'mention_everyone': False,
+                'mentions': [],
+                'mention_roles': [],
+                'attachments': [],
+                'embeds': [],
+                'pinned': False,
+            }
+    
+    return stream
+
+
+def load_recording(path: str) -> Stream:
+    '''
+    Replay dispatches recorded as JSON lines, either gateway payloads
+    ({"op": 0, "t": ..., "d": ...}) or {"t": ..., "d": ...}.
+    Every shard is sent the whole recording.
+    '''
+    recording: List[Dispatch] = []
+    
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not (line := line.strip()):
+                continue
+            
+            payload = json.loads(line)
+            
+            if payload.get('op', DISPATCH) == DISPATCH and payload.get('t'):
+                recording.append((payload['t'], payload['d']))
+    
+    def stream(shard_id: int, shard_count: int) -> Iterator[Dispatch]:
+        return iter(recording)
+    
+    return stream
+
+
+class _Session:
+    ''' A shard's session, outlives its connections until invalidated. '''
+    __slots__ = ('id', 'shard', 'sequence', 'sent', 'stream', 'connection')
+    
+    def __init__(
+        self,
+        shard: Tuple[int, int],
+        stream: Iterator[Dispatch],
+        buffer: int
+    ):
+        self.id = uuid.uuid4().hex
+        self.shard = shard
+        self.sequence = 0
+        # Sent dispatches, replayed on RESUME.
+        self.sent: Deque[dict] = collections.deque(maxlen=buffer)
+        self.stream = stream
+        self.connection: Optional['_Connection'] = None
+
+
+class _Connection:
+    
+    def __init__(
+        self,
+        gateway: 'FakeGateway',
+        ws: web.WebSocketResponse,
+        encoding: str,
+        compress: bool
+    ):
+        self.gateway = gateway
+        self.ws = ws
+        self.encoding = encoding
+        self.session: Optional[_Session] = None
+        
+        self._deflate = zlib.compressobj() if compress else None
+        self._streaming: Optional[asyncio.Task] = None
+        
+        self.identified = False
+        self.heartbeats = 0
+    
+    async def send(self, payload: dict) -> None:
+        if self._deflate is not None:
+            if self.encoding == 'etf':
+                data = etf.dumps(payload)
+            else:
+                data = self.gateway.codec.dumps(payload)
+            
+            deflate = self._deflate
+            await self.ws.send_bytes(
+                deflate.compress(data) + deflate.flush(zlib.Z_SYNC_FLUSH)
+            )
+        
+        elif self.encoding == 'etf':
+            await self.ws.send_bytes(etf.dumps(payload))
+        
+        else:
+            await self.ws.send_str(self.gateway.codec.dumps_str(payload))
+    
+    def _loads(self, message: Any) -> dict:
+        if message.type is WSMsgType.BINARY and self.encoding == 'etf':
+            return etf.loads(message.data)
+        return json.loads(message.data)
+    
+    async def dispatch(self, event: str, data: dict) -> None:
+        session = self.session
+        session.sequence += 1
+        
+        if self.gateway.stamp and event == 'MESSAGE_CREATE':
+            # Wall clock send time, for the receiver's latency.
+            data = {**data, 'nonce': repr(time.time())}
+        
+        payload = {
+            'op': DISPATCH, 't': event, 's': session.sequence, 'd': data
+        }
+        session.sent.append(payload)
+        await self.send(payload)
+    
+    async def run(self) -> None:
+        gateway = self.gateway
+        await self.send(_control(
+            HELLO, {'heartbeat_interval': gateway.heartbeat_interval}
+        ))
+        
+        try:
+            async for message in self.ws:
+                
+                if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    break
+                
+                data = self._loads(message)
+                op = data['op']
+                
+                if op == HEARTBEAT:
+                    self.heartbeats += 1
+                    await self.send(_control(ACK))
+                
+                elif op == IDENTIFY:
+                    await self._identify(data['d'])
+                
+                elif op == RESUME:
+                    await self._resume(data['d'])
+        finally:
+            if self._streaming is not None:
+                self._streaming.cancel()
+            
+            if self.session is not None and self.session.connection is self:
+                self.session.connection = None
+    
+    async def _identify(self, data: dict) -> None:
+        gateway = self.gateway
+        
+        if gateway.token is not None and data.get('token') != gateway.token:
+            await self.ws.close(code=4004, message=b'Authentication failed.')
+            return
+        
+        if self._streaming is not None:
+            self._streaming.cancel()
+        
+        shard_id, shard_count = data.get('shard') or (0, 1)
+        session = _Session(
+            (shard_id, shard_count),
+            iter(gateway.stream(shard_id, shard_count)),
+            gateway.resume_buffer
+        )
+        session.connection = self
+        gateway.sessions[session.id] = session
+        self.session = session
+        self.identified = True
+        
+        await self.dispatch('READY', {
+            'v': 9,
+            'user': {
+                'id': '1',
+                'username': 'fake',
+                'discriminator': '0000',
+                'avatar': None,
+                'bot': True,
+            },
+            'application': {'id': '1', 'flags': 0},
+            'session_id': session.id,
+            'resume_gateway_url': gateway.url,
+            'shard': [shard_id, shard_count],
+            'guilds': [],
+        })
+        
+        self._start_stream()
+    
+    def _start_stream(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._streaming = loop.create_task(self._stream())
+    
+    async def _resume(self, data: dict) -> None:
+        session = self.gateway.sessions.get(data.get('session_id'))
+        sequence = data.get('seq') or 0
+        
+        # Sequence of the oldest dispatch still buffered.
+        oldest = session.sent[0]['s'] if session and session.sent else 0
+        
+        if session is None or sequence < oldest - 1:
+            # Unknown session or its missed events are gone.
+            await self.send(_control(INVALID_SESSION, False))
+            return
+        
+        previous = session.connection
+        
+        if previous is not None and previous is not self:
+            # Its stream must not buffer dispatches past the replay.
+            if previous._streaming is not None:
+                previous._streaming.cancel()
+            
+            await previous.ws.close(code=4000)
+        
+        if self._streaming is not None:
+            self._streaming.cancel()
+        
+        session.connection = self
+        self.session = session
+        
+        for payload in list(session.sent):
+            if payload['s'] > sequence:
+                await self.send(payload)
+        
+        await self.dispatch('RESUMED', {})
+        self._start_stream()
+    
+    async def _stream(self) -> None:
+        '''
+        Send the session's remaining dispatches,
+        :FakeGateway.rate: per second.
+        '''
+        gateway, session = self.gateway, self.session
+        rate = gateway.rate
+        started = time.perf_counter()
+        sent = 0
+        
+        try:
+            for event, data in session.stream:
+                await self.dispatch(event, data)
+                sent += 1
+                gateway.dispatched += 1
+                
+                # Paced once sent, a stream cancelled meanwhile
+                # leaves no dispatch taken from the session's stream.
+                if rate:
+                    elapsed = time.perf_counter() - started
+                    
+                    if (ahead := sent / rate - elapsed) > 0.001:
+                        await asyncio.sleep(ahead)
+                elif sent % 256 == 0:
+                    # Let heartbeats through.
+                    await asyncio.sleep(0)
+        
+        except (ConnectionResetError, RuntimeError) as exc:
+            log.debug('Stream of session %s stopped: %r', session.id, exc)
+
+
+class FakeGateway:
+    
+    """ A local gateway and API server. """
+    
+    def __init__(
+        self,
+        *,
+        stream: Optional[Stream] = None,
+        rate: Optional[float] = None,
+        heartbeat_interval: int = 41250,
+        shard_count: int = 1,
+        token: Optional[str] = None,
+        resume_buffer: int = 10000,
+        stamp: bool = False
+    ):
+        """
+        :param stream: dispatches sent to every shard after READY,
+            see :synthetic_stream: and :load_recording:.
+        :param rate: dispatches per second per shard, as fast as
+            possible if None.
+        :param heartbeat_interval: ms, sent in HELLO.
+        :param shard_count: recommended by GET /gateway/bot.
+        :param token: the token IDENTIFY must carry, any if None.
+        :param resume_buffer: dispatches kept per session for RESUME.
+        :param stamp: put the send time in MESSAGE_CREATE nonces.
+        """
+        self.stream: Stream = stream or synthetic_stream()
+        self.rate = rate
+        self.heartbeat_interval = heartbeat_interval
+        self.shard_count = shard_count
+        self.token = token
+        self.resume_buffer = resume_buffer
+        self.stamp = stamp
+        self.codec = get_codec()
+        
+        self.sessions: Dict[str, _Session] = {}
+        self.connections: Set[_Connection] = set()
+        self.dispatched: int = 0
+        
+        self.host: Optional[str] = None
+        self.port: Optional[int] = None
+        self._runner: Optional[web.AppRunner] = None
+    
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}/gateway?v=9'
+    
+    @property
+    def api_url(self) -> str:
+        return f'http://{self.host}:{self.port}/api/v9'
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        ''' Listen on :host:, on a free port if :port: is 0. '''
+        app = web.Application()
+        app.router.add_get('/gateway', self._gateway)
+        app.router.add_get('/api/v9/gateway/bot', self._gateway_bot)
+        app.router.add_route('*', '/api/v9/{path:.*}', self._api)
+        
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        
+        self.host = host
+        self.port = site._server.sockets[0].getsockname()[1]
+    
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        
+        connection = _Connection(
+            self,
+            ws,
+            request.query.get('encoding', 'json'),
+            request.query.get('compress') == 'zlib-stream'
+        )
+        self.connections.add(connection)
+        
+        try:
+            await connection.run()
+        finally:
+            self.connections.discard(connection)
+        
+        return ws
+    
+    async def _gateway_bot(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'url': self.url,
+            'shards': self.shard_count,
+            'session_start_limit': {
+                'total': 1000,
+                'remaining': 1000,
+                'reset_after': 0,
+                # Every shard identifies at once.
+                'max_concurrency': max(self.shard_count, 16),
+            },
+        })
+    
+    async def _api(self, request: web.Request) -> web.Response:
+        # Command syncs fetch and PUT lists, nothing is registered.
+        if request.path.endswith('/commands'):
+            return web.json_response([])
+        
+        return web.json_response({})
+    
+    def _select(self, shard_id: Optional[int]) -> List[_Connection]:
+        return [
+            connection for connection in self.connections
+            if connection.session is not None and (
+                shard_id is None or connection.session.shard[0] == shard_id
+            )
+        ]
+    
+    async def reconnect(self, shard_id: Optional[int] = None) -> None:
+        ''' Send RECONNECT, to every shard if :shard_id: is None. '''
+        for connection in self._select(shard_id):
+            await connection.send(_control(RECONNECT))
+    
+    async def invalidate(
+        self,
+        shard_id: Optional[int] = None,
+        resumable: bool = False
+    ) -> None:
+        ''' Send INVALID_SESSION, a non resumable session is dropped. '''
+        for connection in self._select(shard_id):
+            if not resumable:
+                self.sessions.pop(connection.session.id, None)
+            await connection.send(_control(INVALID_SESSION, resumable))
+    
+    async def disconnect(
+        self,
+        shard_id: Optional[int] = None,
+        code: int = 4000
+    ) -> None:
+        ''' Close the connections with :code:, 4000 lets them resume. '''
+        for connection in self._select(shard_id):
+            await connection.ws.close(code=code)
+    
+    async def close(self) -> None:
+        for connection in list(self.connections):
+            await connection.ws.close(code=1001)
+        
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
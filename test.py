@@ -20,7 +20,7 @@ bot = ext.Bot(
 	description='ban people',
 	slash_type=1
 )
-async def ban_slash():
+async def ban_slash(interaction):
 	...
 
 
@@ -0,0 +1,26 @@
+import contextlib
+
+import pytest
+from aiohttp import web
+
+
+@contextlib.asynccontextmanager
+async def _local_server(handler):
+    ''' Serve every path with :handler:, yields the base URL. '''
+    app = web.Application()
+    app.router.add_route('*', '/{path:.*}', handler)
+    
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    
+    try:
+        yield f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+def local_server():
+    return _local_server
@@ -0,0 +1,68 @@
+import copy
+
+from dispycord.cache import CachePolicy, StateCache
+from dispycord.testing import synthetic_stream
+
+
+def _guilds(count=3):
+    stream = synthetic_stream(messages=0, guilds=count, members=4)
+    return [payload for _, payload in stream(0, 1)]
+
+
+def test_guild_create_keeps_the_payload_intact():
+    cache = StateCache()
+    guild = _guilds(1)[0]
+    sent = copy.deepcopy(guild)
+    
+    cache.parse('GUILD_CREATE', guild)
+    
+    assert guild == sent
+    channel = guild['channels'][0]
+    assert cache.get_channel(channel['id'])['guild_id'] == guild['id']
+
+
+def test_guild_delete_drops_only_its_entries():
+    cache = StateCache()
+    first, second, third = _guilds()
+    
+    for guild in (first, second, third):
+        cache.parse('GUILD_CREATE', guild)
+    
+    cache.parse('CHANNEL_CREATE', {'id': '1', 'type': 1})
+    cache.parse('GUILD_DELETE', {'id': second['id']})
+    
+    assert cache.get_guild(second['id']) is None
+    assert len(cache.channels) == 2 * len(first['channels']) + 1
+    assert len(cache.members) == 2 * len(first['members'])
+    
+    for channel in second['channels']:
+        assert cache.get_channel(channel['id']) is None
+    
+    user_id = first['members'][0]['user']['id']
+    assert cache.get_member(first['id'], user_id) is not None
+    assert cache.get_member(second['id'], user_id) is None
+
+
+def test_unavailable_guild_is_kept():
+    cache = StateCache()
+    guild = _guilds(1)[0]
+    cache.parse('GUILD_CREATE', guild)
+    
+    cache.parse('GUILD_DELETE', {'id': guild['id'], 'unavailable': True})
+    
+    assert cache.get_guild(guild['id']) is not None
+    assert len(cache.members) == len(guild['members'])
+
+
+def test_guild_index_follows_eviction():
+    cache = StateCache(members=CachePolicy.lru(3))
+    first, second = _guilds(2)
+    
+    cache.parse('GUILD_CREATE', first)
+    cache.parse('GUILD_CREATE', second)
+    
+    # The first guild's members were evicted, its index went with them.
+    assert int(first['id']) not in {key[0] for key in cache.members.keys()}
+    assert cache.members.pop_group(int(first['id'])) == 0
+    assert cache.members.pop_group(int(second['id'])) == 3
+    assert len(cache.members) == 0
@@ -0,0 +1,126 @@
+import asyncio
+import random
+
+from dispycord.ext.executor import DispatchExecutor
+
+
+class Handlers:
+    ''' Records the handlers run, each one waits for :gate:. '''
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.ran = []
+    
+    async def handler(self, data):
+        await self.gate.wait()
+        self.ran.append(data['n'])
+
+
+def _event(n, channel_id=1):
+    return ({'n': n, 'channel_id': channel_id},)
+
+
+async def _busy(executor, handlers, count):
+    ''' One handler running, :count: - 1 queued behind it. '''
+    for n in range(count):
+        assert await executor.submit(handlers.handler, _event(n))
+        await asyncio.sleep(0)
+
+
+async def _drain(executor, handlers):
+    handlers.gate.set()
+    
+    while executor.depth or executor.in_flight:
+        await asyncio.sleep(0.01)
+    
+    await executor.close()
+
+
+def test_block_waits_for_room():
+    async def scenario():
+        executor = DispatchExecutor(workers=1, max_pending=1, policy='block')
+        handlers = Handlers()
+        await _busy(executor, handlers, 2)
+        
+        submit = asyncio.create_task(
+            executor.submit(handlers.handler, _event(2))
+        )
+        await asyncio.sleep(0.05)
+        assert not submit.done()
+        
+        handlers.gate.set()
+        assert await asyncio.wait_for(submit, 1)
+        await _drain(executor, handlers)
+        
+        assert handlers.ran == [0, 1, 2]
+    
+    asyncio.run(scenario())
+
+
+def test_drop_discards_the_new_handler():
+    async def scenario():
+        executor = DispatchExecutor(workers=1, max_pending=1, policy='drop')
+        handlers = Handlers()
+        await _busy(executor, handlers, 2)
+        
+        assert not await executor.submit(handlers.handler, _event(2))
+        await _drain(executor, handlers)
+        
+        assert handlers.ran == [0, 1]
+        assert executor.dropped == 1
+    
+    asyncio.run(scenario())
+
+
+def test_shed_discards_the_oldest_queued_handler():
+    async def scenario():
+        executor = DispatchExecutor(workers=1, max_pending=1, policy='shed')
+        handlers = Handlers()
+        await _busy(executor, handlers, 2)
+        
+        assert await executor.submit(handlers.handler, _event(2))
+        await _drain(executor, handlers)
+        
+        assert handlers.ran == [0, 2]
+        assert executor.shed == 1
+    
+    asyncio.run(scenario())
+
+
+def test_shed_on_one_busy_ordered_key():
+    async def scenario():
+        executor = DispatchExecutor(
+            workers=1, max_pending=2, policy='shed', ordered='channel'
+        )
+        handlers = Handlers()
+        await _busy(executor, handlers, 3)
+        
+        submit = executor.submit(handlers.handler, _event(3))
+        assert await asyncio.wait_for(submit, 1)
+        await _drain(executor, handlers)
+        
+        assert handlers.ran == [0, 2, 3]
+        assert executor.shed == 1
+    
+    asyncio.run(scenario())
+
+
+def test_ordered_keys_run_in_dispatch_order():
+    async def scenario():
+        executor = DispatchExecutor(workers=4, ordered='channel')
+        ran = {1: [], 2: []}
+        
+        async def handler(data):
+            await asyncio.sleep(random.random() / 100)
+            ran[data['channel_id']].append(data['n'])
+        
+        for n in range(20):
+            await executor.submit(handler, _event(n, channel_id=n % 2 + 1))
+        
+        while executor.depth or executor.in_flight:
+            await asyncio.sleep(0.01)
+        
+        await executor.close()
+        
+        assert ran == {1: list(range(0, 20, 2)), 2: list(range(1, 20, 2))}
+    
+    asyncio.run(scenario())
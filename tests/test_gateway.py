@@ -0,0 +1,181 @@
+import asyncio
+import random
+
+import pytest
+
+from dispycord.errors import LoginFailure
+from dispycord.ext import Bot
+from dispycord.shard import ACK
+from dispycord.testing import FakeGateway, _Connection, synthetic_stream
+
+MESSAGES = 200
+
+
+@pytest.fixture
+def handshakes(monkeypatch):
+    ''' IDENTIFYs and RESUMEs the fake gateway got, with no random waits. '''
+    counts = {'identify': 0, 'resume': 0}
+    identify, resume = _Connection._identify, _Connection._resume
+    
+    async def counted_identify(self, data):
+        counts['identify'] += 1
+        await identify(self, data)
+    
+    async def counted_resume(self, data):
+        counts['resume'] += 1
+        await resume(self, data)
+    
+    monkeypatch.setattr(_Connection, '_identify', counted_identify)
+    monkeypatch.setattr(_Connection, '_resume', counted_resume)
+    # No reconnect backoff, heartbeat jitter or INVALID_SESSION wait.
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    monkeypatch.setattr(random, 'uniform', lambda a, b: 0.0)
+    return counts
+
+
+async def _until(predicate, timeout=5.0):
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+    
+    await asyncio.wait_for(poll(), timeout)
+
+
+def _run(gateway, scenario=None, token='t'):
+    '''
+    Run a bot on :gateway: until :scenario:(bot, received) returns.
+    
+    Return
+    ------
+    Ids of the MESSAGE_CREATEs received.
+    '''
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    received = []
+    
+    try:
+        loop.run_until_complete(gateway.start())
+        bot = Bot(
+            sync_commands=False,
+            shard_count=1,
+            gateway_url=gateway.url,
+            http_options={'base_url': gateway.api_url}
+        )
+        
+        async def wait_identify(shard_id):
+            pass
+        
+        bot.wait_identify = wait_identify
+        
+        @bot.event()
+        async def on_message_create(message):
+            received.append(message.id)
+        
+        async def run_scenario():
+            try:
+                await scenario(bot, received)
+            finally:
+                bot.loop.stop()
+        
+        task = loop.create_task(run_scenario()) if scenario else None
+        # A bot which never stops fails the test instead of hanging it.
+        loop.call_later(10, loop.stop)
+        bot.run(token)
+        
+        if task is not None:
+            task.result()
+    finally:
+        loop.run_until_complete(gateway.close())
+        loop.close()
+        asyncio.set_event_loop(None)
+    
+    return received
+
+
+def _gateway(**options):
+    return FakeGateway(
+        stream=synthetic_stream(messages=MESSAGES, guilds=1),
+        rate=400,
+        token='t',
+        **options
+    )
+
+
+def test_reconnect_resumes_without_duplicates(handshakes):
+    gateway = _gateway()
+    
+    async def scenario(bot, received):
+        await _until(lambda: len(received) > 20)
+        await gateway.reconnect()
+        await _until(lambda: len(received) >= MESSAGES)
+    
+    received = _run(gateway, scenario)
+    
+    assert handshakes == {'identify': 1, 'resume': 1}
+    assert len(received) == len(set(received)) == MESSAGES
+
+
+def test_unacknowledged_heartbeat_resumes(handshakes, monkeypatch):
+    gateway = _gateway(heartbeat_interval=100)
+    zombies = set()
+    send = _Connection.send
+    
+    async def send_unless_zombie(self, payload):
+        if self not in zombies or payload['op'] != ACK:
+            await send(self, payload)
+    
+    monkeypatch.setattr(_Connection, 'send', send_unless_zombie)
+    
+    async def scenario(bot, received):
+        await _until(lambda: len(received) > 20)
+        shard = bot.shards['shard0']
+        assert shard.latency < 1
+        
+        zombies.update(gateway.connections)
+        await _until(lambda: handshakes['resume'] == 1)
+        await _until(lambda: len(received) >= MESSAGES)
+    
+    received = _run(gateway, scenario)
+    
+    assert handshakes == {'identify': 1, 'resume': 1}
+    assert len(received) == len(set(received)) == MESSAGES
+
+
+def test_resumable_close_resumes_without_duplicates(handshakes):
+    gateway = _gateway()
+    
+    async def scenario(bot, received):
+        await _until(lambda: len(received) > 20)
+        await gateway.disconnect(code=4000)
+        await _until(lambda: len(received) >= MESSAGES)
+    
+    received = _run(gateway, scenario)
+    
+    assert handshakes == {'identify': 1, 'resume': 1}
+    assert len(received) == len(set(received)) == MESSAGES
+
+
+def test_invalid_session_identifies_again(handshakes):
+    gateway = _gateway()
+    
+    async def scenario(bot, received):
+        await _until(lambda: len(received) > 20)
+        shard = bot.shards['shard0']
+        session_id = shard._session_id
+        
+        await gateway.invalidate(resumable=False)
+        await _until(lambda: shard._session_id not in (None, session_id))
+        
+        assert shard._session_id in gateway.sessions
+        assert session_id not in gateway.sessions
+    
+    _run(gateway, scenario)
+    
+    assert handshakes == {'identify': 2, 'resume': 0}
+
+
+def test_authentication_failure_stops_run(handshakes):
+    with pytest.raises(LoginFailure):
+        _run(_gateway(), token='wrong')
+    
+    assert handshakes == {'identify': 1, 'resume': 0}
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from dispycord.shard import GatewayRateLimitter
+
+
+_sleep = asyncio.sleep
+
+
+class FakeClock:
+    
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers = []
+    
+    def __call__(self):
+        return self.now
+    
+    async def sleep(self, delay, *args):
+        ''' Stands in for asyncio.sleep, wakes up on :advance:. '''
+        future = asyncio.get_running_loop().create_future()
+        self._sleepers.append((self.now + delay, future))
+        await future
+    
+    async def advance(self, seconds):
+        self.now += seconds
+        
+        for deadline, future in list(self._sleepers):
+            if deadline <= self.now:
+                self._sleepers.remove((deadline, future))
+                future.set_result(None)
+        
+        # Let the woken up tasks run.
+        for _ in range(5):
+            await _sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr('dispycord.shard.asyncio.sleep', clock.sleep)
+    return clock
+
+
+def _drain(limitter, priority=False):
+    taken = 0
+    while limitter.try_acquire(priority):
+        taken += 1
+    return taken
+
+
+def test_refills_at_rate_per_window(clock):
+    limitter = GatewayRateLimitter(rate=120, per=60.0, reserved=0, clock=clock)
+    
+    assert _drain(limitter) == 120
+    
+    clock.now += 1.0
+    assert _drain(limitter) == 2
+    
+    clock.now += 0.25
+    assert not limitter.try_acquire()
+    clock.now += 0.25
+    assert limitter.try_acquire()
+
+
+def test_refill_is_capped(clock):
+    limitter = GatewayRateLimitter(rate=120, per=60.0, reserved=0, clock=clock)
+    _drain(limitter)
+    
+    clock.now += 3600
+    assert _drain(limitter) == 120
+
+
+def test_reserved_tokens_are_only_for_priority(clock):
+    limitter = GatewayRateLimitter(rate=120, per=60.0, reserved=5, clock=clock)
+    
+    assert _drain(limitter) == 115
+    assert _drain(limitter, priority=True) == 5
+    assert not limitter.try_acquire(True)
+
+
+def test_wait_time(clock):
+    limitter = GatewayRateLimitter(rate=120, per=60.0, reserved=5, clock=clock)
+    assert limitter.wait_time == 0
+    
+    _drain(limitter)
+    # One token short of the normal lane, 2 tokens per second.
+    assert limitter.wait_time == pytest.approx(0.5)
+    assert limitter.get_wait(priority=True) == 0
+    
+    clock.now += 0.2
+    assert limitter.wait_time == pytest.approx(0.3)
+
+
+def test_queue_depth_and_waited_time(clock):
+    async def scenario():
+        limitter = GatewayRateLimitter(
+            rate=120, per=60.0, reserved=5, clock=clock
+        )
+        _drain(limitter)
+        _drain(limitter, priority=True)
+        
+        normal = [asyncio.ensure_future(limitter.tick()) for _ in range(3)]
+        priority = asyncio.ensure_future(limitter.tick(priority=True))
+        
+        await _sleep(0)
+        assert limitter.queue_depth == 4
+        
+        # Two tokens a second, the priority lane needs one.
+        await clock.advance(0.5)
+        assert priority.done() and priority.result() == pytest.approx(0.5)
+        assert limitter.queue_depth == 3
+        
+        while limitter.queue_depth:
+            await clock.advance(0.5)
+        
+        waited = [task.result() for task in normal]
+        assert waited == sorted(waited) and waited[0] > 0
+    
+    asyncio.run(scenario())
+
+
+def test_normal_commands_are_sent_in_order(clock):
+    async def scenario():
+        limitter = GatewayRateLimitter(
+            rate=120, per=60.0, reserved=5, clock=clock
+        )
+        _drain(limitter)
+        sent = []
+        
+        async def command(index):
+            await limitter.tick()
+            sent.append(index)
+        
+        tasks = [asyncio.ensure_future(command(index)) for index in range(5)]
+        await _sleep(0)
+        
+        # Arrives once tokens are back, must still queue behind the others.
+        clock.now += 10
+        tasks.append(asyncio.ensure_future(command(5)))
+        
+        while not all(task.done() for task in tasks):
+            await clock.advance(0.5)
+        
+        assert sent == list(range(6))
+    
+    asyncio.run(scenario())
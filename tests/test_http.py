@@ -0,0 +1,285 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from dispycord.errors import HTTPException
+from dispycord.http import HTTP, get_route
+
+
+MESSAGES = 'GET channels/{id}/messages'
+
+
+def _headers(remaining, reset_after=1.0, bucket='abc', limit=5):
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset-After': str(reset_after),
+        'X-RateLimit-Bucket': bucket,
+    }
+
+
+def _run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_route_masks_ids_and_tokens():
+    assert get_route('GET', '/channels/1/messages/2') == (
+        'GET channels/{id}/messages/{id}',
+        '1'
+    )
+    assert get_route('POST', '/interactions/10/token/callback') == (
+        'POST interactions/{id}/{token}/callback',
+        '10/token'
+    )
+    assert get_route('POST', '/webhooks/10/token') == (
+        'POST webhooks/{id}/{token}',
+        '10/token'
+    )
+
+
+def test_bucket_learned_from_headers(local_server):
+    async def scenario():
+        async def handler(request):
+            return web.json_response(
+                {'ok': True},
+                headers=_headers(3, bucket='hash')
+            )
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            data = await http.Route(None, '/channels/1/messages', 'GET')
+            assert data == {'ok': True}
+            
+            limitter = http.ratelimitter
+            assert limitter._bucket_hashes[MESSAGES] == 'hash'
+            
+            bucket = limitter.get_bucket(MESSAGES, '1')
+            assert bucket.limit == 5
+            assert bucket.remaining == 3
+            assert bucket._known
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_exhausted_bucket_waits_for_reset(local_server):
+    async def scenario():
+        async def handler(request):
+            return web.json_response({}, headers=_headers(0, reset_after=0.2))
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            await http.Route(None, '/channels/1/messages', 'GET')
+            
+            started = time.monotonic()
+            await http.Route(None, '/channels/1/messages', 'GET')
+            assert time.monotonic() - started >= 0.15
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_major_parameters_have_separate_buckets(local_server):
+    async def scenario():
+        async def handler(request):
+            return web.json_response({}, headers=_headers(0, reset_after=1.0))
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            await http.Route(None, '/channels/1/messages', 'GET')
+            
+            # Channel 1 is exhausted for a second, channel 2 is not.
+            started = time.monotonic()
+            await http.Route(None, '/channels/2/messages', 'GET')
+            assert time.monotonic() - started < 0.5
+            
+            limitter = http.ratelimitter
+            assert (
+                limitter.get_bucket(MESSAGES, '1')
+                is not limitter.get_bucket(MESSAGES, '2')
+            )
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_429_on_bucket_is_retried(local_server):
+    async def scenario():
+        hits = []
+        
+        async def handler(request):
+            hits.append(time.monotonic())
+            
+            if len(hits) == 1:
+                return web.json_response(
+                    {'retry_after': 0.2, 'global': False},
+                    status=429,
+                    headers=_headers(0, reset_after=0.2)
+                )
+            return web.json_response({'id': '1'}, headers=_headers(4))
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            data = await http.Route(
+                {'content': 'x'},
+                '/channels/1/messages',
+                'POST'
+            )
+            assert data == {'id': '1'}
+            assert len(hits) == 2
+            assert hits[1] - hits[0] >= 0.15
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_global_429_holds_every_route(local_server):
+    async def scenario():
+        hits = []
+        
+        async def handler(request):
+            hits.append((request.path, time.monotonic()))
+            
+            if len(hits) == 1:
+                return web.json_response(
+                    {'retry_after': 0.3, 'global': True},
+                    status=429,
+                    headers={'X-RateLimit-Global': 'true'}
+                )
+            return web.json_response({})
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            first = asyncio.ensure_future(
+                http.Route(None, '/channels/1/messages', 'GET')
+            )
+            
+            while not hits:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            
+            # Another route, another bucket, still held by the global limit.
+            await http.Route(None, '/guilds/2/members', 'GET')
+            await first
+            
+            limited_at = hits[0][1]
+            assert len(hits) == 3
+            assert all(at - limited_at >= 0.25 for _, at in hits[1:])
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_5xx_is_retried(local_server, monkeypatch):
+    async def scenario():
+        statuses = [502, 500]
+        sleeps = []
+        sleep = asyncio.sleep
+        
+        async def fast_sleep(delay, *args):
+            sleeps.append(delay)
+            await sleep(0)
+        
+        monkeypatch.setattr('dispycord.http.asyncio.sleep', fast_sleep)
+        
+        async def handler(request):
+            if statuses:
+                return web.json_response({}, status=statuses.pop(0))
+            return web.json_response({'ok': True})
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            assert await http.Route(None, '/users/@me', 'GET') == {'ok': True}
+            assert sleeps == [1, 3]
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_5xx_gives_up_after_max_retries(local_server):
+    async def scenario():
+        async def handler(request):
+            return web.json_response({'message': 'down'}, status=503)
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url, max_retries=0)
+            
+            with pytest.raises(HTTPException):
+                await http.Route(None, '/users/@me', 'GET')
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_idle_buckets_are_pruned(local_server):
+    async def scenario():
+        async def handler(request):
+            return web.json_response(
+                {},
+                headers=_headers(4, reset_after=0.05, bucket='callback')
+            )
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            for index in range(20):
+                await http.Route(
+                    {'type': 4},
+                    f'/interactions/{index}/token{index}/callback',
+                    'POST'
+                )
+            
+            limitter = http.ratelimitter
+            assert len(limitter._bucket_hashes) == 1
+            
+            await asyncio.sleep(0.1)
+            assert limitter.prune() == 20
+            assert not limitter._buckets
+            
+            await http.close()
+    
+    _run(scenario)
+
+
+def test_gateway_websockets_leave_rest_pool_free(local_server):
+    async def scenario():
+        async def handler(request):
+            if request.path == '/gateway':
+                ws = web.WebSocketResponse()
+                await ws.prepare(request)
+                await ws.receive()
+                return ws
+            
+            return web.json_response({'ok': True}, headers=_headers(4))
+        
+        async with local_server(handler) as url:
+            http = HTTP(None, token='t', base_url=url, limit=1)
+            
+            sockets = [
+                await http.gateway_session.ws_connect(url + '/gateway')
+                for _ in range(2)
+            ]
+            data = await asyncio.wait_for(
+                http.Route(None, '/channels/1/messages', 'GET'), 1
+            )
+            assert data == {'ok': True}
+            
+            for ws in sockets:
+                await ws.close()
+            
+            await http.close()
+    
+    _run(scenario)
@@ -0,0 +1,64 @@
+import asyncio
+
+from aiohttp import web
+
+from dispycord.abc import Message
+from dispycord.embeds import Embed
+from dispycord.http import HTTP
+
+
+def _channel(http):
+    return Message(http, {'id': '1', 'channel_id': '5'}).channel
+
+
+def _recorder(posted):
+    async def handler(request):
+        posted.append(await request.json())
+        return web.json_response({'id': str(len(posted)), 'channel_id': '5'})
+    
+    return handler
+
+
+def test_embed_sent_directly(local_server):
+    async def scenario():
+        posted = []
+        
+        async with local_server(_recorder(posted)) as url:
+            http = HTTP(None, token='t', base_url=url)
+            
+            embed = Embed(title='title', description='description')
+            await _channel(http).send(embed=embed)
+            await http.close()
+        
+        assert posted[0]['embeds'] == [
+            {'title': 'title', 'description': 'description'}
+        ]
+    
+    asyncio.run(scenario())
+
+
+def test_queued_embeds_are_merged_flat(local_server):
+    async def scenario():
+        posted = []
+        
+        async with local_server(_recorder(posted)) as url:
+            http = HTTP(None, token='t', base_url=url, outbound_queue=True)
+            channel = _channel(http)
+            
+            futures = [
+                await channel.send(
+                    embed=Embed(title=str(index), description='description')
+                )
+                for index in range(3)
+            ]
+            messages = await asyncio.gather(*futures)
+            await http.close()
+        
+        assert len(posted) == 1
+        assert posted[0]['embeds'] == [
+            {'title': str(index), 'description': 'description'}
+            for index in range(3)
+        ]
+        assert {message.id for message in messages} == {1}
+    
+    asyncio.run(scenario())
@@ -0,0 +1,30 @@
+from dispycord.ext.prefix import PrefixCommands
+
+
+def _commands(case_insensitive):
+    commands = PrefixCommands('!', case_insensitive=case_insensitive)
+    
+    @commands.command('Tag')
+    async def tag(ctx):
+        pass
+    
+    @tag.command('Add')
+    async def add(ctx, name: str):
+        pass
+    
+    return commands, tag, add
+
+
+def test_subcommands_follow_case_insensitive():
+    commands, tag, add = _commands(True)
+    
+    assert commands.find('tag add x')[0] is add
+    assert commands.find('TAG ADD x')[0] is add
+
+
+def test_subcommands_follow_case_sensitive():
+    commands, tag, add = _commands(False)
+    
+    assert commands.find('Tag Add x')[0] is add
+    assert commands.find('Tag add x')[0] is tag
+    assert commands.find('tag Add x') is None
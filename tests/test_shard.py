@@ -0,0 +1,94 @@
+import asyncio
+import json
+import types
+import zlib
+
+from dispycord.shard import IDENTIFY, PRESENCE_UPDATE, ZLIB_SUFFIX, Shard
+
+
+def _shard():
+    client = types.SimpleNamespace(
+        num_shards=1, encoding='json', compress=True, codec=None
+    )
+    shard = Shard(client, 0)
+    shard._inflator = zlib.decompressobj()
+    return shard
+
+
+def _deflate(payloads):
+    ''' One zlib-stream, every payload ends in a sync flush. '''
+    deflator = zlib.compressobj()
+    return [
+        deflator.compress(payload) + deflator.flush(zlib.Z_SYNC_FLUSH)
+        for payload in payloads
+    ]
+
+
+def test_inflate_split_frames():
+    payloads = [
+        json.dumps({'op': 0, 's': seq, 't': 'MESSAGE_CREATE', 'd': {
+            'content': 'x' * seq * 50, 'id': str(seq)
+        }}).encode()
+        for seq in range(1, 6)
+    ]
+    compressed = _deflate(payloads)
+    shard = _shard()
+    inflated = []
+    
+    for chunk in compressed:
+        assert chunk.endswith(ZLIB_SUFFIX)
+        
+        # Split each payload in three frames, the suffix stays in the last.
+        body = len(chunk) - len(ZLIB_SUFFIX)
+        cuts = [0, body // 3, body * 2 // 3, len(chunk)]
+        frames = [chunk[a:b] for a, b in zip(cuts, cuts[1:])]
+        
+        for frame in frames[:-1]:
+            assert shard.inflate(frame) is None
+        
+        inflated.append(shard.inflate(frames[-1]))
+    
+    assert inflated == payloads
+    assert shard.bytes_received == sum(map(len, compressed))
+    assert shard.bytes_inflated == sum(map(len, payloads))
+    # Frames share the window, later payloads compress better.
+    assert shard.bytes_received < shard.bytes_inflated
+    assert not shard._buffer
+
+
+def test_presence_updated_before_ready_is_sent():
+    async def scenario():
+        async def wait_identify(shard_id):
+            pass
+        
+        client = types.SimpleNamespace(
+            num_shards=1,
+            http=types.SimpleNamespace(token='t'),
+            intent=0,
+            wait_identify=wait_identify,
+            _build_command=lambda: None
+        )
+        shard = Shard(client, 0)
+        sent = []
+        
+        async def send_as_json(data):
+            sent.append(data)
+        
+        shard.send_as_json = send_as_json
+        
+        identified = shard.update_presence({'status': 'idle'})
+        await shard.identify()
+        # Made while IDENTIFY is on the way.
+        updated = shard.update_presence({'status': 'dnd'})
+        
+        shard._parse_ready({'session_id': 's', 'user': {}, 'guilds': []})
+        await asyncio.wait_for(updated, 1)
+        
+        assert identified.done()
+        assert [data['op'] for data in sent] == [IDENTIFY, PRESENCE_UPDATE]
+        assert sent[0]['d']['presence'] == {'status': 'idle'}
+        assert sent[1]['d'] == {'status': 'dnd'}
+        
+        shard._presence_task.cancel()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+
+from dispycord.ext.core import Command
+from dispycord.ext.sync import CommandCache, sync_commands
+
+GLOBAL = '/applications/1/commands'
+GUILD = '/applications/1/guilds/5/commands'
+
+
+class FakeHTTP:
+    ''' Registered commands per endpoint, records every request. '''
+    def __init__(self, registered=None):
+        self.registered = registered or {}
+        self.requests = []
+    
+    async def Route(self, payload, endpoint, method):
+        self.requests.append((method, endpoint))
+        
+        if method == 'PUT':
+            self.registered[endpoint] = [
+                {**command, 'id': str(index), 'version': '1'}
+                for index, command in enumerate(payload, 10)
+            ]
+        
+        return self.registered.get(endpoint, [])
+
+
+def _command(name, guild=None):
+    async def callback(interaction):
+        pass
+    
+    return Command(
+        callback, name=name, description=name, slash_type=1, guild=guild
+    )
+
+
+def _sync(http, commands, cache):
+    return asyncio.run(sync_commands(http, 1, commands, cache))
+
+
+def test_no_commands_uploads_nothing():
+    http = FakeHTTP({GLOBAL: [{'id': '3', 'type': 1, 'name': 'other'}]})
+    
+    assert _sync(http, [], CommandCache(None)) == 0
+    assert http.requests == []
+
+
+def test_guild_commands_leave_global_set_alone():
+    http = FakeHTTP()
+    
+    assert _sync(http, [_command('ping', guild=5)], CommandCache(None)) == 1
+    assert http.requests == [('GET', GUILD), ('PUT', GUILD)]
+
+
+def test_unchanged_set_is_not_uploaded_again():
+    http = FakeHTTP()
+    cache = CommandCache(None)
+    command = _command('ping')
+    
+    assert _sync(http, [command], cache) == 1
+    assert command.ids == {10}
+    
+    http.requests.clear()
+    assert _sync(http, [_command('ping')], cache) == 0
+    assert http.requests == []
+
+
+def test_registered_set_is_fetched_without_cache():
+    http = FakeHTTP()
+    _sync(http, [_command('ping')], CommandCache(None))
+    
+    http.requests.clear()
+    command = _command('ping')
+    
+    assert _sync(http, [command], CommandCache(None)) == 0
+    assert http.requests == [('GET', GLOBAL)]
+    assert command.ids == {10}
+    
+    assert _sync(http, [_command('pong')], CommandCache(None)) == 1
+    assert http.requests[-1] == ('PUT', GLOBAL)
+
+
+def test_cached_scope_without_commands_is_emptied():
+    http = FakeHTTP()
+    cache = CommandCache(None)
+    _sync(http, [_command('ping', guild=5)], cache)
+    
+    http.requests.clear()
+    assert _sync(http, [_command('ping')], cache) == 2
+    assert ('PUT', GUILD) in http.requests
+    assert http.registered[GUILD] == []